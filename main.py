@@ -1,5 +1,12 @@
 import dearpygui.dearpygui as dpg
-from src.application import create_app
+from src import callback_functions
+from src.profiler import profiler
+
+# time the callbacks, before the application imports them (TORCHNODE_PROFILE),
+# the registered handlers whose name does not end with _callback are listed
+profiler.instrument_module( callback_functions, names=("commit_drag_positions", "group_selected_nodes_callabck") )
+
+from src.application import create_app, on_frame, shutdown
 
 # create context
 dpg.create_context()
@@ -14,6 +21,12 @@ create_app(width, height)
 dpg.create_viewport(title='Torch Model Constructor', width=width, height=height)
 dpg.setup_dearpygui()
 dpg.show_viewport()
-dpg.start_dearpygui()
+
+# render loop
+while dpg.is_dearpygui_running():
+    on_frame()
+    dpg.render_dearpygui_frame()
+
+shutdown()
 dpg.destroy_context()
 
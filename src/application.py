@@ -6,13 +6,17 @@
     * layer_window: window containing available layer definition
     * info_window: window displaying the selected node information
     * group_windows: 3 optional windows for group management
+    * search_window: window finding layers by type, group or parameters
+    * validation_window: window listing the layers with unset parameters
 
 """
 
 import dearpygui.dearpygui as dpg
 from .manager_info import ModelManager
 from .theme import ColorPalette
-from .template import ModelConstructor
+from .template import ModelConstructor, RenderWorker
+from .autosave import AutosaveService
+from .profiler import profiler
 
 from .callback_functions import add_node_callback, \
                                 node_link_callback, \
@@ -32,7 +36,26 @@ from .callback_functions import add_node_callback, \
                                 output_model_callback, \
                                 output_group_callback, \
                                 save_callback, \
-                                load_template_callback
+                                load_template_callback, \
+                                input_shape_callback, \
+                                benchmark_toggle_callback, \
+                                create_info_panel, \
+                                level_of_detail_callback, \
+                                compact_nodes_callback, \
+                                group_collapse_callback, \
+                                auto_layout_callback, \
+                                autosave_toggle_callback, \
+                                generate_cancel_callback, \
+                                update_generate_progress, \
+                                update_profiler_overlay, \
+                                trace_level_callback, \
+                                search_callback, \
+                                search_result_callback, \
+                                validation_result_callback, \
+                                bulk_edit_callback, \
+                                bulk_edit_show_callback, \
+                                undo_callback, \
+                                subscribe_to_changes
 
 
 ##########################################################################################
@@ -65,10 +88,31 @@ group_manager_window_name = "group_manager"
 group_yes = "group_yes"
 group_no = "group_no"
 
+# generation window
+generate_window_name = "generate_window"
+
+# profiler window
+profiler_window_name = "profiler_window"
+
+# bulk edit window
+bulk_window_name = "bulk_edit_window"
+
+# search window
+search_window_name = "search_window"
+
+# validation window
+validation_window_name = "validation_window"
+
 # model data
 model_data = ModelManager( "layers_definition.json" )
 model_json_file = "./model_def.json"
 model_renderer = ModelConstructor("template.j2", model_data)
+render_worker = RenderWorker( model_renderer )
+
+# saves run on a worker thread, autosave (opt-in) every autosave_interval seconds
+# next to the project file
+autosave_interval = 60
+autosave_service = AutosaveService( model_data, interval=autosave_interval )
 
 
 ##########################################################################################
@@ -99,6 +143,7 @@ def node_window( width=1200, height=800 ) :
                     
                 with dpg.node_editor( tag=node_editor_name, 
                                       callback=node_link_callback, 
+                                      delink_callback=node_delink_callback,
                                       user_data=model_data,
                                       width=2000,
                                       height=2000
@@ -117,8 +162,18 @@ def node_window( width=1200, height=800 ) :
                                                  attribute_type=dpg.mvNode_Attr_Output
                                                ) :
                             
-                            dpg.add_input_int(label="F1", width=100)
-                            dpg.add_input_int(label="F2", width=100)
+                            dpg.add_input_int( tag=input_node + "_F1",
+                                               label="F1", 
+                                               width=100,
+                                               callback=input_shape_callback,
+                                               user_data=model_data
+                                             )
+                            dpg.add_input_int( tag=input_node + "_F2",
+                                               label="F2", 
+                                               width=100,
+                                               callback=input_shape_callback,
+                                               user_data=model_data
+                                             )
 
         with dpg.handler_registry( label=node_handler_name ) :
 
@@ -139,6 +194,11 @@ def node_window( width=1200, height=800 ) :
                                            user_data=model_data
                                          )  
 
+            dpg.add_key_release_handler( key=dpg.mvKey_Z, 
+                                         callback=undo_callback, 
+                                         user_data=model_data
+                                       )
+
 
 ################################### layer window #########################################
 
@@ -185,6 +245,8 @@ def layer_manager_window() :
 # window to show layer properties
 def layer_property_window() :
 
+    global model_data
+
     with dpg.window( tag=info_window_name, label="Layer Info", pos=(800, 0) , no_close=True ) :
 
         dpg.add_text( "Property information on selected layer (node). Highlighted " + 
@@ -196,6 +258,9 @@ def layer_property_window() :
         
         dpg.add_separator()
 
+    # single panel, bound to the selected node
+    create_info_panel( model_data )
+
     dpg.focus_item( info_window_name )
 
 
@@ -230,6 +295,20 @@ def group_manager_window() :
                             callback=group_editor_callback,
                             user_data=model_data
                         )
+
+        with dpg.group( horizontal=True ) :
+
+            dpg.add_button( tag="group_collapse",
+                            label="Collapse", 
+                            callback=group_collapse_callback, 
+                            user_data=model_data
+                          )
+            
+            dpg.add_button( tag="group_expand", 
+                            label="Expand",
+                            callback=group_collapse_callback,
+                            user_data=model_data
+                          )
             
 
 # window to edit group element, called by group manager
@@ -259,6 +338,14 @@ def group_editor_window() :
                            default_value=model_data.get_group_attribute( group_name, "type" ), 
                            items=["default", "Sequential", "ModuleList"]
                          )
+
+            dpg.add_text( "Repeat the group:" )
+
+            dpg.add_input_int( tag="input_group_repeat", 
+                               default_value=model_data.get_group_repeat( group_name ), 
+                               min_value=1, 
+                               min_clamped=True
+                             )
             
             dpg.add_text( "Pick a color:" )
 
@@ -316,6 +403,137 @@ def group_group_window() :
                               )
 
 
+################################### generate window ######################################
+
+
+# window showing the progress of the generation
+def generate_window() :
+
+    with dpg.window( tag=generate_window_name, 
+                     label="Generate", 
+                     pos=(400, 300), 
+                     autosize=True, 
+                     show=False 
+                   ) :
+
+        dpg.add_progress_bar( tag="generate_progress", default_value=0.0, width=300 )
+
+        dpg.add_text( tag="generate_status", default_value="Idle" )
+
+        dpg.add_button( tag="generate_cancel", 
+                        label="Cancel", 
+                        callback=generate_cancel_callback, 
+                        user_data=render_worker
+                      )
+
+
+################################### bulk edit window #####################################
+
+
+# window to change a parameter on all the selected layers
+def bulk_edit_window() :
+
+    global model_data
+
+    with dpg.window( tag=bulk_window_name, 
+                     label="Bulk Edit", 
+                     pos=(400, 200), 
+                     autosize=True, 
+                     show=False 
+                   ) :
+
+        dpg.add_text( tag="bulk_status", default_value="" )
+
+        dpg.add_combo( tag="bulk_param", label="Parameter", items=[], width=200 )
+
+        dpg.add_input_text( tag="bulk_value", label="Value", width=200 )
+
+        with dpg.group( horizontal=True ) :
+
+            dpg.add_button( label="Apply", 
+                            callback=bulk_edit_callback, 
+                            user_data=model_data
+                          )
+
+            dpg.add_button( label="Selection", 
+                            callback=bulk_edit_show_callback, 
+                            user_data=model_data
+                          )
+
+            dpg.add_button( label="Close", 
+                            callback=lambda: dpg.configure_item(bulk_window_name, show=False)
+                          )
+
+
+################################### search window ########################################
+
+
+# window to find layers by type, group or parameter values
+def search_window() :
+
+    global model_data
+
+    with dpg.window( tag=search_window_name, label="Search", pos=(800, 500), no_close=True ) :
+
+        dpg.add_input_text( tag="search_input", 
+                            hint="type=Conv2d stride=2 group=...", 
+                            callback=search_callback, 
+                            user_data=model_data, 
+                            on_enter=True, 
+                            width=-1 
+                          )
+
+        dpg.add_text( tag="search_status", default_value="" )
+
+        dpg.add_listbox( tag="search_results", 
+                         items=[], 
+                         callback=search_result_callback, 
+                         user_data=model_data, 
+                         width=-1, num_items=10 
+                       )
+
+
+################################### validation window ####################################
+
+
+# window listing the validation issues, shown by Run - Validate
+def validation_window() :
+
+    global model_data
+
+    with dpg.window( tag=validation_window_name, 
+                     label="Validation", 
+                     pos=(800, 200), 
+                     autosize=True, 
+                     show=False 
+                   ) :
+
+        dpg.add_text( tag="validation_status", default_value="" )
+
+        dpg.add_listbox( tag="validation_results", 
+                         items=[], 
+                         callback=validation_result_callback, 
+                         user_data=model_data, 
+                         width=400, num_items=10 
+                       )
+
+
+################################### profiler window ######################################
+
+
+# window showing the frame time and the slowest callbacks, only when profiling
+def profiler_window() :
+
+    with dpg.window( tag=profiler_window_name, 
+                     label="Profiler", 
+                     pos=(0, 600), 
+                     autosize=True, 
+                     no_focus_on_appearing=True 
+                   ) :
+
+        dpg.add_text( tag="profiler_text", default_value="" )
+
+
 ######################################## menubar #########################################       
 
 
@@ -347,7 +565,14 @@ def menubar():
                                user_data=model_data
                              )
 
-            dpg.add_menu_item( label="Save", callback=save_callback, user_data=model_data )
+            dpg.add_menu_item( label="Save", callback=save_callback, user_data=autosave_service )
+
+            dpg.add_menu_item( label="Autosave", 
+                               check=True,
+                               default_value=autosave_service.enabled,
+                               callback=autosave_toggle_callback, 
+                               user_data=autosave_service 
+                             )
 
             dpg.add_menu_item( label="Save Layout", callback=save_layout_callback )
             
@@ -355,7 +580,7 @@ def menubar():
 
             dpg.add_menu_item( label="Load", 
                                callback=load_layer_callback, 
-                               user_data=model_data 
+                               user_data=[model_data, autosave_service] 
                              )
             
             dpg.add_menu_item( label="Load Group", enabled=False )
@@ -370,23 +595,67 @@ def menubar():
             dpg.add_menu_item( label="Exit", callback=lambda: dpg.stop_dearpygui() )
 
 
+        with dpg.menu( label="Edit" ) :
+
+            dpg.add_menu_item( label="Undo", 
+                               shortcut="Ctrl+Z", 
+                               callback=undo_callback, 
+                               user_data=model_data
+                             )
+            dpg.add_menu_item( label="Bulk Edit Parameters", 
+                               callback=bulk_edit_show_callback, 
+                               user_data=model_data
+                             )
+
         with dpg.menu( label="Run" ) :
 
             dpg.add_menu_item( label="Generate", 
                                callback=output_torch_class_callback, 
-                               user_data=[model_renderer, model_data]
+                               user_data=[render_worker, model_data]
                              )
-            dpg.add_menu_item( label="Validate", callback=check_model_callback )
+            dpg.add_menu_item( label="Emit Benchmark", 
+                               check=True,
+                               callback=benchmark_toggle_callback, 
+                               user_data=model_renderer
+                             )
+            dpg.add_menu_item( label="Validate", callback=check_model_callback, user_data=model_data )
 
 
         with dpg.menu( label="View" ) :
 
             dpg.add_menu_item( label="All_Panels", callback=output_layers_callback )
 
+            dpg.add_menu_item( label="Auto Layout", 
+                               callback=auto_layout_callback, 
+                               user_data=model_data
+                             )
+
+            dpg.add_menu_item( label="Compact Nodes", 
+                               check=True,
+                               callback=compact_nodes_callback, 
+                               user_data=model_data
+                             )
+
+            with dpg.menu( label="Trace Level" ) :
+
+                for level in ( "off", "error", "info", "debug" ) :
+
+                    dpg.add_menu_item( label=level.capitalize(), 
+                                       callback=trace_level_callback, 
+                                       user_data=level
+                                     )
+
             with dpg.menu( label="View" ) :
 
                 dpg.add_menu_item( label="Buttons", callback=lambda : dpg.show_item("Layers") )
                 dpg.add_menu_item( label="Infos", callback=lambda : dpg.show_item("layer_info") )
+                dpg.add_menu_item( label="Search", callback=lambda : dpg.show_item("search_window") )
+
+                dpg.add_menu_item( label="Level of Detail", 
+                                   check=True,
+                                   callback=level_of_detail_callback, 
+                                   user_data=model_data
+                                 )
 
 
 
@@ -397,8 +666,37 @@ def menubar():
 ##########################################################################################
 
     
+# called by the render loop, once per frame
+def on_frame() :
+
+    # changes of the frame, as one batch
+    model_data.events.flush()
+
+    autosave_service.tick()
+
+    update_generate_progress( render_worker )
+
+    if profiler.enabled :
+
+        profiler.frame()
+        update_profiler_overlay( profiler )
+
+
+# called when the render loop ends
+def shutdown() :
+
+    autosave_service.stop()
+
+    render_worker.cancel()
+
+    profiler.dump()
+
+
 def create_app(width, height) :
 
+    # items follow the changes of the model
+    subscribe_to_changes( model_data )
+
     # window to manage nodes
     node_window()
 
@@ -412,6 +710,22 @@ def create_app(width, height) :
     group_manager_window()
     group_editor_window()
     group_group_window()
+
+    # parameters of the selected layers
+    bulk_edit_window()
+
+    # search of layers
+    search_window()
+
+    # layers with unset parameters
+    validation_window()
+
+    # progress of the generation
+    generate_window()
+
+    if profiler.enabled :
+
+        profiler_window()
         
     # menubar
     menubar()
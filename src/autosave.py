@@ -0,0 +1,190 @@
+"""
+ Background saving of the project.
+
+ The UI thread only takes a snapshot of the ModelManager (a copy of its
+ mutable parts), a worker thread serializes it to json and writes it
+ atomically: to a temporary file in the same folder, then renamed over
+ the target, so a crash never leaves a half written project.
+
+ Autosave is off by default. Once a project file is known (saved or
+ loaded), the autosaves go next to it, as <name>.autosave.json.
+"""
+
+import json, logging, os, stat, tempfile, threading, time
+
+
+# mode of new files, read once since the umask can only be read by setting it
+umask = os.umask( 0 )
+os.umask( umask )
+default_mode = 0o666 & ~umask
+
+
+# return the autosave file of a project file
+def get_autosave_file( project_file ) :
+
+    root, ext = os.path.splitext( os.path.abspath(project_file) )
+
+    return root + ".autosave" + ( ext or ".json" )
+
+
+# write text to a file atomically
+def write_atomic( file, text ) :
+
+    folder = os.path.dirname( os.path.abspath(file) )
+
+    fd, temp_file = tempfile.mkstemp( dir=folder, prefix=".", suffix=".tmp" )
+
+    try :
+
+        with os.fdopen( fd, 'w', encoding='utf-8' ) as f :
+
+            f.write( text )
+            f.flush()
+            os.fsync( f.fileno() )
+
+        # mkstemp creates the file as 0600, keep the mode of the target
+        if os.path.exists( file ) :
+
+            os.chmod( temp_file, stat.S_IMODE( os.stat(file).st_mode ) )
+
+        else :
+
+            os.chmod( temp_file, default_mode )
+
+        os.replace( temp_file, file )
+
+    except BaseException :
+
+        if os.path.exists( temp_file ) :
+            os.remove( temp_file )
+
+        raise
+
+
+class AutosaveService :
+
+    def __init__( self, model_manager, file=None, interval=60.0, enabled=False ) :
+
+        self.model_manager = model_manager
+
+        # target of the periodic saves, None until a project file is known
+        self.file = file
+
+        # seconds between two autosaves
+        self.interval = interval
+        self.enabled = enabled
+
+        self.last_request = time.monotonic()
+        self.last_save = None
+        self.last_error = None
+
+        # (file, snapshot) waiting for the worker, only the latest is kept
+        self.pending = {}
+        self.condition = threading.Condition()
+        self.running = False
+        self.thread = None
+
+
+    # start the worker thread
+    def start( self ) :
+
+        if self.running :
+            return
+
+        self.running = True
+        self.thread = threading.Thread( target=self.run, name="autosave", daemon=True )
+        self.thread.start()
+
+
+    # stop the worker thread, pending saves are written first
+    def stop( self, timeout=10.0 ) :
+
+        if not self.running :
+            return
+
+        with self.condition :
+
+            self.running = False
+            self.condition.notify()
+
+        self.thread.join( timeout )
+
+
+    # autosave next to the project file
+    def set_project( self, project_file ) :
+
+        self.file = get_autosave_file( project_file )
+
+
+    # set the seconds between two autosaves
+    def set_interval( self, interval ) :
+
+        self.interval = interval
+
+
+    # turn the periodic save on or off
+    def set_enabled( self, enabled ) :
+
+        self.enabled = enabled
+        self.last_request = time.monotonic()
+
+
+    # called each frame by the UI thread
+    def tick( self ) :
+
+        if not self.enabled or self.file is None :
+            return
+
+        now = time.monotonic()
+
+        if now - self.last_request >= self.interval :
+
+            self.last_request = now
+            self.request_save()
+
+
+    # snapshot the model on the calling thread and hand it to the worker
+    def request_save( self, file=None ) :
+
+        file = file or self.file
+        snapshot = self.model_manager.snapshot()
+
+        with self.condition :
+
+            # an older snapshot of the same file is not worth writing
+            self.pending[file] = snapshot
+            self.condition.notify()
+
+        if not self.running :
+
+            self.start()
+
+
+    # worker loop
+    def run( self ) :
+
+        while True :
+
+            with self.condition :
+
+                while self.running and not self.pending :
+
+                    self.condition.wait()
+
+                if not self.pending and not self.running :
+                    return
+
+                pending = self.pending
+                self.pending = {}
+
+            for file, snapshot in pending.items() :
+
+                try :
+
+                    write_atomic( file, json.dumps( snapshot, ensure_ascii=False, indent=4 ) )
+                    self.last_save = time.time()
+
+                except Exception as e :
+
+                    self.last_error = e
+                    logging.error( "Saving %s failed: %s", file, e )
@@ -9,6 +9,12 @@
 import dearpygui.dearpygui as dpg
 from .theme import ColorPalette
 from .template import ModelConstructor
+from .link_registry import LinkRegistry
+from .level_of_detail import LevelOfDetail
+from .layout import layered_layout
+from .trace import tracer
+from .passes import get_unset_parameters
+from . import events
 import json, logging
 
 
@@ -32,6 +38,7 @@ layer_window_name = "layer_add_window"
 
 # info window
 info_window_name = "layer_info"
+info_panel_name = "Layer Attributes"
 group_combo_selector_name = "group_combo"
 group_listbox = "group_listbox"
 
@@ -43,12 +50,71 @@ group_yes = "group_yes"
 group_no = "group_no"
 group_edit = "group_edit"
 group_remove = "group_remove"
+group_collapse = "group_collapse"
+group_expand = "group_expand"
+
+# generated files
+model_output_file = "./model.py"
+
+# generation window
+generate_window_name = "generate_window"
+generate_progress = "generate_progress"
+generate_status = "generate_status"
+generate_cancel = "generate_cancel"
+
+# profiler window
+profiler_window_name = "profiler_window"
+profiler_text = "profiler_text"
+
+# bulk edit window
+bulk_window_name = "bulk_edit_window"
+bulk_status = "bulk_status"
+bulk_param = "bulk_param"
+bulk_value = "bulk_value"
+
+# search window
+search_window_name = "search_window"
+search_input = "search_input"
+search_results = "search_results"
+search_status = "search_status"
+
+# validation window
+validation_window_name = "validation_window"
+validation_results = "validation_results"
+validation_status = "validation_status"
 
 # global variables
-LinkList = []
+link_registry = LinkRegistry()
+level_of_detail = LevelOfDetail( node_editor_name, input_node, link_registry )
 selected_nodes = set()
 old_selected_nodes = set()
 old_selected_node = -1
+drag_pending = False
+compact_nodes = False
+expanded_nodes = set()
+group_themes = {}
+meta_nodes = {}
+meta_layers = {}
+meta_ports = {}
+proxy_links = set()
+info_bound_node = -1
+info_bound_values = {}
+info_widgets = {}
+info_param_widgets = {}
+generate_last_state = None
+bulk_edit_nodes = []
+search_result_ids = {}
+validation_issues = {}
+validation_result_ids = {}
+highlighted_nodes = set()
+highlight_theme = None
+info_fields = ( "name", "id", "type", "before", "after", "group", "group_type", "group_color", "group_items" )
+
+# trace points
+trace_input = tracer.point( "ui.node_input", "debug" )
+trace_info = tracer.point( "ui.info", "debug" )
+trace_select = tracer.point( "ui.select", "debug" )
+trace_node = tracer.point( "ui.add_node", "info" )
 
 
 ##########################################################################################
@@ -78,19 +144,15 @@ def add_node_callback( sender, app_data, user_data ) :
     # get node id
     node_id = dpg.generate_uuid()
 
-    # create layer in model
+    # create layer in model, without covering another node
     model_data.add_layer( node_id, layer )
-    model_data.set_layer_pos( node_id, node_pos )
+    model_data.set_layer_pos( node_id, model_data.find_free_pos( node_pos ) )
 
     add_node( node_id, model_data )
                             
     update_node_theme( node_id, model_data )
 
-    # create display on window "layer_info"
-    create_display_info( node_id, model_data )
-
-    # update group list
-    dpg.configure_item( "group_listbox", items=model_data.get_group_names() )
+    level_of_detail.update( model_data )
 
 
 
@@ -104,17 +166,25 @@ def node_input_callback( sender, app_data, user_data ) :
     node_id = dpg.get_item_parent( attribute )
     label = dpg.get_item_label( sender )
 
-    print( "input callback: ", app_data, "parent: ", node_id, "label: ", label )
+    if trace_input.on :
+        trace_input.emit( node=node_id, label=label, value=app_data )
 
-    print( "changed value to: ", dpg.get_value(sender) )
+    # the info item follows the change event, the edit can be undone
+    user_data.set_params_values( [ node_id ], label, dpg.get_value(sender) )
 
-    user_data.set_param_value( node_id, 
-                               dpg.get_item_label(sender), 
-                               dpg.get_value(sender)
-                             )
-    
-    # update info item
-    create_display_info( node_id, user_data, show=True )
+
+
+def input_shape_callback( sender, app_data, user_data ) :
+
+    """
+    called by the fields of "input_node"
+    """
+
+    model_data = user_data
+
+    model_data.set_input_shape( ( dpg.get_value(input_node + "_F1"), 
+                                  dpg.get_value(input_node + "_F2") ) 
+                              )
 
 
 
@@ -128,23 +198,26 @@ def node_link_callback( sender, app_data, user_data ) :
 
     if type(app_data) == tuple :
 
-        link_id1, link_id2 = app_data
-        
-        dpg.add_node_link( link_id1, link_id2, parent=sender )
+        attr_1, attr_2 = app_data
 
-        links = ( dpg.get_item_alias(link_id1), dpg.get_item_alias(link_id2) )
+        if attr_1 in meta_ports or attr_2 in meta_ports :
 
-        # update model_data
+            logging.warning("Expand the group to link its layers.")
+            return
         
-        node_ids = ( dpg.get_item_parent(link_id1), dpg.get_item_parent(link_id2) )
+        link_id = dpg.add_node_link( attr_1, attr_2, parent=sender )
+
+        node_ids = ( dpg.get_item_parent(attr_1), dpg.get_item_parent(attr_2) )
 
-        model_data.assign_link( node_ids[0], node_ids[1], before=False )
-        model_data.assign_link( node_ids[1], node_ids[0] )
+        link_registry.add_link( link_id, attr_1, attr_2, *node_ids )
 
-        LinkList.append( links )
+        # update model_data, the input node is not a layer
+        ids = model_data.get_all_layer_ids()
 
-        create_display_info( node_ids[0], user_data, show=False )
-        create_display_info( node_ids[1], user_data, show=False )
+        if node_ids[0] in ids and node_ids[1] in ids :
+
+            model_data.assign_link( node_ids[0], node_ids[1], before=False )
+            model_data.assign_link( node_ids[1], node_ids[0] )
 
 
 
@@ -154,38 +227,90 @@ def node_delink_callback( sender, app_data, user_data ) :
     called  by "NodeEditor"
     """
 
-    link_id = app_data
+    model_data = user_data
+
+    # links of meta-nodes follow the model
+    if app_data in proxy_links :
+        return
 
-    # update model_data on links
-    # TODO
-    parent = dpg.get_item_parent( link_id )
-    print("linked_node: ", link_id)
+    remove_link( app_data, model_data )
 
-    dpg.delete_item( link_id )
+    dpg.delete_item( app_data )
 
 
  
+def expand_node_callback( sender, app_data, user_data ) :
+
+    """
+    called by the toggle of each created node
+    """
+
+    model_data = user_data
+
+    node_id = dpg.get_item_parent( dpg.get_item_parent(sender) )
+
+    if node_id in expanded_nodes :
+
+        collapse_node( node_id )
+
+    else :
+
+        expand_node( node_id, model_data )
+
+
+
 def drag_select_nodes_callback( sender, app_data, user_data ) :
 
     """
     called by input_handler : "node_inputs" - mouse_drag
+
+     Drag events are coalesced, the positions are committed once
+     on the next frame (or on release) for the whole selection.
+    """
+
+    global drag_pending
+
+    if drag_pending :
+        return
+
+    drag_pending = True
+
+    dpg.set_frame_callback( dpg.get_frame_count() + 1, 
+                            callback=commit_drag_positions, 
+                            user_data=user_data 
+                          )
+
+
+def commit_drag_positions( sender=None, app_data=None, user_data=None ) :
+
+    """
+    called by the frame following a drag, or by mouse_release
     """
 
     global selected_nodes
+    global drag_pending
 
-    model_data = user_data
+    if not drag_pending :
+        return
+    
+    drag_pending = False
 
-    selected_nodes.clear()
+    model_data = user_data
 
     selected_nodes = set( dpg.get_selected_nodes(node_editor_name) )
 
     # update node positions
-    if len(selected_nodes) > 0 :
+    ids = model_data.get_all_layer_ids()
 
-        for node in selected_nodes :
+    for node in selected_nodes :
+
+        if node in ids :
 
             model_data.set_layer_pos( node, dpg.get_item_pos(node) )
 
+    # the viewport may have moved as well
+    level_of_detail.update( model_data )
+
 
 def group_selected_nodes_callabck( sender, app_data, user_data ) :
 
@@ -198,10 +323,18 @@ def group_selected_nodes_callabck( sender, app_data, user_data ) :
 
     model_data = user_data
 
+    # flush the positions of a pending drag
+    commit_drag_positions( user_data=model_data )
+
     ids = model_data.get_all_layer_ids()
 
     nodes = set( i for i in selected_nodes if i in ids )
 
+    # the bulk edit window follows the selection
+    if len(nodes) > 1 and dpg.is_item_shown( bulk_window_name ) :
+
+        fill_bulk_editor( model_data, nodes )
+
     if len(nodes) > 1 :
 
         show_group()
@@ -224,69 +357,57 @@ def delete_node_callback( sender, app_data, user_data ) :
 
     # delete links
     for link in dpg.get_selected_links( node_editor_name ) :
-        print("linklink: ", link)
-        
-        # get the connected nodes' id
-        node1 = dpg.get_item_parent( dpg.get_item_configuration(link)["attr_1"] )
-        node2 = dpg.get_item_parent( dpg.get_item_configuration(link)["attr_2"] )
-
-        # remove links from model
-        model_data.remove_mutual_links( node1, node2 )
 
-        # remove link
-        dpg.delete_item( link )
-
-
-    # delete nodes
-    for selected_node in dpg.get_selected_nodes( node_editor_name ) :
-        # Deleting node and attached links
-        ## Extract all children of the deleted node
-        selected_node_children = dpg.get_item_children(selected_node)[1]
+        if link in proxy_links :
+            continue
 
-        ## Extract all existing links in the Node Editor
-        nodeEditor_links = dpg.get_item_children(node_editor_name)[0]
+        remove_link( link, model_data )
 
-        ## Iterate through NodeEditor elements and delete attached links
-        for link in nodeEditor_links:
+        dpg.delete_item( link )
 
-            if dpg.get_item_configuration(link)["attr_1"] in selected_node_children or \
-               dpg.get_item_configuration(link)["attr_2"] in selected_node_children :
-                
-                dpg.delete_item( link )
+    # delete nodes, the input node is kept
+    ids = model_data.get_all_layer_ids()
+    
+    nodes = [i for i in dpg.get_selected_nodes( node_editor_name ) if i in ids]
 
-        ## Iterate trough LinkList and remove attached links
-        for item in LinkList:
+    # remove all attached links at once
+    for link, ( attr_1, attr_2, node1, node2 ) in link_registry.remove_nodes( nodes ).items() :
 
-            for sub_item in item:
+        if node1 in ids and node2 in ids :
 
-                if dpg.get_item_alias( selected_node ) in sub_item :
+            model_data.remove_mutual_links( node1, node2 )
 
-                    LinkList.remove( item ) 
+        if dpg.does_item_exist( link ) :
+            
+            dpg.delete_item( link )
 
-        # Delete node
-        dpg.delete_item( selected_node )
+    level_of_detail.forget( nodes )
 
-        # remove links
-        node1, node2 = model_data.get_links( selected_node )
+    if meta_nodes :
+        update_meta_links()
 
-        if ( node1 != -1 ) :
+    expanded_nodes.difference_update( nodes )
 
-            # remove link from model before
-            model_data.remove_link( node1, before=False )
+    for selected_node in nodes :
 
-        if ( node2 != -1 ) :
+        # unbind info item
+        if info_bound_node == selected_node :
+            hide_display_info()
 
-            # remove link from model after
-            model_data.remove_links( node2 )
+        dpg.delete_item( selected_node )
 
-        # delete info item
-        info_lable = "Layer Attributes_" + str(selected_node)
-        dpg.hide_item( info_lable )
-        dpg.delete_item( info_lable )
+        group_name = model_data.get_group_name( selected_node )
 
         # remove layer from model
         model_data.remove_layer( selected_node )
 
+        # a group left empty goes with its theme, the lists follow the change event
+        if not model_data.get_group_attribute( group_name, "members" ) :
+
+            model_data.remove_group( group_name )
+            remove_group_theme( group_name )
+
+    forget_search_nodes( nodes, model_data )
 
 
 def display_layer_info_callback( sender, app_data, user_data ) :
@@ -305,44 +426,119 @@ def display_layer_info_callback( sender, app_data, user_data ) :
             if old_selected_node == selected_node :
 
                 return
-            
-            for layer_id in user_data.get_all_layer_ids() :
-
-                item_name = "Layer Attributes_" + str(layer_id)  
-                dpg.hide_item(item_name)
-
-            print("selected_node", selected_node)
 
             old_selected_node = selected_node
 
-            item_name = "Layer Attributes_" + user_data.get_layer_name(selected_node)
+            if trace_select.on :
+                trace_select.emit( node=selected_node )
 
-            create_display_info( selected_node, user_data, show=True )
+            display_info( selected_node, user_data )
 
 
 # node helper functions
-            
+
+
+def remove_link( link_id, model_data ) :
+
+    """
+    unregister a link and remove it from the model
+    """
+
+    entry = link_registry.remove_link( link_id )
+
+    if entry is None :
+        return
+    
+    attr_1, attr_2, node1, node2 = entry
+    ids = model_data.get_all_layer_ids()
+
+    # the model keeps one link per pair of nodes
+    if node1 in ids and node2 in ids and not link_registry.has_link_between( node1, node2 ) :
+
+        model_data.remove_mutual_links( node1, node2 )
+
 
 def update_node_theme( node_id, user_data ) :
-    # create theme to change color
+    # bind the shared theme of the node's group
 
     model_data = user_data
-    
-    with dpg.theme() as item_theme:
-        with dpg.theme_component( dpg.mvNode ) :
-
-            group_name = model_data.get_group_name( node_id )
-            color = model_data.get_group_attribute( group_name, "color" )
-            link_theme_color = dpg.add_theme_color( dpg.mvNodeCol_TitleBar, 
-                                                    color, 
-                                                    category=dpg.mvThemeCat_Nodes
-                                                  )
-            
-    dpg.bind_item_theme( node_id, item_theme )
+
+    group_name = model_data.get_group_name( node_id )
+
+    dpg.bind_item_theme( node_id, get_group_theme( group_name, model_data ) )
+
+
+def get_group_theme( group_name, model_data ) :
+
+    """
+    return the theme of a group, created once and shared by all 
+    its member nodes
+    """
+
+    # a theme deleted behind the cache is created again
+    if group_name in group_themes and not dpg.does_item_exist( group_themes[group_name][0] ) :
+
+        group_themes.pop( group_name )
+
+    if not group_name in group_themes :
+
+        color = model_data.get_group_attribute( group_name, "color" )
+
+        with dpg.theme() as item_theme :
+            with dpg.theme_component( dpg.mvNode ) :
+
+                theme_color = dpg.add_theme_color( dpg.mvNodeCol_TitleBar, 
+                                                   color, 
+                                                   category=dpg.mvThemeCat_Nodes
+                                                 )
+                
+        group_themes[group_name] = ( item_theme, theme_color )
+
+    return group_themes[group_name][0]
+
+
+# change the color of a group's theme in place
+def update_group_theme( group_name, model_data ) :
+
+    if group_name in group_themes :
+
+        dpg.set_value( group_themes[group_name][1], 
+                       model_data.get_group_attribute( group_name, "color" ) 
+                     )
+
+
+# follow a group renaming
+def rename_group_theme( old_name, new_name ) :
+
+    if old_name in group_themes and not new_name in group_themes :
+
+        group_themes[new_name] = group_themes.pop( old_name )
+
+
+# free the theme of a removed group
+def remove_group_theme( group_name ) :
+
+    # the entry goes first, a group created again with this name gets a new theme
+    entry = group_themes.pop( group_name, None )
+
+    if entry is not None and dpg.does_item_exist( entry[0] ) :
+
+        dpg.delete_item( entry[0] )
+
+
+# free the themes of all groups
+def clear_group_themes() :
+
+    for group_name in list( group_themes ) :
+
+        remove_group_theme( group_name )
 
 
 def add_node( node_id, model_data ) :
 
+    if trace_node.on :
+        trace_node.emit( node=node_id, type=model_data.get_layer_type(node_id) )
+
     with dpg.node( tag=node_id, 
                    label=model_data.get_layer_name(node_id), 
                    parent=node_editor_name, 
@@ -352,78 +548,123 @@ def add_node( node_id, model_data ) :
         dpg.add_node_attribute( label=" ", attribute_type=dpg.mvNode_Attr_Input )
         dpg.add_node_attribute( label=" ", attribute_type=dpg.mvNode_Attr_Output )
         
-        with dpg.node_attribute( attribute_type=dpg.mvNode_Attr_Static ) :
-
-            for p in model_data.get_params( node_id ) :
-                print("p: ", p)
-
-                if  bool(p) and not bool(p["default"]) :
-
-                    match p["dtype"] :
-                        
-                        case "int" :
-                            dpg.add_input_int( tag=str(node_id) + "_" + p["name"],
-                                               label=p["name"], 
-                                               default_value=int(p["default_value"]),
-                                               callback=node_input_callback, 
-                                               width=100, 
-                                               user_data=model_data
-                                             )
-                        
-                        case "float" :
-                            dpg.add_input_float( tag=str(node_id) + "_" + p["name"],
-                                                 label=p["name"],
-                                                 default_value=float(p["default_value"]),
-                                                 callback=node_input_callback, 
-                                                 width=100, 
-                                                 user_data=model_data
-                                               )
-                        
-                        case "bool" :
-                            dpg.add_combo( tag=str(node_id) + "_" + p["name"],
-                                            label=p["name"], 
-                                            default_value=bool(p["default_value"]),
-                                            callback=node_input_callback, 
-                                            width=100,
-                                            items=[True, False],
-                                            user_data=model_data
-                                          )
-                            
-                        case _ :
-                            dpg.add_input_text( tag=str(node_id) + "_" + p["name"],
-                                                label=p["name"], 
-                                                default_value=p["default_value"],
-                                                callback=node_input_callback, 
-                                                width=100,
-                                                user_data=model_data
-                                              )
+        with dpg.node_attribute( tag=str(node_id) + "_static", attribute_type=dpg.mvNode_Attr_Static ) :
 
+            dpg.add_button( tag=str(node_id) + "_expand", 
+                            label="+", 
+                            callback=expand_node_callback, 
+                            user_data=model_data
+                          )
 
+    # in compact mode, parameters are created on first expand
+    if not compact_nodes :
 
-################################### layer window #########################################
+        expand_node( node_id, model_data )
 
-# None
 
+def expand_node( node_id, model_data ) :
+
+    """
+    create the parameter items on a node
+    """
 
+    if node_id in expanded_nodes :
+        return
+    
+    expanded_nodes.add( node_id )
 
-################################### info_window ##########################################
+    dpg.configure_item( str(node_id) + "_expand", label="-" )
+
+    parent = str(node_id) + "_static"
+
+    for p in model_data.get_params( node_id ) :
+
+        if  bool(p) and not bool(p["default"]) :
+
+            match p["dtype"] :
+                
+                case "int" :
+                    dpg.add_input_int( tag=str(node_id) + "_" + p["name"],
+                                       parent=parent,
+                                       label=p["name"], 
+                                       default_value=int(p["value"]),
+                                       callback=node_input_callback, 
+                                       width=100, 
+                                       user_data=model_data
+                                     )
+                
+                case "float" :
+                    dpg.add_input_float( tag=str(node_id) + "_" + p["name"],
+                                         parent=parent,
+                                         label=p["name"],
+                                         default_value=float(p["value"]),
+                                         callback=node_input_callback, 
+                                         width=100, 
+                                         user_data=model_data
+                                       )
+                
+                case "bool" :
+                    dpg.add_combo( tag=str(node_id) + "_" + p["name"],
+                                   parent=parent,
+                                   label=p["name"], 
+                                   default_value=bool(p["value"]),
+                                   callback=node_input_callback, 
+                                   width=100,
+                                   items=[True, False],
+                                   user_data=model_data
+                                 )
+                    
+                case _ :
+                    dpg.add_input_text( tag=str(node_id) + "_" + p["name"],
+                                        parent=parent,
+                                        label=p["name"], 
+                                        default_value=p["value"],
+                                        callback=node_input_callback, 
+                                        width=100,
+                                        user_data=model_data
+                                      )
 
 
-def create_display_info( node_id, model_manager, show=False ) :
+def collapse_node( node_id ) :
 
     """
-    create info window items
+    delete the parameter items of a node, only the toggle is kept
     """
 
-    print("create display for id: ", node_id)
+    if not node_id in expanded_nodes :
+        return
+    
+    expanded_nodes.discard( node_id )
+
+    toggle = dpg.get_alias_id( str(node_id) + "_expand" )
+
+    for item in dpg.get_item_children( str(node_id) + "_static", 1 ) :
 
-    info_lable = get_info_item_name( node_id )
+        if item != toggle :
 
-    if dpg.does_alias_exist( info_lable ) :
+            dpg.delete_item( item )
 
-        dpg.delete_item( info_lable )
+    dpg.configure_item( toggle, label="+" )
 
-    with dpg.group( tag=info_lable, label=info_lable, parent=info_window_name, show=show ) :
+
+
+################################### layer window #########################################
+
+# None
+
+
+
+################################### info_window ##########################################
+
+
+def create_info_panel( model_manager ) :
+
+    """
+    create the info window items once, they are bound to the
+    selected node by display_info
+    """
+
+    with dpg.group( tag=info_panel_name, label=info_panel_name, parent=info_window_name, show=False ) :
         
         dpg.add_text( "ATTRIBUTES ", color=ColorPalette.DIM_GRAY )
 
@@ -431,385 +672,1173 @@ def create_display_info( node_id, model_manager, show=False ) :
 
             dpg.add_text( "Name  ", color=ColorPalette.PERU )
 
-            dpg.add_input_text( default_value=model_manager.get_layer_name(node_id), 
-                                callback=change_name_callback,
-                                user_data=[model_manager, node_id],
-                                on_enter=True,
-                                width=-1
-                              )
+            info_widgets["name"] = dpg.add_input_text( callback=change_name_callback,
+                                                       user_data=[model_manager, -1],
+                                                       on_enter=True,
+                                                       width=-1
+                                                     )
         
         with dpg.group( horizontal=True ) :
 
             dpg.add_text( "ID#   ", color=ColorPalette.DIM_GRAY )
-            dpg.add_text( default_value=node_id )
+            info_widgets["id"] = dpg.add_text()
         
         with dpg.group( horizontal=True ) :
 
             dpg.add_text( "Type  ", color=ColorPalette.GRAY )
-            dpg.add_text( default_value=model_manager.get_layer_type(node_id) )
+            info_widgets["type"] = dpg.add_text()
         
         with dpg.group( horizontal=True ) :
 
             dpg.add_text( "Before", color=ColorPalette.GRAY )
-            dpg.add_text( default_value=model_manager.get_links(node_id)[0] )
+            info_widgets["before"] = dpg.add_text()
 
         with dpg.group( horizontal=True ) :
 
             dpg.add_text( "After ", color=ColorPalette.GRAY )
-            dpg.add_text( default_value=model_manager.get_links(node_id)[1] )
+            info_widgets["after"] = dpg.add_text()
 
         dpg.add_separator()
         
         dpg.add_text( "PARAMETERS", color=ColorPalette.DIM_GRAY )
 
-        for p in model_manager.get_params( node_id ) :
-
-            if  not bool(p) :
-                break
-
-            print("params: ", p["name"])
-
-            with dpg.group( horizontal=True ) :
-
-                if int(p["enabled"]) :
-
-                    dpg.add_text( p["name"], color=ColorPalette.PERU )
-
-                else :
-                    
-                    dpg.add_text( str(p["name"]) + ": " + str(p["description"]), 
-                                  color=ColorPalette.DIM_GRAY
-                                )
-                    continue
-
-                match p["dtype"] :
-
-                    case "int" :
-                        dpg.add_input_int( default_value=p["value"], 
-                                           callback=change_param_callback,
-                                           user_data=[model_manager, node_id, p["name"], p["dtype"]],
-                                           width=-1
-                                         )
-                    case "double" :
-                        dpg.add_input_float( default_value=p["value"], 
-                                             callback=change_param_callback,
-                                             user_data=[model_manager, node_id, p["name"], p["dtype"]],
-                                             width=-1
-                                           )
-                    case "float" :
-                        dpg.add_input_float( default_value=p["value"], 
-                                             callback=change_param_callback,
-                                             user_data=[model_manager, node_id, p["name"], p["dtype"]],
-                                             width=-1
-                                           )
-                    case "bool":
-                        dpg.add_combo( default_value=p["value"], items=[True, False], 
-                                       callback=change_param_callback,
-                                       user_data=[model_manager, node_id, p["name"], p["dtype"]],
-                                       width=-1
-                                     )
-                    case _:
-                        dpg.add_input_text( default_value=p["value"], 
-                                            callback=change_param_callback,
-                                            user_data=[model_manager, node_id, p["name"], p["dtype"]],
-                                            width=-1
-                                          )
-
+        # filled by create_info_params, depends on the layer type
+        info_widgets["params"] = dpg.add_group()
 
         dpg.add_separator()
 
-        _name = model_manager.get_group_name(node_id)
-
         dpg.add_text( "GROUP ", color=ColorPalette.DIM_GRAY )
 
         with dpg.group( horizontal=True ) :
 
-            dpg.add_combo( items=model_manager.get_group_names(),
-                           default_value=_name,
-                           tag=str(node_id)+"_combo",
-                           callback=group_change_callback,
-                           user_data=model_manager
-                         )
+            info_widgets["group"] = dpg.add_combo( callback=group_change_callback,
+                                                   user_data=model_manager
+                                                 )
 
         with dpg.group( horizontal=True ) :
 
             dpg.add_text( "Type  ", color=ColorPalette.DIM_GRAY )
-            dpg.add_text( default_value=model_manager.get_group_attribute(_name, "type") )
+            info_widgets["group_type"] = dpg.add_text()
 
         with dpg.group( horizontal=True ) :
 
             dpg.add_text( "Color ", color=ColorPalette.DIM_GRAY )
-            dpg.add_color_button( default_value=model_manager.get_group_attribute(_name, "color") )
+            info_widgets["group_color"] = dpg.add_color_button()
 
 
-def change_name_callback( sender, app_data, user_data ) :
+def display_info( node_id, model_manager ) :
 
     """
-    called by info window - name
+    bind the info panel to a node, the parameter items are only
+    rebuilt if the layer type changes
     """
 
-    model_data = user_data[0]
-    node_id = user_data[1]
-    name = app_data
-
-    # update model
-    model_data.set_layer_name( node_id, str(name) )
-
-    # update node
-    dpg.configure_item( node_id, label=name )
-
-    # TODO
-    # check for type
-    print("testets: ", name, dpg.get_item_configuration(node_id)["label"])
-
+    global info_bound_node
 
-def change_param_callback( sender, app_data, user_data ) :
-
-    """
-    called by info window - param
-    """
-
-    model_data = user_data[0]
-    node_id = user_data[1]
-    param_name = user_data[2]
-    param_type = user_data[3]
+    if info_bound_node != node_id :
 
-    value = app_data
+        info_bound_node = node_id
 
-    # update model
-    model_data.set_param_value( node_id, param_name, value )
+        dpg.set_item_user_data( info_widgets["name"], [model_manager, node_id] )
 
-    # updata node
-    dpg.configure_item( str(node_id) + "_" + param_name, default_value=value )
+        if info_bound_values.get("type") != model_manager.get_layer_type(node_id) :
 
+            create_info_params( node_id, model_manager )
 
+        else :
 
-# info helper functions
+            # same layer type, rebind the parameter items
+            for item in info_param_widgets.values() :
 
-def get_info_item_name( node_id ) :
+                user_data = dpg.get_item_user_data( item )
+                dpg.set_item_user_data( item, [model_manager, node_id] + user_data[2:] )
 
-    return "Layer Attributes_" + str(node_id)
+        update_display_info( node_id, model_manager, *info_fields )
+        update_display_info( node_id, model_manager, *info_param_widgets )
 
-################################### group windows ########################################
+    dpg.show_item( info_panel_name )
 
 
-def group_editor_callback( sender, app_data, user_data ) :
+def update_display_info( node_id, model_manager, *fields ) :
 
     """
-    called by "group_manager" - buttons (Add, Edit)
-
-     This call the group editor window to show
-     If the caller is the button "Add", leave empty field on editor.
-     If the caller is the button "Edit", fill the fiels with the group info
-     of the group selected on the listbox.
+    update the given fields of the info panel if it displays the node,
+    only the items whose value differ are changed
     """
 
-    model_data = user_data
+    if info_bound_node != node_id :
+        return
 
-    print("model: ", type(model_data))
+    for field in fields :
 
-    # get selected group
-    group_name = get_selected_group_name()
+        match field :
 
-    if dpg.get_item_alias(sender) == group_edit :
+            case "name" :
+                value = model_manager.get_layer_name( node_id )
+            case "id" :
+                value = str( node_id )
+            case "type" :
+                value = model_manager.get_layer_type( node_id )
+            case "before" :
+                value = str( model_manager.get_links(node_id)[0] )
+            case "after" :
+                value = str( model_manager.get_links(node_id)[1] )
+            case "group" :
+                value = model_manager.get_group_name( node_id )
+            case "group_type" :
+                value = model_manager.get_group_attribute( model_manager.get_group_name(node_id), "type" )
+            case "group_color" :
+                value = model_manager.get_group_attribute( model_manager.get_group_name(node_id), "color" )
+            case "group_items" :
+                value = model_manager.get_group_names()
+            case _ :
+                value = model_manager.get_param_value( node_id, field[len("param_"):] )
 
-        # if the editor not show, unhide it
-        if dpg.does_item_exist( group_edit_window_name ) :
-            show_editor()
+        if field in info_bound_values and info_bound_values[field] == value :
+            continue
 
-        # if edit mode, prefill the fields with current attributes
-        fill_group_editor( model_data, group_name )
+        info_bound_values[field] = value
 
-    if dpg.get_item_alias(sender) == group_remove :
+        if field == "group_items" :
 
-        if len( model_data.get_group_attribute(group_name, "members") ) == 0 :
-            
-            # remove empty group
-            model_data.remove_group( group_name )
+            dpg.configure_item( info_widgets["group"], items=value )
 
-            # update other items related to group
-            dpg.configure_item( group_listbox, items=model_data.get_group_names() )
-            dpg.configure_item( group_combo_selector_name, items=model_data.get_group_names() )
+        elif field in info_widgets :
 
-            # update display
-            for selected_node in dpg.get_selected_nodes( node_editor_name ) :
-                
-                update_node_theme( selected_node, model_data )
-                create_display_info( selected_node, model_data, show=True )
-    
-        else :
+            dpg.set_value( info_widgets[field], value )
 
-            logging.error("Can't remove non-empty group.")
+        elif field in info_param_widgets :
 
+            dpg.set_value( info_param_widgets[field], value )
 
 
-def group_change_callback( sender, app_data, user_data ) :
+def create_info_params( node_id, model_manager ) :
 
     """
-    called by "group_editor" - buttons OK
+    create the parameter items of the info panel for a node
     """
 
-    model_data = user_data
-    parent = sender
+    params_group = info_widgets["params"]
 
-    group_name = get_selected_group_name()
+    dpg.delete_item( params_group, children_only=True )
 
-    # if sender is the add button, add directly the new group
-    if dpg.get_item_alias(parent) == group_edit_window_name + "_add" :
+    for field in info_param_widgets :
 
-        print("editor fields: ", pull_editor())
-        model_data.add_custom_new_group( *pull_editor() )
+        info_bound_values.pop( field, None )
 
-    # if sender is the update button, update the existing info
-    elif dpg.get_item_alias(parent) == group_edit_window_name + "_update" :
-            
-            new_name, new_type, new_color = pull_editor()
-            
-            model_data.change_group_name( group_name, new_name )
-            group_name = new_name
-            
-            model_data.set_group_attribute( group_name, "type", new_type ) 
-            model_data.set_group_attribute( group_name, "color", new_color )
+    info_param_widgets.clear()
 
-    # update other items related to group
-    dpg.configure_item( group_listbox, items=model_data.get_group_names() )
-    dpg.configure_item( group_combo_selector_name, items=model_data.get_group_names() )
-    
-    # update display
-    for selected_node in dpg.get_selected_nodes( node_editor_name ) :
+    for p in model_manager.get_params( node_id ) :
 
-        update_node_theme( selected_node, model_data )
-        create_display_info( selected_node, model_data, show=True )
+        if  not bool(p) :
+            break
 
+        with dpg.group( horizontal=True, parent=params_group ) :
 
- 
-def group_selected_callback( sender, app_data, user_data ) :
+            if int(p["enabled"]) :
 
-    """
-    called by "group_grouper" - buttons Yes
-    """
+                dpg.add_text( p["name"], color=ColorPalette.PERU )
 
-    global selected_nodes
+            else :
+                
+                dpg.add_text( str(p["name"]) + ": " + str(p["description"]), 
+                              color=ColorPalette.DIM_GRAY
+                            )
+                continue
+
+            param_data = [model_manager, node_id, p["name"], p["dtype"]]
+
+            match p["dtype"] :
+
+                case "int" :
+                    item = dpg.add_input_int( default_value=p["value"], 
+                                              callback=change_param_callback,
+                                              user_data=param_data,
+                                              width=-1
+                                            )
+                case "double" :
+                    item = dpg.add_input_float( default_value=p["value"], 
+                                                callback=change_param_callback,
+                                                user_data=param_data,
+                                                width=-1
+                                              )
+                case "float" :
+                    item = dpg.add_input_float( default_value=p["value"], 
+                                                callback=change_param_callback,
+                                                user_data=param_data,
+                                                width=-1
+                                              )
+                case "bool":
+                    item = dpg.add_combo( default_value=p["value"], items=[True, False], 
+                                          callback=change_param_callback,
+                                          user_data=param_data,
+                                          width=-1
+                                        )
+                case _:
+                    item = dpg.add_input_text( default_value=p["value"], 
+                                               callback=change_param_callback,
+                                               user_data=param_data,
+                                               width=-1
+                                             )
+            
+            info_param_widgets["param_" + p["name"]] = item
+            info_bound_values["param_" + p["name"]] = p["value"]
 
-    model_data = user_data
 
-    group_name = dpg.get_value( group_combo_selector_name )
+# unbind and hide the info panel
+def hide_display_info() :
 
-    option = dpg.get_item_alias( sender )
+    global info_bound_node
 
-    if option == group_yes :
+    info_bound_node = -1
 
-        for node_id in selected_nodes :
+    # the next binding rebuilds the parameter items and sets every field
+    info_bound_values.clear()
+    info_param_widgets.clear()
 
-            print("selected groups: ", node_id)
+    dpg.hide_item( info_panel_name )
 
-            # update group info on model data
-            model_data.assign_group( node_id, group_name )
 
-            # update corresponding nodes
-            update_node_theme( node_id, model_data )
+def change_name_callback( sender, app_data, user_data ) :
 
-    if option == group_no :
-        dpg.configure_item( group_group_window_name, show=False )
+    """
+    called by info window - name
+    """
+
+    model_data = user_data[0]
+    node_id = user_data[1]
+    name = app_data
+
+    # update model, the node and the info item follow the change event
+    model_data.set_layer_name( node_id, str(name) )
+
+    # TODO
+    # check for type
+    if trace_info.on :
+        trace_info.emit( node=node_id, name=name )
+
+
+def change_param_callback( sender, app_data, user_data ) :
+
+    """
+    called by info window - param
+    """
+
+    model_data = user_data[0]
+    node_id = user_data[1]
+    param_name = user_data[2]
+    param_type = user_data[3]
+
+    value = app_data
+
+    # update model, as an undo entry
+    model_data.set_params_values( [node_id], param_name, value )
+
+
+def bulk_edit_show_callback( sender, app_data, user_data ) :
+
+    """
+    called by menu Edit - Bulk Edit
+    """
+
+    model_data = user_data
+
+    fill_bulk_editor( model_data )
+
+    dpg.configure_item( bulk_window_name, show=True )
+    dpg.focus_item( bulk_window_name )
+
+
+def bulk_edit_callback( sender, app_data, user_data ) :
+
+    """
+    called by bulk edit window - Apply
+
+     The parameter is changed on all the selected layers having it with
+     the same data type, in one batch of the model (one undo entry), the
+     items are refreshed once by the change events.
+    """
+
+    model_data = user_data
+
+    param_name = dpg.get_value( bulk_param )
+
+    layer_ids = [ i for i in bulk_edit_nodes if i in model_data.get_all_layer_ids() ]
+
+    dtypes = get_param_dtypes( layer_ids, model_data ).get( param_name )
+
+    if not dtypes :
+
+        logging.warning("No selected layer has the parameter %s.", param_name)
+        return
+
+    # the value is typed like the parameter of the first layer having it
+    dtype = dtypes[0]
+
+    try :
+
+        value = cast_param_value( dpg.get_value( bulk_value ), dtype )
+
+    except ValueError :
+
+        logging.warning("Invalid value for %s (%s).", param_name, dtype)
+        return
+
+    layer_ids = [ i for i in layer_ids if param_name in model_data.get_params_names(i) 
+                  and model_data.get_params(i)[model_data.get_params_names(i)[param_name]]["dtype"] == dtype ]
+
+    changed = model_data.set_params_values( layer_ids, param_name, value )
+
+    dpg.set_value( bulk_status, str( len(changed) ) + " of " + str( len(bulk_edit_nodes) ) + " layer(s) changed" )
+
+
+def undo_callback( sender, app_data, user_data ) :
+
+    """
+    called by menu Edit - Undo and by input_handler : "node_inputs" - ctrl+z
+    """
+
+    model_data = user_data
+
+    # the key handler fires on z alone as well
+    if sender is not None and dpg.get_item_type( sender ) == "mvAppItemType::mvKeyReleaseHandler" :
+
+        if not dpg.is_key_down( dpg.mvKey_Control ) :
+            return
+
+        # ctrl+z in an input being edited belongs to the input
+        focused = dpg.get_focused_item()
+
+        if focused and dpg.does_item_exist( focused ) and dpg.is_item_active( focused ) :
+            return
+
+    model_data.undo()
+
+
+# function to show a batch of parameter changes, the info panel is updated once
+def refresh_param_items( changes, model_data ) :
+
+    params = set()
+
+    for node_id, param_name in changes :
+
+        # the node items, if its parameters are shown
+        item = str(node_id) + "_" + param_name
+
+        if dpg.does_item_exist( item ) :
+
+            dpg.set_value( item, model_data.get_param_value( node_id, param_name ) )
+
+        if node_id == info_bound_node :
+
+            params.add( "param_" + param_name )
+
+    if params :
+
+        update_display_info( info_bound_node, model_data, *params )
+
+
+# function to fill the bulk edit window with the selected layers
+def fill_bulk_editor( model_data, node_ids=None ) :
+
+    global bulk_edit_nodes
+
+    if node_ids is None :
+
+        node_ids = dpg.get_selected_nodes( node_editor_name )
+
+    ids = model_data.get_all_layer_ids()
+
+    bulk_edit_nodes = [ i for i in node_ids if i in ids ]
+
+    names = sorted( get_param_dtypes( bulk_edit_nodes, model_data ) )
+
+    dpg.configure_item( bulk_param, items=names )
+
+    if not dpg.get_value( bulk_param ) in names :
+
+        dpg.set_value( bulk_param, names[0] if names else "" )
+
+    dpg.set_value( bulk_status, str( len(bulk_edit_nodes) ) + " layer(s) selected" )
+
+
+# function returning the enabled parameters of layers, name -> data types
+def get_param_dtypes( layer_ids, model_data ) :
+
+    dtypes = {}
+
+    for layer_id in layer_ids :
+
+        for p in model_data.get_params( layer_id ) :
+
+            if p and int( p["enabled"] ) and not p["dtype"] in dtypes.get( p["name"], [] ) :
+
+                dtypes.setdefault( p["name"], [] ).append( p["dtype"] )
+
+    return dtypes
+
+
+# function converting a text to the type of the info panel items of a data type
+def cast_param_value( text, dtype ) :
+
+    match dtype :
+
+        case "int" :
+            return int( text )
+        case "double" | "float" :
+            return float( text )
+        case "bool" :
+            return text.strip().lower() in ( "true", "1" )
+        case _ :
+            return text
+
+
+
+################################### group windows ########################################
+
+
+def group_editor_callback( sender, app_data, user_data ) :
+
+    """
+    called by "group_manager" - buttons (Add, Edit)
+
+     This call the group editor window to show
+     If the caller is the button "Add", leave empty field on editor.
+     If the caller is the button "Edit", fill the fiels with the group info
+     of the group selected on the listbox.
+    """
+
+    model_data = user_data
+
+    # get selected group
+    group_name = get_selected_group_name()
+
+    if dpg.get_item_alias(sender) == group_edit :
+
+        # if the editor not show, unhide it
+        if dpg.does_item_exist( group_edit_window_name ) :
+            show_editor()
+
+        # if edit mode, prefill the fields with current attributes
+        fill_group_editor( model_data, group_name )
+
+    if dpg.get_item_alias(sender) == group_remove :
+
+        if len( model_data.get_group_attribute(group_name, "members") ) == 0 :
+            
+            # remove empty group, the lists follow the change event
+            model_data.remove_group( group_name )
+            remove_group_theme( group_name )
+    
+        else :
+
+            logging.error("Can't remove non-empty group.")
+
+
+
+def group_change_callback( sender, app_data, user_data ) :
+
+    """
+    called by "group_editor" - buttons OK
+    """
+
+    model_data = user_data
+    parent = sender
+
+    group_name = get_selected_group_name()
+
+    # if sender is the add button, add directly the new group
+    if dpg.get_item_alias(parent) == group_edit_window_name + "_add" :
+
+        new_name, new_type, new_color, new_repeat = pull_editor()
+
+        if not new_name in model_data.get_group_names() :
+
+            # a theme left by a removed group of the same name
+            remove_group_theme( new_name )
+
+        model_data.add_custom_new_group( new_name, new_type, new_color )
+
+        if new_name in model_data.get_group_names() :
+
+            model_data.set_group_repeat( new_name, new_repeat )
+
+    # if sender is the update button, update the existing info
+    elif dpg.get_item_alias(parent) == group_edit_window_name + "_update" :
+            
+            new_name, new_type, new_color, new_repeat = pull_editor()
+            
+            if model_data.change_group_name( group_name, new_name ) :
+
+                rename_group_theme( group_name, new_name )
+                group_name = new_name
+            
+            model_data.set_group_attribute( group_name, "type", new_type ) 
+            model_data.set_group_attribute( group_name, "color", new_color )
+
+            # recolor all the member nodes at once
+            update_group_theme( group_name, model_data )
+
+            if new_repeat != model_data.get_group_repeat( group_name ) :
+
+                set_group_repeat( group_name, new_repeat, model_data )
+
+    # the group lists and the info panel follow the change events
+
+
+ 
+def group_selected_callback( sender, app_data, user_data ) :
+
+    """
+    called by "group_grouper" - buttons Yes
+    """
+
+    global selected_nodes
+
+    model_data = user_data
+
+    group_name = dpg.get_value( group_combo_selector_name )
+
+    option = dpg.get_item_alias( sender )
+
+    if option == group_yes :
+
+        expand_group( group_name, model_data )
+
+        # the node themes follow the change events
+        with model_data.transaction() :
+
+            for node_id in selected_nodes :
+
+                model_data.assign_group( node_id, group_name )
+
+    if option == group_no :
+        dpg.configure_item( group_group_window_name, show=False )
+
+    # clear selected nodes
+    selected_nodes.clear()
+    
+    # hide group window
+    hide_group()
+
+
+def group_collapse_callback( sender, app_data, user_data ) :
+
+    """
+    called by "group_manager" - buttons (Collapse, Expand)
+    """
+
+    model_data = user_data
+
+    group_name = get_selected_group_name()
+
+    if not group_name in model_data.get_group_names() :
+        return
+
+    if dpg.get_item_alias(sender) == group_collapse :
+
+        collapse_group( group_name, model_data )
+
+    if dpg.get_item_alias(sender) == group_expand :
+
+        expand_group( group_name, model_data )
+
+
+""""
+"""""""""""""""""""""""""""""""""""""
+ helper functions fro group windows
+"""""""""""""""""""""""""""""""""""""
+"""
+
+
+# function to fill up editor fields
+def fill_group_editor( model_data, group_name=None ) :
+
+    if not group_name :
+
+        group_name = ""
+
+    gtype = model_data.get_group_attribute( group_name, "type" )
+    gcolor = model_data.get_group_attribute( group_name, "color" )
+    grepeat = model_data.get_group_repeat( group_name )
+    
+    #group_name = dpg.get_value("group_listbox")
+
+    if  dpg.does_item_exist(group_edit_window_name) and \
+        dpg.is_item_shown(group_edit_window_name) == True :
+
+        dpg.set_value( "input_group_name", group_name )
+        dpg.set_value( "input_group_type", gtype )
+        dpg.set_value( "group_color_picker", gcolor )
+        dpg.set_value( "input_group_repeat", grepeat )
+
+
+# function to retrieve editor fields' values
+def pull_editor() :
+
+    if  dpg.does_item_exist(group_edit_window_name) and \
+        dpg.is_item_shown(group_edit_window_name) == True :
+
+        return ( dpg.get_value("input_group_name"), 
+                 dpg.get_value("input_group_type"), 
+                 dpg.get_value("group_color_picker"),
+                 dpg.get_value("input_group_repeat")
+               )
+
+
+# function to fill up manager fields
+def fill_group_manager( model_data ) :
+
+    dpg.configure_item( group_listbox, 
+                        items=model_data.get_group_names()
+                      )
+
+
+# function to retrieve manager fields' values 
+def get_selected_group_name() :
+
+    return dpg.get_value( group_listbox )
+
+
+# function to manage group windows appereaces
+def show_editor() :
+
+    if not dpg.is_item_shown( group_edit_window_name ) :
+
+        dpg.configure_item( group_edit_window_name, show=True )
+        dpg.focus_item( group_edit_window_name )
+
+
+def show_group() :
+
+    if not dpg.is_item_shown( group_group_window_name ) :
+
+        dpg.configure_item( group_group_window_name, show=True )
+        dpg.focus_item( group_group_window_name )
+
+
+def show_manager() :
+
+    if not dpg.is_item_shown(group_manager_window_name) :
+
+        dpg.configure_item( group_manager_window_name, show=True )
+        dpg.focus_item( group_manager_window_name )
+
+
+def hide_editor() :
+
+    dpg.configure_item( group_edit_window_name, show=False )
+
+
+def hide_group() :
+
+    dpg.configure_item( group_group_window_name, show=False )
+
+
+def hide_manager() :
+
+    dpg.configure_item( group_manager_window_name, show=False )
+
+
+
+
+# function to draw a group as a single meta-node
+def collapse_group( group_name, model_data ) :
+
+    """
+    The meta-node has one input per entry layer and one output per 
+    exit layer of the group, the members and their links are hidden
+    """
+
+    if group_name in meta_nodes :
+        return
+    
+    members = set( i for i in model_data.get_group_attribute( group_name, "members" ) 
+                   if dpg.does_item_exist(i) )
+
+    if not members :
+        return
+
+    entries = set( model_data.find_start_nodes( group_name ) ) & members
+    exits = set( model_data.find_end_nodes( group_name ) ) & members
+
+    hidden_links = set()
+
+    for layer_id in members :
+
+        for link_id in link_registry.get_node_links( layer_id ) :
+
+            attr_1, attr_2, node1, node2 = link_registry.get_link( link_id )
+            hidden_links.add( link_id )
+
+            # layers linked from/to outside are ports as well
+            if not node1 in members :
+                entries.add( node2 )
+
+            if not node2 in members :
+                exits.add( node1 )
+
+    positions = [ model_data.get_layer_pos(i) for i in members ]
+    pos = [ min( p[0] for p in positions ), min( p[1] for p in positions ) ]
+
+    in_ports = {}
+    out_ports = {}
+
+    repeat = model_data.get_group_repeat( group_name )
+
+    label = group_name + " [" + str(len(members)) + "]"
+
+    if repeat > 1 :
+        label += " x" + str(repeat)
+
+    with dpg.node( label=label, 
+                   parent=node_editor_name, 
+                   pos=pos 
+                 ) as meta_node :
+
+        # a repeated block is drawn as a stack of its copies
+        if repeat > 1 :
+
+            with dpg.node_attribute( attribute_type=dpg.mvNode_Attr_Static ) :
+
+                for i in range( min(repeat, 4) ) :
+
+                    dpg.add_text( "[" + group_name + "]", indent=6 * i )
+
+                if repeat > 4 :
+
+                    dpg.add_text( "... x" + str(repeat), indent=24 )
+
+        for layer_id in sorted( entries ) :
+
+            with dpg.node_attribute( attribute_type=dpg.mvNode_Attr_Input ) as attr :
+
+                dpg.add_text( model_data.get_layer_name(layer_id) )
+
+            in_ports[layer_id] = attr
+            meta_ports[attr] = layer_id
+
+        for layer_id in sorted( exits ) :
+
+            with dpg.node_attribute( attribute_type=dpg.mvNode_Attr_Output ) as attr :
+
+                dpg.add_text( model_data.get_layer_name(layer_id), indent=80 )
+
+            out_ports[layer_id] = attr
+            meta_ports[attr] = layer_id
+
+    dpg.bind_item_theme( meta_node, get_group_theme( group_name, model_data ) )
+
+    # hide members and their links
+    for link_id in hidden_links :
+
+        dpg.configure_item( link_id, show=False )
+
+    for layer_id in members :
+
+        dpg.configure_item( layer_id, show=False )
+        meta_layers[layer_id] = group_name
+
+    meta_nodes[group_name] = { "node": meta_node,
+                               "members": members,
+                               "in_ports": in_ports,
+                               "out_ports": out_ports,
+                               "links": hidden_links
+                             }
+    
+    level_of_detail.exclude( members, hidden_links )
+
+    model_data.set_group_collapsed( group_name, True )
+
+    update_meta_links()
+
+
+# function to draw back the members of a collapsed group
+def expand_group( group_name, model_data ) :
+
+    if not group_name in meta_nodes :
+        return
+    
+    meta = meta_nodes.pop( group_name )
+
+    for layer_id in meta["members"] :
+
+        meta_layers.pop( layer_id, None )
+
+        if dpg.does_item_exist( layer_id ) :
+
+            dpg.configure_item( layer_id, show=True )
+
+    # links to another collapsed group stay hidden
+    shown_links = set()
+
+    for link_id in meta["links"] :
+
+        entry = link_registry.get_link( link_id )
+
+        if entry is None or entry[2] in meta_layers or entry[3] in meta_layers :
+            continue
+
+        dpg.configure_item( link_id, show=True )
+        shown_links.add( link_id )
+
+    for attr in list( meta["in_ports"].values() ) + list( meta["out_ports"].values() ) :
+
+        meta_ports.pop( attr, None )
+
+    update_meta_links()
+
+    dpg.delete_item( meta["node"] )
+
+    level_of_detail.include( meta["members"], shown_links )
+    level_of_detail.update( model_data )
+
+    model_data.set_group_collapsed( group_name, False )
+
+
+# function to change the repeat count of a group, repeated groups are drawn stacked
+def set_group_repeat( group_name, repeat, model_data ) :
+
+    model_data.set_group_repeat( group_name, repeat )
+
+    # redraw the meta-node with the new count
+    expand_group( group_name, model_data )
+
+    if model_data.get_group_repeat( group_name ) > 1 :
+
+        collapse_group( group_name, model_data )
+
+
+# function to redraw the links between meta-nodes and other nodes
+def update_meta_links() :
+
+    for link_id in proxy_links :
+
+        if dpg.does_item_exist( link_id ) :
+
+            dpg.delete_item( link_id )
+
+    proxy_links.clear()
+
+    for group_name, meta in meta_nodes.items() :
+
+        # links entering the group
+        for layer_id, port in meta["in_ports"].items() :
+
+            for link_id in link_registry.get_in_links( layer_id ) :
+
+                attr_1, attr_2, node1, node2 = link_registry.get_link( link_id )
+
+                if meta_layers.get( node1 ) == group_name :
+                    continue
+
+                if node1 in meta_layers :
+
+                    attr_1 = meta_nodes[meta_layers[node1]]["out_ports"][node1]
+
+                proxy_links.add( dpg.add_node_link( attr_1, port, parent=node_editor_name ) )
+
+        # links leaving the group, the ones to another meta-node are done above
+        for layer_id, port in meta["out_ports"].items() :
+
+            for link_id in link_registry.get_out_links( layer_id ) :
+
+                attr_1, attr_2, node1, node2 = link_registry.get_link( link_id )
+
+                if node2 in meta_layers :
+                    continue
+
+                proxy_links.add( dpg.add_node_link( port, attr_2, parent=node_editor_name ) )
+
+
+
+################################### search window ########################################
+
+
+def search_callback( sender, app_data, user_data ) :
+
+    """
+    called by search window - input
+
+     The query is a list of key=value terms, the keys type, category
+     and group filter on the layer, any other key on a parameter value.
+     Other words are searched in the layer names.
+    """
+
+    model_data = user_data
+
+    conditions, words = parse_search( dpg.get_value( search_input ) )
+
+    where = None
+
+    if words :
+
+        where = lambda layer : all( w in layer["name"].lower() for w in words )
+
+    layer_ids = model_data.query( where=where, **conditions )
+
+    search_result_ids.clear()
+
+    for layer_id in layer_ids :
+
+        label = model_data.get_layer_name( layer_id ) + "  #" + str( layer_id )
+        search_result_ids[label] = layer_id
+
+    dpg.configure_item( search_results, items=list( search_result_ids ) )
+    dpg.set_value( search_status, str( len(layer_ids) ) + " layer(s)" )
+
+    highlight_nodes( layer_ids, model_data )
+
+
+def search_result_callback( sender, app_data, user_data ) :
+
+    """
+    called by search window - results
+
+     dearpygui can not select or scroll to a node of the editor, the
+     result is shown in the info panel and stays highlighted
+    """
+
+    model_data = user_data
+
+    layer_id = search_result_ids.get( app_data )
+
+    if layer_id is None or not layer_id in model_data.get_all_layer_ids() :
+        return
+
+    display_info( layer_id, model_data )
+
+    dpg.focus_item( info_window_name )
+
+
+# search keys of the layer fields -> arguments of ModelManager.query
+search_fields = { "type": "layer_type", "category": "category", "group": "group_name" }
+
+
+# function to split a query into conditions for ModelManager.query and name words
+def parse_search( text ) :
+
+    conditions = {}
+    params = {}
+    words = []
+
+    for term in text.split() :
+
+        key, sep, value = term.partition( "=" )
+
+        if not sep :
+
+            words.append( term.lower() )
+
+        elif key in search_fields :
 
-    # clear selected nodes
-    selected_nodes.clear()
-    
-    # hide group window
-    hide_group()
+            conditions[search_fields[key]] = value
 
+        else :
 
-""""
-"""""""""""""""""""""""""""""""""""""
- helper functions fro group windows
-"""""""""""""""""""""""""""""""""""""
-"""
+            params[key] = value
 
+    if params :
 
-# function to fill up editor fields
-def fill_group_editor( model_data, group_name=None ) :
+        conditions["params"] = params
 
-    if not group_name :
+    return conditions, words
 
-        group_name = ""
 
-    gtype = model_data.get_group_attribute( group_name, "type" )
-    gcolor = model_data.get_group_attribute( group_name, "color" )
-    
-    #group_name = dpg.get_value("group_listbox")
+# function to highlight the result nodes, the previous ones get back their group theme
+def highlight_nodes( node_ids, model_data ) :
 
-    if  dpg.does_item_exist(group_edit_window_name) and \
-        dpg.is_item_shown(group_edit_window_name) == True :
+    global highlight_theme
 
-        dpg.set_value( "input_group_name", group_name )
-        dpg.set_value( "input_group_type", gtype )
-        dpg.set_value( "group_color_picker", gcolor )
+    if highlight_theme is None :
 
+        with dpg.theme() as highlight_theme :
+            with dpg.theme_component( dpg.mvNode ) :
 
-# function to retrieve editor fields' values
-def pull_editor() :
+                dpg.add_theme_color( dpg.mvNodeCol_TitleBar, ColorPalette.GOLD, category=dpg.mvThemeCat_Nodes )
+                dpg.add_theme_color( dpg.mvNodeCol_NodeOutline, ColorPalette.GOLD, category=dpg.mvThemeCat_Nodes )
 
-    if  dpg.does_item_exist(group_edit_window_name) and \
-        dpg.is_item_shown(group_edit_window_name) == True :
+    layer_ids = model_data.get_all_layer_ids()
 
-        return ( dpg.get_value("input_group_name"), 
-                 dpg.get_value("input_group_type"), 
-                 dpg.get_value("group_color_picker")
-               )
+    for node_id in highlighted_nodes - set( node_ids ) :
 
+        if node_id in layer_ids and dpg.does_item_exist( node_id ) :
 
-# function to fill up manager fields
-def fill_group_manager( model_data ) :
+            update_node_theme( node_id, model_data )
 
-    dpg.configure_item( group_listbox, 
-                        items=model_data.get_group_names()
-                      )
+    highlighted_nodes.clear()
 
+    for node_id in node_ids :
 
-# function to retrieve manager fields' values 
-def get_selected_group_name() :
+        # nodes of collapsed groups or hidden by the level of detail are not drawn
+        if dpg.does_item_exist( node_id ) :
 
-    return dpg.get_value( group_listbox )
+            dpg.bind_item_theme( node_id, highlight_theme )
+            highlighted_nodes.add( node_id )
 
 
-# function to manage group windows appereaces
-def show_editor() :
+# function to drop deleted nodes from the search, the query is run again if any
+def forget_search_nodes( node_ids, model_data ) :
 
-    if not dpg.is_item_shown( group_edit_window_name ) :
+    node_ids = set( node_ids )
 
-        dpg.configure_item( group_edit_window_name, show=True )
-        dpg.focus_item( group_edit_window_name )
+    if not node_ids :
+        return
 
+    highlighted_nodes.difference_update( node_ids )
 
-def show_group() :
+    for label, layer_id in list( search_result_ids.items() ) :
 
-    if not dpg.is_item_shown( group_group_window_name ) :
+        if layer_id in node_ids :
+            search_result_ids.pop( label )
 
-        dpg.configure_item( group_group_window_name, show=True )
-        dpg.focus_item( group_group_window_name )
+    if dpg.does_item_exist( search_input ) and dpg.get_value( search_input ).strip() :
 
+        search_callback( None, None, model_data )
 
-def show_manager() :
+    else :
 
-    if not dpg.is_item_shown(group_manager_window_name) :
+        clear_search()
 
-        dpg.configure_item( group_manager_window_name, show=True )
-        dpg.focus_item( group_manager_window_name )
 
+# function to clear the search, called when the session is cleared
+def clear_search() :
 
-def hide_editor() :
+    search_result_ids.clear()
+    highlighted_nodes.clear()
 
-    dpg.configure_item( group_edit_window_name, show=False )
+    if dpg.does_item_exist( search_results ) :
 
+        dpg.configure_item( search_results, items=[] )
+        dpg.set_value( search_status, "" )
 
-def hide_group() :
 
-    dpg.configure_item( group_group_window_name, show=False )
 
+################################### change events ########################################
 
-def hide_manager() :
 
-    dpg.configure_item( group_manager_window_name, show=False )
+# subscriber updating the items showing the changed layers and groups
+def update_on_changes( batch ) :
+
+    model_data = batch.model_manager
+
+    ids = model_data.get_all_layer_ids()
+
+    # the removed layers leave the search and validation state
+    removed = batch.layers( events.layer_removed ) - set( ids )
+
+    if removed :
+
+        highlighted_nodes.difference_update( removed )
+
+        for layer_id in removed :
+            validation_issues.pop( layer_id, None )
+
+    for event in batch.of_kind( events.layer_renamed ) :
+
+        if event.layer_id in ids and dpg.does_item_exist( event.layer_id ) :
+
+            dpg.configure_item( event.layer_id, label=model_data.get_layer_name( event.layer_id ) )
+
+    # highlighted nodes keep their theme until the next search
+    for layer_id in batch.layers( events.group_assigned ) - highlighted_nodes :
+
+        if layer_id in ids and dpg.does_item_exist( layer_id ) :
+
+            update_node_theme( layer_id, model_data )
+
+    refresh_param_items( [ ( e.layer_id, e.param_name ) for e in batch.of_kind( events.param_changed )
+                           if e.layer_id in ids ], model_data )
+
+    groups_listed = batch.has( events.group_added, events.group_removed, events.group_renamed, events.model_loaded )
+
+    if groups_listed :
+
+        dpg.configure_item( group_listbox, items=model_data.get_group_names() )
+        dpg.configure_item( group_combo_selector_name, items=model_data.get_group_names() )
+
+    # the info panel, only the fields of its node
+    node_id = info_bound_node
+
+    if node_id == -1 :
+        return
+
+    if not node_id in ids :
+
+        hide_display_info()
+        return
+
+    fields = []
+
+    if node_id in batch.layers( events.layer_renamed ) :
+        fields.append( "name" )
+
+    if node_id in batch.layers( events.link_added, events.link_removed ) :
+        fields += [ "before", "after" ]
+
+    if node_id in batch.layers( events.group_assigned ) or \
+       model_data.get_group_name( node_id ) in batch.groups( events.group_changed, events.group_renamed ) :
+
+        fields += [ "group", "group_type", "group_color" ]
+
+    if groups_listed :
+        fields.append( "group_items" )
+
+    update_display_info( node_id, model_data, *fields )
+
+
+# subscriber running the current search again when layers change
+def search_on_changes( batch ) :
+
+    if not dpg.does_item_exist( search_input ) or not dpg.get_value( search_input ).strip() :
+        return
+
+    search_callback( None, None, batch.model_manager )
+
+
+# subscriber checking the parameters of the changed layers only
+def validate_on_changes( batch ) :
+
+    model_data = batch.model_manager
+
+    if batch.has( events.model_loaded ) :
+
+        validation_issues.clear()
+        layer_ids = model_data.get_all_layer_ids()
+
+    else :
+
+        layer_ids = batch.layers( events.layer_added, events.layer_removed, events.param_changed )
+
+    for layer_id in layer_ids :
+
+        validation_issues.pop( layer_id, None )
+
+        if not layer_id in model_data.model_data :
+            continue
+
+        names = get_unset_parameters( model_data.model_data[layer_id] )
+
+        if names :
+
+            validation_issues[layer_id] = names
+
+    show_validation_issues( model_data )
+
+
+# subscribe the editor to the change events of a model
+def subscribe_to_changes( model_data ) :
+
+    model_data.events.subscribe( update_on_changes )
+
+    model_data.events.subscribe( search_on_changes, 
+                                 kinds=( events.layer_added, events.layer_removed, events.layer_renamed, 
+                                         events.param_changed, events.group_assigned, events.group_renamed, 
+                                         events.model_loaded ) )
+
+    model_data.events.subscribe( validate_on_changes, 
+                                 kinds=( events.layer_added, events.layer_removed, events.param_changed, 
+                                         events.model_loaded ) )
 
 
 
@@ -842,14 +1871,92 @@ def output_group_callback( sender, app_data, user_data ) :
 
 def save_callback( sender, app_data, user_data ) :
 
-    model_data = user_data
+    autosave_service = user_data
 
+    # snapshot now, written by the worker thread
     file = "project.json"
-    model_data.save(file)
+    autosave_service.request_save(file)
+
+    # autosaves follow the project
+    autosave_service.set_project(file)
+
+
+def autosave_toggle_callback( sender, app_data, user_data ) :
+
+    """
+    called by menu "File" - Autosave
+    """
+
+    autosave_service = user_data
+
+    autosave_service.set_enabled( bool(app_data) )
+
+
+def check_model_callback( sender, app_data, user_data ) :
+
+    """
+    called by menu Run - Validate, the issues are kept up to date by
+    validate_on_changes
+    """
+
+    model_data = user_data
+
+    for layer_id, names in sorted( validation_issues.items() ) :
 
+        logging.warning( "Layer %s: parameters %s are not set.", layer_id, ", ".join( names ) )
 
-def check_model_callback() :
-    pass
+    if not validation_issues :
+
+        logging.info( "No issue found." )
+
+    show_validation_issues( model_data )
+
+    dpg.configure_item( validation_window_name, show=True )
+
+
+def validation_result_callback( sender, app_data, user_data ) :
+
+    """
+    called by validation window - results
+    """
+
+    model_data = user_data
+
+    layer_id = validation_result_ids.get( app_data )
+
+    if layer_id is None or not layer_id in model_data.get_all_layer_ids() :
+        return
+
+    display_info( layer_id, model_data )
+
+    dpg.focus_item( info_window_name )
+
+
+# function to list the validation issues in the validation window
+def show_validation_issues( model_data ) :
+
+    if not dpg.does_item_exist( validation_results ) :
+        return
+
+    validation_result_ids.clear()
+
+    for layer_id, names in sorted( validation_issues.items() ) :
+
+        if not layer_id in model_data.model_data :
+            continue
+
+        label = model_data.get_layer_name( layer_id ) + "  #" + str( layer_id ) + ": " + ", ".join( names )
+        validation_result_ids[label] = layer_id
+
+    dpg.configure_item( validation_results, items=list( validation_result_ids ) )
+
+    if validation_result_ids :
+
+        dpg.set_value( validation_status, str( len(validation_result_ids) ) + " layer(s) with unset parameters" )
+
+    else :
+
+        dpg.set_value( validation_status, "No issue found." )
 
 
 def save_layout_callback( sender, app_data, user_data ) :
@@ -860,40 +1967,205 @@ def save_layout_callback( sender, app_data, user_data ) :
 
 def output_torch_class_callback( sender, app_data, user_data ) :
     
-    model_renderer = user_data[0]
+    """
+    The model is generated on a worker thread, a new request supersedes
+    the one in flight
+    """
+
+    render_worker = user_data[0]
     model_data = user_data[1]
 
-    #model_renderer.set_data(model_data.by_group())
+    render_worker.submit( model_data )
+
+    dpg.configure_item( generate_window_name, show=True )
+
+
+def generate_cancel_callback( sender, app_data, user_data ) :
+
+    render_worker = user_data
+
+    render_worker.cancel()
+
+
+# show the progress of the generation, called each frame
+def update_generate_progress( render_worker ) :
+
+    global generate_last_state
+
+    state = render_worker.poll()
+
+    # nothing changed since the last frame, poll returns a new copy each time
+    if state == generate_last_state or not dpg.does_item_exist( generate_window_name ) :
+        return
+
+    generate_last_state = state
+
+    if state["total"] > 0 :
+
+        dpg.set_value( generate_progress, state["done"] / state["total"] )
+
+    if state["status"] == "running" :
+
+        text = f"Group {state['done']}/{state['total']} {state['group']}"
+
+    elif state["status"] == "failed" :
+
+        text = "Failed: " + state["error"]
+
+    else :
+
+        text = state["status"].capitalize()
+
+    dpg.set_value( generate_status, text )
+    dpg.configure_item( generate_cancel, enabled=state["status"] == "running" )
+
+
+# show the frame time and the slowest callbacks, called each frame when profiling
+def update_profiler_overlay( profiler, every=30 ) :
+
+    if profiler.frame_count % every or not dpg.does_item_exist( profiler_text ) :
+        return
+
+    frames = profiler.frames
+
+    lines = [ f"frame  p50 {frames.percentile(50) * 1e3:6.1f} ms" + 
+              f"  p95 {frames.percentile(95) * 1e3:6.1f} ms" + 
+              f"  max {frames.max * 1e3:6.1f} ms",
+              "" ]
+
+    for name, histogram in profiler.top_callbacks() :
+
+        lines.append( f"{name:32} n {histogram.count:6}  p95 {histogram.percentile(95) * 1e3:6.1f} ms" + 
+                      f"  total {histogram.total * 1e3:8.1f} ms" )
+
+    dpg.set_value( profiler_text, "\n".join( lines ) )
+
+
+def trace_level_callback( sender, app_data, user_data ) :
+
+    """
+    user_data is the level selected by the menu item
+    """
+
+    tracer.set_level( user_data )
+
 
-    model_renderer.render()
+def compact_nodes_callback( sender, app_data, user_data ) :
+
+    """
+    called by menu "View" - Compact Nodes
+    """
+
+    global compact_nodes
+
+    model_data = user_data
+
+    compact_nodes = bool(app_data)
+
+    for node_id in model_data.get_all_layer_ids() :
+
+        if compact_nodes :
+
+            collapse_node( node_id )
+
+        else :
+
+            expand_node( node_id, model_data )
+
+
+def auto_layout_callback( sender, app_data, user_data ) :
+
+    """
+    called by menu "View" - Auto Layout
+    """
+
+    model_data = user_data
+
+    positions = layered_layout( model_data )
+
+    for node_id, pos in positions.items() :
+
+        if dpg.does_item_exist( node_id ) :
+
+            dpg.set_item_pos( node_id, pos )
+
+    level_of_detail.update( model_data )
+
+
+def level_of_detail_callback( sender, app_data, user_data ) :
+
+    """
+    called by menu "View" - Level of Detail
+    """
+
+    model_data = user_data
+
+    level_of_detail.set_enabled( bool(app_data), model_data )
+
+
+def benchmark_toggle_callback( sender, app_data, user_data ) :
+
+    """
+    called by menu "Run" - Emit Benchmark
+    """
+
+    model_renderer = user_data
+
+    # the benchmark imports the generated model, so it must be written to file
+    if app_data and model_renderer.output_file is None :
+
+        model_renderer.set_output_file( model_output_file )
+
+    model_renderer.set_benchmark( bool(app_data) )
 
 
 def load_layer_callback( sender, app_data, user_data ) :
 
     # get current model data
-    model_data = user_data
+    model_data = user_data[0]
+    autosave_service = user_data[1]
 
     # clear all items related to current model data
     clear_session( model_data )
 
-    # clear model data
-    model_data = {}
-
     file = "project.json"
 
     model_data.load(file)
 
-    for layer_id in model_data.keys() :
+    # autosaves follow the project
+    autosave_service.set_project(file)
+
+    for layer_id in model_data.get_all_layer_ids() :
 
         add_node( layer_id, model_data )
                             
         update_node_theme( layer_id, model_data )
 
-        # create display on window "layer_info"
-        create_display_info( layer_id, model_data )
+    # links, from the output of a layer to the input of its children
+    for layer_id in model_data.get_all_layer_ids() :
+
+        for child in model_data.get_links( layer_id )[1] :
 
-        # update group list
-        dpg.configure_item( "group_listbox", items=model_data.get_group_names() )
+            if not dpg.does_item_exist( child ) :
+                continue
+
+            attr_1 = dpg.get_item_children( layer_id, 1 )[1]
+            attr_2 = dpg.get_item_children( child, 1 )[0]
+
+            link_id = dpg.add_node_link( attr_1, attr_2, parent=node_editor_name )
+            link_registry.add_link( link_id, attr_1, attr_2, layer_id, child )
+
+    # groups saved collapsed are drawn as meta-nodes again
+    for group_name in model_data.get_group_names() :
+
+        if model_data.is_group_collapsed( group_name ) :
+
+            collapse_group( group_name, model_data )
+
+    # update group list
+    dpg.configure_item( "group_listbox", items=model_data.get_group_names() )
+
+    level_of_detail.update( model_data )
 
         # TODO
         # update links
@@ -926,10 +2198,28 @@ def load_template_callback( sender, app_data, user_data ) :
         
 def clear_session( model_data ) :
 
-    for node_id in model_data.keys() :
+    level_of_detail.restore( model_data )
+
+    for group_name in list( meta_nodes ) :
+
+        expand_group( group_name, model_data )
+
+    for link_id in list( link_registry.links ) :
+
+        if dpg.does_item_exist( link_id ) :
+            dpg.delete_item( link_id )
+
+    for node_id in model_data.get_all_layer_ids() :
+
+        if dpg.does_item_exist( node_id ) :
+            dpg.delete_item( node_id )
+
+    clear_group_themes()
 
-        dpg.delete_item( node_id )
-        dpg.delete_item( get_info_item_name(node_id) )
+    link_registry.clear()
+    expanded_nodes.clear()
+    hide_display_info()
+    clear_search()
 
 
 # helper to transform set to list since json can't serialize set
@@ -0,0 +1,213 @@
+"""
+ Direct backend of the code generation, selected as "ast".
+
+ Formats a Program of src/ir.py like resources/template.j2, by writing
+ the lines of each class straight from the IR, without going through
+ Jinja. The argument values and callees are already source text, they
+ are written verbatim. The layout is the one of ast.unparse, which the
+ template follows as well.
+
+ No ast node is built: building and unparsing them took about three
+ times as long as rendering the template, joining the lines is several
+ times faster than it on a cold generation, so no cache is needed.
+
+ The equivalence with the Jinja backend and the timings of both can be
+ checked on generated sample programs:
+
+    python -m src.emitter --groups 200 --layers 50
+"""
+
+import argparse, time
+
+from .ir import Program, Module, Instance, Statement, input_value
+
+
+# return the generated script of a program
+def emit_program( program ) :
+
+    parts = [ "\n".join( program.imports ) ]
+
+    parts += [ build_class( module ) for module in program.modules if module.emit ]
+
+    parts.append( build_class( program.final ) )
+
+    # two blank lines between top level definitions, like the template
+    return "\n\n\n".join( parts )
+
+
+# return the text of the class of a module
+def build_class( module ) :
+
+    lines = [ "class " + module.name + "(nn.Module):",
+              "",
+              "    def __init__(self):",
+              "        super().__init__()" ]
+
+    if module.kind == "repeat" :
+
+        lines += [ "        self.blocks = nn.ModuleList([" + module.block + "() for _ in range(" + str(module.repeat) + ")])",
+                   "",
+                   "    def forward(self, " + input_value + "):",
+                   "        for block in self.blocks:",
+                   "            " + input_value + " = block(" + input_value + ")",
+                   "        return " + input_value ]
+
+        return "\n".join( lines )
+
+    for instance in module.instances :
+
+        args = ", ".join( instance.args + [ k + "=" + v for k, v in instance.kwargs ] )
+
+        lines.append( "        self." + instance.attr + " = " + instance.callee + "(" + args + ")" )
+
+    lines += [ "", "    def forward(self, " + ", ".join( module.inputs ) + "):" ]
+
+    for statement in module.statements :
+
+        args = ", ".join( " + ".join( a ) for a in statement.inputs )
+
+        lines.append( "        " + statement.target + " = self." + statement.attr + "(" + args + ")" )
+
+    if len( module.outputs ) > 1 :
+
+        lines.append( "        return (" + ", ".join( module.outputs ) + ")" )
+
+    else :
+
+        lines.append( "        return " + ( module.outputs[0] if module.outputs else input_value ) )
+
+    return "\n".join( lines )
+
+
+###################################
+# equivalence with the Jinja path #
+###################################
+
+
+# return a sample program with chained groups of chained layers
+def sample_program( groups=20, layers=10, repeat_every=5, duplicate_every=4 ) :
+
+    program = Program()
+    final = Module( "final", "final" )
+
+    previous = input_value
+
+    for g in range( groups ) :
+
+        module = Module( "group_" + str(g), "block", "group_" + str(g) )
+
+        # some groups reuse the class of the first one
+        if duplicate_every and g % duplicate_every == duplicate_every - 1 :
+
+            module.name = "group_0"
+            module.emit = False
+
+        value = input_value
+
+        for i in range( layers ) :
+
+            attr = "Linear_" + str(i)
+
+            module.instances.append( Instance( attr, "nn.Linear", [ str(i + 1), str(i + 2) ],
+                                               [ ( "bias", "False" ) ] if i % 3 == 0 else [] ) )
+
+            inputs = [ value ] if i % 4 != 3 else [ value, "out_Linear_" + str(i - 2) ]
+
+            value = "out_" + attr
+            module.statements.append( Statement( value, attr, [ inputs ] ) )
+
+        module.outputs = [ value ] if g % 7 != 6 else [ value, "out_Linear_0" ]
+
+        program.modules.append( module )
+
+        class_name = module.name
+
+        # only blocks with one output can be repeated
+        if repeat_every and g % repeat_every == repeat_every - 1 and len( module.outputs ) == 1 :
+
+            wrapper = Module( module.group + "_repeat", "repeat", module.group )
+            wrapper.repeat = 3
+            wrapper.block = module.name
+            wrapper.outputs = [ input_value ]
+
+            program.modules.append( wrapper )
+            class_name = wrapper.name
+
+        targets = [ "out_" + module.group + "_" + str(k) for k in range( len( module.outputs ) ) ]
+
+        final.instances.append( Instance( module.group, class_name ) )
+        final.statements.append( Statement( ", ".join( targets ), module.group, [ [ previous ] ] ) )
+
+        previous = targets[0]
+
+    final.outputs = [ previous ]
+    program.final = final
+
+    return program
+
+
+# return (equal, jinja output, ast output) for a program
+def compare_backends( template, program ) :
+
+    jinja_output = template.render( program=program )
+    ast_output = emit_program( program )
+
+    return jinja_output == ast_output, jinja_output, ast_output
+
+
+# return the mean seconds of the backends on a program, each run is cold
+def benchmark_backends( template, program, repeat=5 ) :
+
+    timings = {}
+
+    for backend, function in ( ( "jinja", lambda: template.render( program=program ) ),
+                               ( "ast", lambda: emit_program( program ) ) ) :
+
+        start = time.perf_counter()
+
+        for i in range( repeat ) :
+            function()
+
+        timings[backend] = ( time.perf_counter() - start ) / repeat
+
+    return timings
+
+
+def main( argv=None ) :
+
+    from jinja2 import Environment, FileSystemLoader
+
+    parser = argparse.ArgumentParser( description="Compare the Jinja and direct backends." )
+    parser.add_argument( "--groups", type=int, default=200 )
+    parser.add_argument( "--layers", type=int, default=50 )
+    parser.add_argument( "--repeat", type=int, default=3 )
+    parser.add_argument( "--template", default="template.j2" )
+    parser.add_argument( "--resources", default="./resources" )
+
+    args = parser.parse_args( argv )
+
+    template = Environment( loader=FileSystemLoader( args.resources ) ).get_template( args.template )
+
+    # small programs cover the shapes, the large one is timed
+    failed = 0
+
+    for groups, layers in ( ( 1, 1 ), ( 3, 2 ), ( 8, 5 ), ( args.groups, args.layers ) ) :
+
+        equal, jinja_output, ast_output = compare_backends( template, sample_program( groups, layers ) )
+
+        print( f"{groups} groups x {layers} layers: {'same output' if equal else 'DIFFERENT output'}" )
+
+        failed += not equal
+
+    timings = benchmark_backends( template, sample_program( args.groups, args.layers ), args.repeat )
+
+    for backend, seconds in timings.items() :
+
+        print( f"{backend}: {seconds * 1e3:.1f} ms, x{timings['jinja'] / seconds:.2f} vs jinja" )
+
+    return 1 if failed else 0
+
+
+if __name__ == "__main__" :
+
+    raise SystemExit( main() )
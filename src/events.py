@@ -0,0 +1,193 @@
+"""
+ Change events of the model.
+
+ The ModelManager emits a typed event for each change of its content
+ (layer added, parameter changed, link removed, group renamed...). The
+ events are queued by an EventHub and handed to the subscribers as one
+ ChangeBatch per frame:
+
+    model_data.events.subscribe( update_on_changes )
+    model_data.events.subscribe( validate_on_changes, kinds=( param_changed, layer_added ) )
+
+    with model_data.transaction() :
+        ...
+
+    model_data.events.flush()   # called by the render loop, once per frame
+
+ Nothing is dispatched while a transaction is open. Events repeated in a
+ batch are coalesced, the subscribers read the new values on the model,
+ only the old value of the first event is kept.
+"""
+
+import contextlib, logging
+
+from .trace import tracer
+
+# trace points
+trace_flush = tracer.point( "model.events", "debug" )
+
+
+# event kinds
+layer_added = "layer_added"
+layer_removed = "layer_removed"
+layer_renamed = "layer_renamed"
+layer_moved = "layer_moved"
+param_changed = "param_changed"
+link_added = "link_added"
+link_removed = "link_removed"
+group_added = "group_added"
+group_removed = "group_removed"
+group_renamed = "group_renamed"
+group_changed = "group_changed"
+group_assigned = "group_assigned"
+input_changed = "input_changed"
+model_loaded = "model_loaded"
+
+
+class ChangeEvent :
+
+    __slots__ = ( "kind", "layer_id", "group_name", "param_name", "old" )
+
+    def __init__( self, kind, layer_id=None, group_name=None, param_name=None, old=None ) :
+
+        self.kind = kind
+        self.layer_id = layer_id
+
+        # group of the layer, or the changed group
+        self.group_name = group_name
+
+        # changed parameter, or attribute of a group
+        self.param_name = param_name
+
+        # old value, old group name or the other end of a link
+        self.old = old
+
+
+    def __repr__( self ) :
+
+        return "ChangeEvent(" + ", ".join( k + "=" + repr( getattr(self, k) ) for k in self.__slots__
+                                          if getattr(self, k) is not None ) + ")"
+
+
+class ChangeBatch :
+
+    def __init__( self, events, model_manager=None ) :
+
+        self.events = events
+        self.model_manager = model_manager
+
+
+    # return if the batch has an event of these kinds
+    def has( self, *kinds ) :
+
+        return any( e.kind in kinds for e in self.events )
+
+
+    # return the ids of the layers with an event of these kinds (any kind if none)
+    def layers( self, *kinds ) :
+
+        return set( e.layer_id for e in self.events
+                    if e.layer_id is not None and ( not kinds or e.kind in kinds ) )
+
+
+    # return the names of the groups with an event of these kinds (any kind if none)
+    def groups( self, *kinds ) :
+
+        return set( e.group_name for e in self.events
+                    if e.group_name is not None and ( not kinds or e.kind in kinds ) )
+
+
+    # return the events of these kinds
+    def of_kind( self, *kinds ) :
+
+        return [ e for e in self.events if e.kind in kinds ]
+
+
+class EventHub :
+
+    def __init__( self, model_manager=None ) :
+
+        self.model_manager = model_manager
+
+        # list of (callback, kinds), kinds is None for all events
+        self.subscribers = []
+
+        # queued events and their keys, for coalescing
+        self.pending = []
+        self.pending_keys = set()
+
+        # depth of the open transactions
+        self.depth = 0
+
+
+    # call callback( batch ) on each flush with events of these kinds
+    def subscribe( self, callback, kinds=None ) :
+
+        self.subscribers.append( ( callback, None if kinds is None else tuple(kinds) ) )
+
+
+    # remove a subscriber
+    def unsubscribe( self, callback ) :
+
+        self.subscribers = [ ( c, k ) for c, k in self.subscribers if c != callback ]
+
+
+    # queue an event, only if someone listens
+    def emit( self, kind, layer_id=None, group_name=None, param_name=None, old=None ) :
+
+        if not self.subscribers :
+            return
+
+        key = ( kind, layer_id, group_name, param_name )
+
+        if key in self.pending_keys :
+            return
+
+        self.pending_keys.add( key )
+        self.pending.append( ChangeEvent( kind, layer_id, group_name, param_name, old ) )
+
+
+    # open a transaction, the events are not dispatched until it ends
+    @contextlib.contextmanager
+    def transaction( self ) :
+
+        self.depth += 1
+
+        try :
+
+            yield self
+
+        finally :
+
+            self.depth -= 1
+
+
+    # dispatch the queued events as one batch, return False if nothing was sent
+    def flush( self ) :
+
+        if self.depth > 0 or not self.pending :
+            return False
+
+        batch = ChangeBatch( self.pending, self.model_manager )
+
+        self.pending = []
+        self.pending_keys = set()
+
+        if trace_flush.on :
+            trace_flush.emit( events=len(batch.events), kinds=sorted( set( e.kind for e in batch.events ) ) )
+
+        for callback, kinds in list( self.subscribers ) :
+
+            if kinds is not None and not batch.has( *kinds ) :
+                continue
+
+            # a failing subscriber does not stop the others, nor the frame
+            try :
+
+                callback( batch )
+
+            except Exception as e :
+
+                logging.warning( "Change subscriber %s failed: %s", getattr( callback, "__name__", callback ), e )
+
+        return True
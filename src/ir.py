@@ -0,0 +1,246 @@
+"""
+ Intermediate representation of the generated model.
+
+ The model of a ModelManager is lowered to a Program, a list of Modules
+ (one per group, plus the repeat wrappers and the final module). A
+ Module owns Instances (the sub-modules built in __init__) and
+ Statements (the forward, one call per instance). The passes of
+ src/passes.py then rewrite the program and the backends only format it.
+
+    Program
+     |-- imports:     import lines
+     |-- modules:     list of Module, in emission order
+     |-- final:       Module chaining the groups
+
+    Module
+     |-- name:        class name
+     |-- kind:        "block", "repeat" or "final"
+     |-- group:       name of the group it comes from
+     |-- emit:        False if another module's class is used instead
+     |-- inputs:      names of the forward arguments
+     |-- instances:   list of Instance
+     |-- statements:  list of Statement
+     |-- outputs:     returned values, as source text
+     |-- input_layers:  entry layer of each forward argument
+     |-- output_layers: exit layer of each returned value
+     |-- repeat:      number of chained blocks (kind "repeat")
+     |-- block:       class of the chained blocks (kind "repeat")
+
+    Instance
+     |-- attr:        attribute name (self.<attr>)
+     |-- callee:      constructor (eg. nn.Linear or a group class)
+     |-- args:        positional arguments, as source text
+     |-- kwargs:      list of (name, source text)
+     |-- layer:       layer of the model, None for groups
+
+    Statement
+     |-- target:      assigned value(s), as source text (eg. "a" or "a, b")
+     |-- attr:        called instance
+     |-- inputs:      arguments of the call, each a list of values summed
+
+ The entry layers of a group (layers linked from outside of the group, or
+ from nothing) take one forward argument each, and its exit layers
+ (layers linked to outside of the group, or to nothing) are returned, so
+ the final module wires the groups layer by layer.
+"""
+
+
+# name of the input value of a forward
+input_value = "x"
+
+
+class Instance :
+
+    def __init__( self, attr, callee, args=None, kwargs=None, layer=None ) :
+
+        self.attr = attr
+        self.callee = callee
+        self.args = args or []
+        self.kwargs = kwargs or []
+        self.layer = layer
+
+
+class Statement :
+
+    def __init__( self, target, attr, inputs ) :
+
+        self.target = target
+        self.attr = attr
+        self.inputs = inputs
+
+
+class Module :
+
+    def __init__( self, name, kind="block", group=None ) :
+
+        self.name = name
+        self.kind = kind
+        self.group = group
+        self.emit = True
+        self.inputs = [ input_value ]
+        self.instances = []
+        self.statements = []
+        self.outputs = []
+        self.input_layers = []
+        self.output_layers = []
+        self.repeat = 1
+        self.block = None
+
+
+    # return an instance by its attribute name
+    def get_instance( self, attr ) :
+
+        for instance in self.instances :
+
+            if instance.attr == attr :
+                return instance
+
+        return None
+
+
+class Program :
+
+    def __init__( self ) :
+
+        self.imports = [ "import torch.nn as nn" ]
+        self.modules = []
+        self.final = None
+
+
+    # return the module of a group
+    def get_module( self, group_name ) :
+
+        for module in self.modules :
+
+            if module.group == group_name and module.kind == "block" :
+                return module
+
+        return None
+
+
+# lower the model of a manager to a program
+def lower_model( model_manager, progress=None, cancel=None ) :
+
+    """
+    One block module per group, instances keep their raw layer, the
+    arguments are resolved by a pass. Return None if cancelled.
+    progress(done, total, group_name) is called after each group.
+    """
+
+    program = Program()
+
+    group_names = model_manager.get_group_names()
+
+    for i, group_name in enumerate( group_names ) :
+
+        if cancel is not None and cancel.is_set() :
+            return None
+
+        program.modules.append( lower_group( model_manager, group_name ) )
+
+        if progress is not None :
+            progress( i + 1, len(group_names), group_name )
+
+    return program
+
+
+# lower a group to a block module
+def lower_group( model_manager, group_name ) :
+
+    module = Module( group_name, "block", group_name )
+
+    members = set( model_manager.get_group_attribute( group_name, "members" ) )
+
+    order = order_members( model_manager, members )
+
+    for layer_id in order :
+
+        layer = model_manager.model_data[layer_id]
+
+        module.instances.append( Instance( layer["name"], "nn." + layer["type"], layer=layer ) )
+
+    module.input_layers = [ i for i in order if is_entry_layer( model_manager, i, members ) ]
+    module.output_layers = [ i for i in order if is_exit_layer( model_manager, i, members ) ]
+
+    # one argument per entry layer, x if there is only one
+    if len( module.input_layers ) == 1 :
+
+        arguments = { module.input_layers[0]: input_value }
+
+    else :
+
+        arguments = { i: input_value + "_" + model_manager.get_layer_name(i) for i in module.input_layers }
+
+    module.inputs = [ arguments[i] for i in module.input_layers ] or [ input_value ]
+
+    # each layer takes the sum of its parents in the group, plus its argument
+    values = {}
+    rank = { layer_id: i for i, layer_id in enumerate(order) }
+
+    for layer_id in order :
+
+        name = model_manager.get_layer_name( layer_id )
+        parents = sorted( ( p for p in model_manager.get_links( layer_id )[0] & members if p in values ), 
+                          key=rank.get )
+
+        inputs = [ values[p] for p in parents ]
+
+        if layer_id in arguments :
+            inputs.append( arguments[layer_id] )
+
+        values[layer_id] = "out_" + name
+        module.statements.append( Statement( values[layer_id], name, [ inputs or [ input_value ] ] ) )
+
+    module.outputs = [ values[i] for i in module.output_layers ]
+
+    return module
+
+
+# check if a layer takes an input from outside of its group, or from nothing
+def is_entry_layer( model_manager, layer_id, members ) :
+
+    parents = set( p for p in model_manager.get_links( layer_id )[0] if p in model_manager.model_data )
+
+    return not parents or bool( parents - members )
+
+
+# check if a layer feeds a layer outside of its group, or nothing
+def is_exit_layer( model_manager, layer_id, members ) :
+
+    children = set( c for c in model_manager.get_links( layer_id )[1] if c in model_manager.model_data )
+
+    return not children or bool( children - members )
+
+
+# return the members of a group in a topological order of their links
+def order_members( model_manager, members ) :
+
+    """
+    Ties and cycles are broken by layer id, so the order is stable
+    """
+
+    pending = { i: len( model_manager.get_links( i )[0] & members ) for i in members }
+
+    ready = sorted( i for i in members if pending[i] == 0 )
+    order = []
+    placed = set()
+
+    while len(order) < len(members) :
+
+        if not ready :
+
+            # cycle, take the first remaining layer
+            ready = [ min( i for i in members if not i in placed ) ]
+
+        layer_id = ready.pop(0)
+        order.append( layer_id )
+        placed.add( layer_id )
+
+        for child in sorted( model_manager.get_links( layer_id )[1] & members ) :
+
+            pending[child] -= 1
+
+            if pending[child] == 0 and not child in placed :
+                ready.append( child )
+
+    return order
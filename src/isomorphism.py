@@ -0,0 +1,141 @@
+"""
+ Detection of structurally identical groups.
+
+ Each group is turned into a graph of its members labelled by layer type,
+ parameter values and entry/exit role (not by names or ids) with the links
+ inside the group as edges. Groups are bucketed by their Weisfeiler-Lehman hash and
+ the candidates of a bucket are confirmed with an isomorphism check, so
+ the code generation can emit one class per unique block.
+
+ The WL hashes are cached by the content hash of the group (see
+ ModelManager.get_group_hash), only the edited groups are hashed again.
+"""
+
+import json
+import networkx as nx
+
+from .ir import is_entry_layer, is_exit_layer
+
+
+class GroupCanonicalizer :
+
+    def __init__( self, iterations=3 ) :
+
+        # rounds of WL relabelling
+        self.iterations = iterations
+
+        # group name -> (content hash, structural hash)
+        self.cache = {}
+
+        # group name -> {layer id: layer id of the canonical group}, for
+        # the groups mapped to another one by the last search
+        self.mappings = {}
+
+
+    # return a dict group name -> name of the group whose class is used
+    def find_canonical_groups( self, model_manager ) :
+
+        """
+        The first group (in the model order) of each class of isomorphic
+        groups is its canonical group, other groups map to it
+        """
+
+        canonical = {}
+        self.mappings = {}
+
+        # structural hash -> names of the canonical groups
+        buckets = {}
+
+        # graphs are only built for new hashes and for hash collisions
+        graphs = {}
+
+        def get_graph( name ) :
+
+            if name not in graphs :
+
+                graphs[name] = build_group_graph( model_manager, name )
+
+            return graphs[name]
+
+        for group_name in model_manager.get_group_names() :
+
+            canonical[group_name] = group_name
+
+            if not model_manager.get_group_attribute( group_name, "members" ) :
+                continue
+
+            key = self.get_structural_hash( model_manager, group_name, get_graph )
+
+            for other_name in buckets.get( key, [] ) :
+
+                matcher = nx.algorithms.isomorphism.DiGraphMatcher( get_graph( group_name ), get_graph( other_name ),
+                                                                    node_match=same_label )
+
+                if matcher.is_isomorphic() :
+
+                    canonical[group_name] = other_name
+                    self.mappings[group_name] = dict( matcher.mapping )
+                    break
+
+            else :
+
+                buckets.setdefault( key, [] ).append( group_name )
+
+        # forget removed groups
+        for group_name in set( self.cache ) - set( canonical ) :
+
+            self.cache.pop( group_name )
+
+        return canonical
+
+
+    # return the WL hash of a group, cached by its content hash
+    def get_structural_hash( self, model_manager, group_name, get_graph ) :
+
+        content_hash = model_manager.get_group_hash( group_name )
+        cached = self.cache.get( group_name )
+
+        if cached is not None and cached[0] == content_hash :
+            return cached[1]
+
+        structural_hash = nx.weisfeiler_lehman_graph_hash( get_graph( group_name ), node_attr="label",
+                                                           iterations=self.iterations )
+
+        # the group type changes the generated class as well
+        structural_hash += ":" + str( model_manager.get_group_attribute( group_name, "type" ) )
+
+        self.cache[group_name] = ( content_hash, structural_hash )
+
+        return structural_hash
+
+
+# return the graph of a group's members, labelled by type and parameters
+def build_group_graph( model_manager, group_name ) :
+
+    members = set( model_manager.get_group_attribute( group_name, "members" ) )
+
+    graph = nx.DiGraph()
+
+    for layer_id in members :
+
+        params = [ ( p["name"], p.get("value") ) for p in model_manager.get_params( layer_id ) ]
+
+        # the role sets the arguments and returned values of the class
+        role = [ is_entry_layer( model_manager, layer_id, members ), is_exit_layer( model_manager, layer_id, members ) ]
+
+        graph.add_node( layer_id, label=json.dumps( [ model_manager.get_layer_type( layer_id ), params, role ],
+                                                    default=str ) )
+
+    for layer_id in members :
+
+        for child in model_manager.get_links( layer_id )[1] & members :
+
+            graph.add_edge( layer_id, child )
+
+    return graph
+
+
+# helper comparing the labels of two nodes
+def same_label( node_1, node_2 ) :
+
+    return node_1["label"] == node_2["label"]
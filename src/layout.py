@@ -0,0 +1,316 @@
+"""
+ Automatic layered layout of the model graph (Sugiyama style).
+
+ The layout is done in 4 steps, all vectorized with numpy over the edges:
+
+    * layering: longest path from a topological order, cycles are broken
+    * normalization: edges spanning several layers get dummy nodes
+    * ordering: barycenter sweeps to reduce crossings, the layers of a
+      same group are kept together in each column
+    * coordinates: one column per layer, rows follow the order with a
+      gap between groups
+
+ The positions are written back to the model with set_layer_pos.
+"""
+
+import numpy as np
+
+
+# lay out all layers of a model, return a dict layer id -> position
+def layered_layout( model_manager, layer_spacing=250, node_spacing=120, group_gap=60,
+                    sweeps=8, origin=(250, 50) ) :
+
+    ids = list( model_manager.get_all_layer_ids() )
+    n = len( ids )
+
+    if n == 0 :
+        return {}
+
+    index = { layer_id: i for i, layer_id in enumerate(ids) }
+
+    # edges between layers of the model
+    src, dst = [], []
+
+    for layer_id in ids :
+
+        for child in model_manager.get_links( layer_id )[1] :
+
+            if child in index :
+
+                src.append( index[layer_id] )
+                dst.append( index[child] )
+
+    src = np.asarray( src, dtype=np.int64 )
+    dst = np.asarray( dst, dtype=np.int64 )
+
+    # groups as integers, used to cluster the layers
+    group_names = [ model_manager.get_group_name( layer_id ) for layer_id in ids ]
+    group_index = { name: i for i, name in enumerate( sorted( set(group_names), key=str ) ) }
+    groups = np.asarray( [ group_index[name] for name in group_names ], dtype=np.int64 )
+
+    src, dst = remove_cycles( n, src, dst )
+    layers = assign_layers( n, src, dst )
+
+    layers, groups, src, dst = add_dummy_nodes( layers, groups, src, dst )
+
+    order = order_layers( layers, groups, src, dst, sweeps )
+
+    x, y = assign_coordinates( layers, groups, order, layer_spacing, node_spacing, group_gap )
+
+    positions = {}
+
+    for i, layer_id in enumerate( ids ) :
+
+        pos = [ int( origin[0] + x[i] ), int( origin[1] + y[i] ) ]
+
+        model_manager.set_layer_pos( layer_id, pos )
+        positions[layer_id] = pos
+
+    return positions
+
+
+# return the edges of an acyclic graph, by reversing back edges
+def remove_cycles( n, src, dst ) :
+
+    """
+    Nodes are visited in topological order, when only cycles remain the
+    node with the fewest pending inputs is taken, and its pending inputs
+    are reversed
+    """
+
+    if len(src) == 0 :
+        return src, dst
+
+    # drop self loops
+    keep = src != dst
+    src, dst = src[keep], dst[keep]
+
+    rank = topological_rank( n, src, dst )
+
+    backward = rank[src] > rank[dst]
+
+    src, dst = np.where( backward, dst, src ), np.where( backward, src, dst )
+
+    return src, dst
+
+
+# return the visit rank of each node in a topological order
+def topological_rank( n, src, dst ) :
+
+    order = np.argsort( src, kind="stable" )
+    out_dst = dst[order]
+    offsets = np.concatenate( ( [0], np.cumsum( np.bincount( src, minlength=n ) ) ) )
+
+    indegree = np.bincount( dst, minlength=n )
+    rank = np.full( n, -1, dtype=np.int64 )
+
+    visited = 0
+    frontier = np.flatnonzero( indegree == 0 )
+
+    while visited < n :
+
+        if len(frontier) == 0 :
+
+            # only cycles left, break at the least constrained node
+            pending = np.flatnonzero( rank < 0 )
+            frontier = pending[ [ np.argmin( indegree[pending] ) ] ]
+
+        rank[frontier] = visited + np.arange( len(frontier) )
+        visited += len(frontier)
+
+        children = out_dst[ expand_ranges( offsets[frontier], offsets[frontier + 1] ) ]
+        children = children[ rank[children] < 0 ]
+
+        np.subtract.at( indegree, children, 1 )
+
+        frontier = np.unique( children[ indegree[children] == 0 ] )
+
+    return rank
+
+
+# return the layer of each node, the longest path from the sources
+def assign_layers( n, src, dst ) :
+
+    layers = np.zeros( n, dtype=np.int64 )
+
+    if len(src) == 0 :
+        return layers
+
+    order = np.argsort( src, kind="stable" )
+    out_dst = dst[order]
+    offsets = np.concatenate( ( [0], np.cumsum( np.bincount( src, minlength=n ) ) ) )
+
+    indegree = np.bincount( dst, minlength=n )
+    frontier = np.flatnonzero( indegree == 0 )
+
+    while len(frontier) > 0 :
+
+        starts = offsets[frontier]
+        counts = offsets[frontier + 1] - starts
+
+        parents = np.repeat( frontier, counts )
+        children = out_dst[ expand_ranges( starts, offsets[frontier + 1] ) ]
+
+        np.maximum.at( layers, children, layers[parents] + 1 )
+        np.subtract.at( indegree, children, 1 )
+
+        frontier = np.unique( children[ indegree[children] == 0 ] )
+
+    return layers
+
+
+# split the edges spanning several layers with dummy nodes
+def add_dummy_nodes( layers, groups, src, dst ) :
+
+    if len(src) == 0 :
+        return layers, groups, src, dst
+
+    span = layers[dst] - layers[src]
+    long_edges = np.flatnonzero( span > 1 )
+
+    if len(long_edges) == 0 :
+        return layers, groups, src, dst
+
+    n = len(layers)
+
+    # one dummy per intermediate layer of each long edge
+    counts = span[long_edges] - 1
+    total = int( counts.sum() )
+
+    edge_of_dummy = np.repeat( long_edges, counts )
+    step = np.arange( total ) - np.repeat( np.cumsum( counts ) - counts, counts ) + 1
+
+    dummies = n + np.arange( total )
+    dummy_layers = layers[src[edge_of_dummy]] + step
+
+    # dummies follow the group of the edge's source
+    dummy_groups = groups[src[edge_of_dummy]]
+
+    # chain: src -> d1 -> ... -> dk -> dst
+    first = np.repeat( np.cumsum( counts ) - counts, counts ) == np.arange( total )
+    last = np.roll( first, -1 )
+    last[-1] = True
+
+    chain_src = np.where( first, src[edge_of_dummy], dummies - 1 )
+    chain_dst = dummies
+
+    tail_src = dummies[last]
+    tail_dst = dst[long_edges]
+
+    short = np.ones( len(src), dtype=bool )
+    short[long_edges] = False
+
+    new_src = np.concatenate( ( src[short], chain_src, tail_src ) )
+    new_dst = np.concatenate( ( dst[short], chain_dst, tail_dst ) )
+
+    return ( np.concatenate( ( layers, dummy_layers ) ),
+             np.concatenate( ( groups, dummy_groups ) ),
+             new_src, new_dst )
+
+
+# order the nodes inside each layer to reduce crossings
+def order_layers( layers, groups, src, dst, sweeps ) :
+
+    """
+    Return the rank of each node inside its layer. The barycenter of
+    each node is computed from its neighbors in the previous (down
+    sweep) or next (up sweep) layer, for all layers at once. The groups
+    of a layer are sorted by their mean barycenter and stay contiguous.
+    """
+
+    n = len(layers)
+
+    # initial order: by group then by node
+    order = rank_in_layers( layers, groups.astype(float), np.arange( n, dtype=float ) )
+
+    if len(src) == 0 :
+        return order
+
+    for sweep in range( sweeps ) :
+
+        # alternate between predecessors and successors
+        if sweep % 2 == 0 :
+            neighbors, nodes = src, dst
+        else :
+            neighbors, nodes = dst, src
+
+        weight = np.bincount( nodes, minlength=n ).astype(float)
+        total = np.bincount( nodes, weights=order[neighbors].astype(float), minlength=n )
+
+        # nodes without neighbors keep their place
+        barycenter = np.where( weight > 0, total / np.maximum( weight, 1 ), order )
+
+        # mean barycenter of each group in each layer
+        key = layers * ( groups.max() + 1 ) + groups
+        _, cluster = np.unique( key, return_inverse=True )
+        cluster_bary = np.bincount( cluster, weights=barycenter ) / np.bincount( cluster )
+
+        order = rank_in_layers( layers, cluster_bary[cluster] + 1e-9 * groups, barycenter )
+
+    return order
+
+
+# return the rank of each node in its layer, sorted by primary then secondary key
+def rank_in_layers( layers, primary, secondary ) :
+
+    sorted_nodes = np.lexsort( ( secondary, primary, layers ) )
+
+    sorted_layers = layers[sorted_nodes]
+    layer_start = np.searchsorted( sorted_layers, sorted_layers, side="left" )
+
+    rank = np.empty( len(layers), dtype=np.int64 )
+    rank[sorted_nodes] = np.arange( len(layers) ) - layer_start
+
+    return rank
+
+
+# return the x, y coordinates from layers and orders
+def assign_coordinates( layers, groups, order, layer_spacing, node_spacing, group_gap ) :
+
+    n = len(layers)
+
+    x = layers * layer_spacing
+
+    # walk the nodes by layer and order to add gaps between groups
+    sorted_nodes = np.lexsort( ( order, layers ) )
+
+    sorted_layers = layers[sorted_nodes]
+    sorted_groups = groups[sorted_nodes]
+
+    new_group = np.ones( n, dtype=bool )
+    new_group[1:] = ( sorted_groups[1:] != sorted_groups[:-1] ) & ( sorted_layers[1:] == sorted_layers[:-1] )
+    new_group[0] = False
+
+    # the first node of each layer starts without gap
+    layer_first = np.ones( n, dtype=bool )
+    layer_first[1:] = sorted_layers[1:] != sorted_layers[:-1]
+
+    gaps = np.cumsum( new_group )
+    gaps -= np.maximum.accumulate( np.where( layer_first, gaps, 0 ) )
+
+    y_sorted = order[sorted_nodes] * node_spacing + gaps * group_gap
+
+    # center each layer around the tallest one
+    height = np.zeros( layers.max() + 1 )
+    np.maximum.at( height, sorted_layers, y_sorted )
+
+    y_sorted = y_sorted + ( height.max() - height[sorted_layers] ) / 2
+
+    y = np.empty( n )
+    y[sorted_nodes] = y_sorted
+
+    return x, y
+
+
+# helper returning the concatenation of the ranges [starts[i], ends[i])
+def expand_ranges( starts, ends ) :
+
+    counts = ends - starts
+    total = int( counts.sum() )
+
+    if total == 0 :
+        return np.zeros( 0, dtype=np.int64 )
+
+    offsets = np.repeat( starts - ( np.cumsum( counts ) - counts ), counts )
+
+    return np.arange( total ) + offsets
@@ -0,0 +1,287 @@
+"""
+ Level of detail of the node editor.
+
+ With large graphs, drawing every node and link each frame is the main
+ cost. When enabled, the nodes lying outside of the visible part of the
+ editor (using the positions stored in ModelManager) are hidden, the
+ visible ones collapse to their title when too many are on screen, and
+ fan-outs beyond a given size only draw their first links. The visible
+ layers are found with the spatial index of ModelManager.
+"""
+
+import dearpygui.dearpygui as dpg
+
+
+class LevelOfDetail :
+
+    def __init__( self, node_editor, reference_node, link_registry,
+                  margin=200, compact_threshold=150, max_bundle=4 ) :
+
+        self.node_editor = node_editor
+
+        # always shown node, used to map model positions to the screen
+        self.reference_node = reference_node
+
+        self.link_registry = link_registry
+
+        # extra space around the viewport, in pixels
+        self.margin = margin
+
+        # number of visible nodes from which nodes show only their title
+        self.compact_threshold = compact_threshold
+
+        # number of links drawn per node output in compact mode
+        self.max_bundle = max_bundle
+
+        self.enabled = False
+        self.compact = False
+
+        self.culled_nodes = set()
+        self.compact_nodes = set()
+        self.hidden_links = set()
+
+        # nodes shown at the last update, None before the first one
+        self.visible_nodes = None
+
+        # nodes and links hidden by something else (eg. collapsed groups)
+        self.excluded_nodes = set()
+        self.excluded_links = set()
+
+
+    # turn the level of detail on or off
+    def set_enabled( self, enabled, model_manager ) :
+
+        self.enabled = enabled
+
+        if enabled :
+
+            self.update( model_manager )
+
+        else :
+
+            self.restore( model_manager )
+
+
+    # return the visible rectangle in node positions, None if unknown
+    def get_viewport( self ) :
+
+        ref_screen = dpg.get_item_rect_min( self.reference_node )
+        ref_size = dpg.get_item_rect_size( self.reference_node )
+
+        # the editor has not been drawn yet
+        if ref_size[0] == 0 and ref_size[1] == 0 :
+            return None
+
+        ref_pos = dpg.get_item_pos( self.reference_node )
+
+        editor_min = dpg.get_item_rect_min( self.node_editor )
+        editor_size = dpg.get_item_rect_size( self.node_editor )
+
+        # screen = pos + offset
+        offset_x = ref_screen[0] - ref_pos[0]
+        offset_y = ref_screen[1] - ref_pos[1]
+
+        return ( editor_min[0] - offset_x - self.margin,
+                 editor_min[1] - offset_y - self.margin,
+                 editor_min[0] + editor_size[0] - offset_x + self.margin,
+                 editor_min[1] + editor_size[1] - offset_y + self.margin )
+
+
+    # return the layers inside a rectangle
+    def find_visible_nodes( self, model_manager, viewport ) :
+
+        return set( model_manager.find_layers_in_region( *viewport ) )
+
+
+    # apply the level of detail to the current viewport
+    def update( self, model_manager ) :
+
+        """
+        Only the nodes entering or leaving the viewport are configured,
+        a full pass over the layers is only done on the first update
+        """
+
+        if not self.enabled :
+            return
+
+        viewport = self.get_viewport()
+
+        if viewport is None :
+            return
+
+        visible = self.find_visible_nodes( model_manager, viewport ) - self.excluded_nodes
+
+        if self.visible_nodes is None :
+
+            entering = visible
+            leaving = set( i for i in model_manager.get_all_layer_ids() 
+                           if i not in visible and i not in self.excluded_nodes )
+
+        else :
+
+            entering = visible - self.visible_nodes
+            leaving = self.visible_nodes - visible
+
+            # layers added since the last update are classified as well
+            known = len( self.visible_nodes ) + len( self.culled_nodes ) + len( self.excluded_nodes )
+
+            if model_manager.count_all_layers() != known :
+
+                leaving |= set( i for i in model_manager.get_all_layer_ids() 
+                                if i not in visible and i not in self.visible_nodes 
+                                and i not in self.culled_nodes and i not in self.excluded_nodes )
+
+        # cull nodes
+        for node_id in leaving :
+
+            if dpg.does_item_exist( node_id ) :
+
+                dpg.configure_item( node_id, show=False )
+
+        for node_id in entering & self.culled_nodes :
+
+            if dpg.does_item_exist( node_id ) :
+
+                dpg.configure_item( node_id, show=True )
+
+        self.culled_nodes = ( self.culled_nodes - entering ) | leaving
+        self.visible_nodes = visible
+
+        # collapse nodes to their title
+        was_compact = self.compact
+        self.compact = len(visible) >= self.compact_threshold
+        compact = visible if self.compact else set()
+
+        for node_id in compact - self.compact_nodes :
+
+            self.show_node_body( node_id, False )
+
+        for node_id in self.compact_nodes - compact :
+
+            self.show_node_body( node_id, True )
+
+        self.compact_nodes = compact
+
+        # links to check, all visible ones if the bundles change
+        changed = entering | leaving
+
+        if self.compact or was_compact :
+
+            changed |= visible
+
+        self.update_links( changed )
+
+
+    # hide links to culled nodes and simplify dense bundles
+    def update_links( self, node_ids ) :
+
+        links = set()
+
+        for node_id in node_ids :
+
+            links |= self.link_registry.get_node_links( node_id )
+
+        # links beyond the bundle size of compact nodes
+        trimmed = set()
+
+        if self.compact :
+
+            for node_id in node_ids & self.compact_nodes :
+
+                bundle = sorted( self.link_registry.get_out_links(node_id) )
+                trimmed.update( bundle[self.max_bundle:] )
+
+        for link_id in links - self.excluded_links :
+
+            attr_1, attr_2, node1, node2 = self.link_registry.get_link( link_id )
+
+            hide = node1 in self.culled_nodes or node2 in self.culled_nodes or link_id in trimmed
+
+            if hide == ( link_id in self.hidden_links ) :
+                continue
+
+            if hide :
+
+                self.hidden_links.add( link_id )
+
+            else :
+
+                self.hidden_links.discard( link_id )
+
+            if dpg.does_item_exist( link_id ) :
+
+                dpg.configure_item( link_id, show=not hide )
+
+
+    # show everything back
+    def restore( self, model_manager ) :
+
+        for node_id in self.culled_nodes :
+
+            if dpg.does_item_exist( node_id ) :
+
+                dpg.configure_item( node_id, show=True )
+
+        for node_id in self.compact_nodes :
+
+            self.show_node_body( node_id, True )
+
+        for link_id in self.hidden_links - self.excluded_links :
+
+            if dpg.does_item_exist( link_id ) :
+
+                dpg.configure_item( link_id, show=True )
+
+        self.culled_nodes.clear()
+        self.compact_nodes.clear()
+        self.hidden_links.clear()
+        self.visible_nodes = None
+        self.compact = False
+
+
+    # leave nodes and links hidden by something else alone
+    def exclude( self, node_ids, link_ids ) :
+
+        self.excluded_nodes.update( node_ids )
+        self.excluded_links.update( link_ids )
+
+        for node_id in self.compact_nodes.intersection( node_ids ) :
+
+            self.show_node_body( node_id, True )
+
+        self.culled_nodes.difference_update( node_ids )
+        self.compact_nodes.difference_update( node_ids )
+        self.hidden_links.difference_update( link_ids )
+
+        if self.visible_nodes is not None :
+
+            self.visible_nodes.difference_update( node_ids )
+
+
+    # manage excluded nodes and links again
+    def include( self, node_ids, link_ids ) :
+
+        self.excluded_nodes.difference_update( node_ids )
+        self.excluded_links.difference_update( link_ids )
+
+
+    # stop tracking deleted nodes
+    def forget( self, node_ids ) :
+
+        self.culled_nodes.difference_update( node_ids )
+        self.compact_nodes.difference_update( node_ids )
+        self.hidden_links = set( i for i in self.hidden_links if dpg.does_item_exist(i) )
+
+        if self.visible_nodes is not None :
+
+            self.visible_nodes.difference_update( node_ids )
+
+
+    # show or hide the parameters of a node
+    def show_node_body( self, node_id, show ) :
+
+        body = str(node_id) + "_static"
+
+        if dpg.does_item_exist( body ) :
+
+            dpg.configure_item( body, show=show )
@@ -0,0 +1,150 @@
+"""
+ Registry of the links drawn on the node editor.
+
+ Each link is indexed by its item id, by both of its attributes and by
+ both of its nodes (outgoing from the start node, incoming to the end
+ node), so finding or removing the links of a node only costs its degree.
+"""
+
+
+class LinkRegistry :
+
+    def __init__( self ) :
+
+        # link id -> (attr_1, attr_2, node_1, node_2)
+        self.links = {}
+
+        # attribute id -> set of link ids
+        self.by_attribute = {}
+
+        # node id -> set of link ids, by direction
+        self.by_node_out = {}
+        self.by_node_in = {}
+
+
+    # register a link from (attr_1, node_1) to (attr_2, node_2)
+    def add_link( self, link_id, attr_1, attr_2, node_1, node_2 ) :
+
+        self.links[link_id] = ( attr_1, attr_2, node_1, node_2 )
+
+        self.by_attribute.setdefault( attr_1, set() ).add( link_id )
+        self.by_attribute.setdefault( attr_2, set() ).add( link_id )
+
+        self.by_node_out.setdefault( node_1, set() ).add( link_id )
+        self.by_node_in.setdefault( node_2, set() ).add( link_id )
+
+
+    # unregister a link, return its entry or None if unknown
+    def remove_link( self, link_id ) :
+
+        entry = self.links.pop( link_id, None )
+
+        if entry is None :
+            return None
+
+        attr_1, attr_2, node_1, node_2 = entry
+
+        self.discard_id( self.by_attribute, attr_1, link_id )
+        self.discard_id( self.by_attribute, attr_2, link_id )
+        self.discard_id( self.by_node_out, node_1, link_id )
+        self.discard_id( self.by_node_in, node_2, link_id )
+
+        return entry
+
+
+    # unregister all links attached to the nodes in one pass
+    def remove_nodes( self, node_ids ) :
+
+        """
+        Return a dict link id -> entry of the removed links
+        """
+
+        link_ids = set()
+
+        for node_id in node_ids :
+
+            link_ids |= self.get_node_links( node_id )
+
+        removed = {}
+
+        for link_id in link_ids :
+
+            removed[link_id] = self.remove_link( link_id )
+
+        for node_id in node_ids :
+
+            self.by_node_out.pop( node_id, None )
+            self.by_node_in.pop( node_id, None )
+
+        return removed
+
+
+    # return a link's entry
+    def get_link( self, link_id ) :
+
+        return self.links.get( link_id )
+
+
+    # return the ids of all links attached to a node
+    def get_node_links( self, node_id ) :
+
+        return self.by_node_out.get( node_id, set() ) | self.by_node_in.get( node_id, set() )
+
+
+    # return the ids of the links leaving a node
+    def get_out_links( self, node_id ) :
+
+        return set( self.by_node_out.get( node_id, set() ) )
+
+
+    # return the ids of the links entering a node
+    def get_in_links( self, node_id ) :
+
+        return set( self.by_node_in.get( node_id, set() ) )
+
+
+    # return the ids of the links attached to an attribute
+    def get_attribute_links( self, attr_id ) :
+
+        return set( self.by_attribute.get( attr_id, set() ) )
+
+
+    # check if at least one link goes from node_1 to node_2
+    def has_link_between( self, node_1, node_2 ) :
+
+        outs = self.by_node_out.get( node_1, set() )
+        ins = self.by_node_in.get( node_2, set() )
+
+        if len(outs) > len(ins) :
+            outs, ins = ins, outs
+
+        return any( link_id in ins for link_id in outs )
+
+
+    # return the number of registered links
+    def count_links( self ) :
+
+        return len( self.links )
+
+
+    # remove all links
+    def clear( self ) :
+
+        self.links.clear()
+        self.by_attribute.clear()
+        self.by_node_out.clear()
+        self.by_node_in.clear()
+
+
+    # helper to remove an id from an index
+    def discard_id( self, index, key, link_id ) :
+
+        ids = index.get( key )
+
+        if ids is None :
+            return
+
+        ids.discard( link_id )
+
+        if not ids :
+            index.pop( key )
@@ -1,6 +1,14 @@
-import json, copy
+import json, copy, hashlib
 import logging
 from .theme import ColorPalette
+from .spatial_index import SpatialIndex
+from .trace import tracer
+from . import events
+
+# trace points
+trace_bfs = tracer.point( "manager.bfs", "debug" )
+trace_bfs_step = tracer.point( "manager.bfs.step", "debug" )
+trace_group = tracer.point( "manager.group", "info" )
 
 ############################
 # the model data structure #
@@ -56,6 +64,11 @@ from .theme import ColorPalette
 #  |-- type:        can be class, sequential, modulelist
 #  |
 #  |-- members:     list of node id assigined to this group
+#  |
+#  |-- collapsed:   optional, if the group is drawn as a single node
+#  |
+#  |-- repeat:      optional, number of times the group is chained in the model,
+#                   the members are stored once and used as the repeated block
 
 
 class ModelManager() :
@@ -75,6 +88,35 @@ class ModelManager() :
 
         self.groups = {}
 
+        # shape of the Input node, without batch dimension
+        self.input_shape = [0, 0]
+
+        # layers by position, only placed layers are indexed
+        self.spatial_index = SpatialIndex()
+
+        # content hashes, see update_hashes
+        self.hash_root = 0
+        self.hash_groups = {}
+        self.hash_layer_group = {}
+        self.dirty_layers = set()
+        self.dirty_groups = set()
+
+        # links between groups, see update_group_links
+        self.layer_edges = {}
+        self.edge_parents = {}
+        self.group_links = {}
+
+        # secondary indexes, see update_indexes
+        self.index = {}
+        self.index_keys = {}
+
+        # change events, dispatched once per frame, see src/events.py
+        self.events = events.EventHub( self )
+
+        # undo entries of parameter edits, see set_params_values
+        self.undo_journal = []
+        self.undo_limit = 100
+
         for l in self.layer_category :
 
             self.layer_data[l] = []
@@ -91,7 +133,23 @@ class ModelManager() :
         # remove from the layer type count
         self.layer_type[self.model_data[layer_id]["type"]] -= 1
 
-        self.model_data.pop(layer_id)
+        layer = self.model_data.pop(layer_id)
+        self.spatial_index.remove(layer_id)
+        self.dirty_layers.add(layer_id)
+
+        self.events.emit( events.layer_removed, layer_id, layer.get("group") )
+
+        group_name = layer.get("group")
+
+        if group_name in self.groups :
+
+            self.groups[group_name]["members"].discard(layer_id)
+            self.dirty_groups.add(group_name)
+
+            # the default group of a layer goes with it
+            if group_name == "group_" + str(layer_id) and not self.groups[group_name]["members"] :
+
+                self.remove_group( group_name )
 
 
     # add a layer
@@ -109,9 +167,13 @@ class ModelManager() :
 
         self.model_data[layer_id]["id"] = layer_id
 
-        self.model_data[layer_id]["pos"] = [-1, -1] # no pos
+        self.model_data[layer_id]["pos"] = [-1, -1] # no pos, not indexed until placed
+        self.spatial_index.remove(layer_id)
 
         self.assign_group( layer_id, None )
+        self.dirty_layers.add(layer_id)
+
+        self.events.emit( events.layer_added, layer_id, self.model_data[layer_id]["group"] )
 
 
     # add a layer by name
@@ -133,12 +195,20 @@ class ModelManager() :
         self.model_data[layer_id]["id"] = layer_id
 
         self.assign_group( layer_id, None )
+        self.dirty_layers.add(layer_id)
+
+        self.events.emit( events.layer_added, layer_id, self.model_data[layer_id]["group"] )
 
 
     # set a layer's name
     def set_layer_name( self, layer_id, name ) :
 
+        old = self.model_data[layer_id]["name"]
+
         self.model_data[layer_id]["name"] = name
+        self.dirty_layers.add(layer_id)
+
+        self.events.emit( events.layer_renamed, layer_id, old=old )
 
 
     # return a layer's name by its ID
@@ -151,14 +221,60 @@ class ModelManager() :
     def set_layer_pos( self, layer_id, pos ) :
 
         self.model_data[layer_id]["pos"] = list(pos)
+        self.spatial_index.insert(layer_id, pos)
+
+        self.events.emit( events.layer_moved, layer_id )
     
 
+    # return the layers inside a rectangle
+    def find_layers_in_region( self, xmin, ymin, xmax, ymax ) :
+
+        return self.spatial_index.query_range(xmin, ymin, xmax, ymax)
+
+
+    # return the closest layer to a position and its distance
+    def find_nearest_layer( self, pos, max_distance=float("inf"), exclude=() ) :
+
+        return self.spatial_index.nearest(pos, max_distance, exclude)
+
+
+    # return the closest free position below pos, at spacing from other layers
+    def find_free_pos( self, pos, spacing=50, max_tries=100 ) :
+
+        x, y = pos[0], pos[1]
+
+        for i in range(max_tries) :
+
+            layer_id, distance = self.spatial_index.nearest((x, y), spacing)
+
+            if layer_id is None :
+                break
+
+            y += spacing
+
+        return [x, y]
+
+
     # return the layer node position
     def get_layer_pos( self, layer_id ) :
 
         return list(self.model_data[layer_id]["pos"])
     
 
+    # set the shape of the model input (without batch dimension)
+    def set_input_shape( self, shape ) :
+
+        self.input_shape = [int(i) for i in shape]
+
+        self.events.emit( events.input_changed )
+
+
+    # return the shape of the model input
+    def get_input_shape( self ) :
+
+        return list(self.input_shape)
+    
+
     # return the type of a layer
     def get_layer_type( self, layer_id ) :
 
@@ -171,11 +287,87 @@ class ModelManager() :
         try :
 
             i = self.get_params_names(layer_id)[param_name]
+            old = self.model_data[layer_id]["parameters"][i]["value"]
             self.model_data[layer_id]["parameters"][i]["value"] = value
+            self.dirty_layers.add(layer_id)
+
+            self.events.emit( events.param_changed, layer_id, param_name=param_name, old=old )
 
         except ValueError :
 
-            print("Invalid value.")
+            logging.warning("Invalid value.")
+
+
+    # return a context in which the change events are held back, see src/events.py
+    def transaction( self ) :
+
+        return self.events.transaction()
+
+
+    # change a parameter on several layers at once, as a single undo entry
+    def set_params_values( self, layer_ids, param_name, value ) :
+
+        """
+        Layers without an enabled parameter of this name are skipped.
+        Return the ids of the changed layers.
+        """
+
+        entry = []
+
+        for layer_id in layer_ids :
+
+            i = self.get_params_names(layer_id).get(param_name)
+
+            if i is None :
+                continue
+
+            param = self.model_data[layer_id]["parameters"][i]
+
+            if not int( param.get("enabled", 1) ) or param["value"] == value :
+                continue
+
+            entry.append( (layer_id, param_name, param["value"]) )
+
+            self.events.emit( events.param_changed, layer_id, param_name=param_name, old=param["value"] )
+
+            param["value"] = value
+            self.dirty_layers.add(layer_id)
+
+        if entry :
+
+            self.undo_journal.append( entry )
+            del self.undo_journal[:-self.undo_limit]
+
+        return [ e[0] for e in entry ]
+
+
+    # revert the last parameter edit, return the (layer id, parameter name) changed
+    def undo( self ) :
+
+        if not self.undo_journal :
+            return []
+
+        entry = self.undo_journal.pop()
+
+        changed = []
+
+        for layer_id, param_name, value in reversed( entry ) :
+
+            # the layer may have been removed since
+            if not layer_id in self.model_data :
+                continue
+
+            i = self.get_params_names(layer_id)[param_name]
+
+            self.events.emit( events.param_changed, layer_id, param_name=param_name, 
+                              old=self.model_data[layer_id]["parameters"][i]["value"] )
+
+            self.model_data[layer_id]["parameters"][i]["value"] = value
+            self.dirty_layers.add(layer_id)
+
+            changed.append( (layer_id, param_name) )
+
+        return changed
 
 
     # return a layer's parameter's value
@@ -215,12 +407,19 @@ class ModelManager() :
 
             self.model_data[layer_id]["link_end"].add(alayer_id)
 
+        self.dirty_layers.add(layer_id)
+
+        self.events.emit( events.link_added, layer_id, old=alayer_id )
+
     
     #  set the linked nodes's ID 
     def assign_links( self, layer_id, alayer_ids ) :
 
         self.model_data[layer_id]["link_start"].add(alayer_ids[0])
         self.model_data[layer_id]["link_end"].add(alayer_ids[1])
+        self.dirty_layers.add(layer_id)
+
+        self.events.emit( events.link_added, layer_id )
 
 
     # remove the linked node by position (before, after)
@@ -234,12 +433,19 @@ class ModelManager() :
 
             self.model_data[layer_id]["link_end"].remove(alayer_id)
 
+        self.dirty_layers.add(layer_id)
+
+        self.events.emit( events.link_removed, layer_id, old=alayer_id )
+
     
     # remove linked nodes
     def remove_links( self, layer_id, alayer_ids ) :
 
         self.model_data[layer_id]["link_start"].remove(alayer_ids[0])
         self.model_data[layer_id]["link_end"].remove(alayer_ids[1])
+        self.dirty_layers.add(layer_id)
+
+        self.events.emit( events.link_removed, layer_id )
 
 
     # remove all linked nodes
@@ -247,6 +453,9 @@ class ModelManager() :
 
         self.model_data[layer_id]["link_start"].clear()
         self.model_data[layer_id]["link_end"].clear()
+        self.dirty_layers.add(layer_id)
+
+        self.events.emit( events.link_removed, layer_id )
 
 
     # remove corresponding linked nodes 
@@ -261,6 +470,11 @@ class ModelManager() :
 
             self.model_data[layer_id2]["link_end"].remove(layer_id1)
             self.model_data[layer_id1]["link_start"].remove(layer_id2)
+
+        self.dirty_layers.update( (layer_id1, layer_id2) )
+
+        self.events.emit( events.link_removed, layer_id1, old=layer_id2 )
+        self.events.emit( events.link_removed, layer_id2, old=layer_id1 )
         
 
     # return the linked nodes
@@ -356,6 +570,10 @@ class ModelManager() :
         # init list
         self.groups[group_name] |= {"members" : set()}
 
+        self.dirty_groups.add(group_name)
+
+        self.events.emit( events.group_added, group_name=group_name )
+
         return group_name
 
 
@@ -399,8 +617,13 @@ class ModelManager() :
         self.groups[_name]["color"] = color
         self.groups[_name]["type"] = dtype
         self.groups[_name]["members"] = set()
+
+        self.dirty_groups.add(_name)
+
+        self.events.emit( events.group_added, group_name=_name )
         
-        print(self.groups)
+        if trace_group.on :
+            trace_group.emit( action="add", group=_name, type=dtype )
 
     
     # assign a group to a layer
@@ -415,6 +638,9 @@ class ModelManager() :
                 group_name = self.add_default_node_group( layer_id )
                 self.model_data[layer_id]["group"] = group_name
                 self.groups[group_name]["members"].add(layer_id)
+                self.dirty_layers.add(layer_id)
+
+                self.events.emit( events.group_assigned, layer_id, group_name )
 
                 return
             
@@ -428,19 +654,21 @@ class ModelManager() :
                 return
 
             # remove from old group
-            print("remove old group: ", old_group)
-            print("old group members: ", self.get_group_attribute(old_group, "members"))
+            if trace_group.on :
+                trace_group.emit( action="assign", layer=layer_id, old_group=old_group, group=group_name )
 
             if  old_group in self.get_group_names() :
 
                 if layer_id in self.get_group_attribute(old_group, "members") :
 
-                    self.groups[old_group]["members"] = [i for i in self.groups[old_group]["members"] if i != layer_id]
-                    print("new members: ", self.groups[old_group]["members"])
+                    self.groups[old_group]["members"].discard(layer_id)
 
             # set new group
             self.model_data[layer_id]["group"] = group_name
             self.groups[group_name]["members"].add(layer_id)
+            self.dirty_layers.add(layer_id)
+
+            self.events.emit( events.group_assigned, layer_id, group_name, old=old_group )
             return
         
         else:
@@ -457,19 +685,40 @@ class ModelManager() :
     # change a group's name
     def change_group_name( self, old_name, new_name ) :
 
+        if old_name == new_name :
+
+            return False
+
         if (old_name in self.groups.keys()) and not (new_name in self.groups.keys()) :
 
             self.groups[new_name] = self.groups.pop(old_name)
 
+            # follow the new name on members
+            for layer_id in self.groups[new_name]["members"] :
+
+                self.model_data[layer_id]["group"] = new_name
+
+            self.dirty_layers.update( self.groups[new_name]["members"] )
+            self.dirty_groups.update( (old_name, new_name) )
+
+            self.events.emit( events.group_renamed, group_name=new_name, old=old_name )
+
+            return True
+
         else :
 
             logging.warning("name not found or new name already used")
 
+            return False
+
 
     # change a group's attributes
     def set_group_attribute( self, group_name, attr, value ) :
 
         self.groups[group_name][attr] = value
+        self.dirty_groups.add(group_name)
+
+        self.events.emit( events.group_changed, group_name=group_name, param_name=attr )
 
 
     # return a group's attributes
@@ -484,6 +733,40 @@ class ModelManager() :
             return ""
     
     
+    # set if a group is drawn as a single node
+    def set_group_collapsed( self, group_name, collapsed=True ) :
+
+        self.groups[group_name]["collapsed"] = collapsed
+
+        self.events.emit( events.group_changed, group_name=group_name, param_name="collapsed" )
+
+
+    # return if a group is drawn as a single node
+    def is_group_collapsed( self, group_name ) :
+
+        return bool( self.groups.get(group_name, {}).get("collapsed", False) )
+
+
+    # set how many times a group is chained in the model
+    def set_group_repeat( self, group_name, repeat ) :
+
+        if not group_name in self.groups :
+
+            logging.warning("Group not exist.")
+            return
+
+        self.groups[group_name]["repeat"] = max( 1, int(repeat) )
+        self.dirty_groups.add(group_name)
+
+        self.events.emit( events.group_changed, group_name=group_name, param_name="repeat" )
+
+
+    # return how many times a group is chained in the model
+    def get_group_repeat( self, group_name ) :
+
+        return int( self.groups.get(group_name, {}).get("repeat", 1) )
+
+
     # return all groups' name
     def get_group_names( self ) :
 
@@ -508,6 +791,9 @@ class ModelManager() :
         if name in self.groups.keys() :
 
             self.groups.pop(name)
+            self.dirty_groups.add(name)
+
+            self.events.emit( events.group_removed, group_name=name )
 
     
     # get number of input
@@ -525,12 +811,7 @@ class ModelManager() :
     # save all
     def save( self, file, cls=None ) :
 
-        data = {}
-        data["model_data"] = self.model_data
-        data["groups"] = self.groups
-        data["layer_type"] = self.layer_type
-        data["layer_data"] = self.layer_data
-        data["layer_category"] = self.layer_category
+        data = self.snapshot()
 
         with open(file, 'w', encoding='utf-8') as f :
 
@@ -543,20 +824,322 @@ class ModelManager() :
                 json.dump(data, f, ensure_ascii=False, indent=4, cls=cls)
 
 
+    # return a manager working on a copy of the model
+    def copy_model( self ) :
+
+        """
+        The copy shares the layer definitions with this manager, only
+        the mutable parts of the layers and groups are copied
+        """
+
+        other = copy.copy(self)
+
+        other.model_data = {}
+
+        for layer_id, layer in self.model_data.items() :
+
+            layer = dict(layer)
+            layer["link_start"] = set(layer["link_start"])
+            layer["link_end"] = set(layer["link_end"])
+            layer["parameters"] = [dict(p) for p in layer["parameters"]]
+
+            other.model_data[layer_id] = layer
+
+        other.groups = {}
+
+        for group_name, group in self.groups.items() :
+
+            group = dict(group)
+            group["members"] = set(group["members"])
+            other.groups[group_name] = group
+
+        other.layer_type = dict(self.layer_type)
+        other.input_shape = list(self.input_shape)
+
+        # positions are not copied
+        other.spatial_index = SpatialIndex()
+
+        # the group entries are replaced, never modified, so they can be shared
+        other.hash_groups = dict(self.hash_groups)
+        other.hash_layer_group = dict(self.hash_layer_group)
+        other.dirty_layers = set(self.dirty_layers)
+        other.dirty_groups = set(self.dirty_groups)
+
+        # the edges of a layer are replaced, never modified
+        other.layer_edges = dict(self.layer_edges)
+        other.edge_parents = { k: set(v) for k, v in self.edge_parents.items() }
+        other.group_links = dict(self.group_links)
+
+        # the keys of a layer are replaced, the sets of the index are modified
+        other.index = { k: set(v) for k, v in self.index.items() }
+        other.index_keys = dict(self.index_keys)
+
+        # edits of the copy are not undone from the editor, nor seen by its subscribers
+        other.undo_journal = []
+        other.events = events.EventHub( other )
+
+        return other
+
+
+    # return a copy of the project, ready to be serialized
+    def snapshot( self ) :
+
+        """
+        The copy is consistent and shares nothing mutable with the
+        manager, so it can be serialized from another thread. Only the
+        mutable parts of the layers and groups are copied.
+        """
+
+        model_data = {}
+
+        for layer_id, layer in self.model_data.items() :
+
+            layer = dict(layer)
+            layer["link_start"] = list(layer["link_start"])
+            layer["link_end"] = list(layer["link_end"])
+            layer["parameters"] = [dict(p) for p in layer["parameters"]]
+
+            if "pos" in layer :
+                layer["pos"] = list(layer["pos"])
+
+            model_data[layer_id] = layer
+
+        groups = {}
+
+        for group_name, group in self.groups.items() :
+
+            group = dict(group)
+            group["members"] = list(group["members"])
+            groups[group_name] = group
+
+        data = {}
+        data["model_data"] = model_data
+        data["groups"] = groups
+        data["layer_type"] = dict(self.layer_type)
+        data["layer_data"] = self.layer_data # definitions, never modified
+        data["layer_category"] = dict(self.layer_category)
+        data["input_shape"] = list(self.input_shape)
+
+        return data
+
+
     def load( self, file ) :
 
         with open(file) as f :
 
             data = json.load(f)
 
-        self.model_data = data["model_data"]
+        self.model_data = {}
         self.groups = data["groups"]
         self.layer_type = data["layer_type"]
         self.layer_data = data["layer_data"]
         self.layer_category = data["layer_category"]
+        self.input_shape = data.get("input_shape", [0, 0])
+        self.undo_journal = []
+
+        # json keys are strings and sets are saved as lists
+        for layer_id, layer in data["model_data"].items() :
+
+            layer_id = to_layer_id(layer_id)
+
+            layer["id"] = layer_id
+            layer["link_start"] = set(to_layer_id(i) for i in layer["link_start"])
+            layer["link_end"] = set(to_layer_id(i) for i in layer["link_end"])
+
+            self.model_data[layer_id] = layer
+
+        for group in self.groups.values() :
+
+            group["members"] = set(to_layer_id(i) for i in group["members"])
+
+        self.spatial_index.clear()
+
+        for layer_id, layer in self.model_data.items() :
+
+            if "pos" in layer and list(layer["pos"]) != [-1, -1] :
+
+                self.spatial_index.insert(layer_id, layer["pos"])
+
+        self.clear_hashes()
+
+        self.events.emit( events.model_loaded )
+
+
+
+    ##################
+    # content hashes #
+    ##################
+
+    # The hash of a layer covers its type, name, group, parameters and links
+    # but not its position. The hash of a group is the sum of its members'
+    # hashes plus the hash of its attributes, the root hash is the sum of the
+    # group hashes plus the input shape. Mutations only mark layers and groups
+    # as dirty, the hashes are brought up to date on demand in O(changed).
+
+    # compute the hashes of dirty layers and groups
+    def update_hashes( self ) :
+
+        if not self.dirty_layers and not self.dirty_groups :
+            return
+
+        # the links between groups and the indexes follow the same changes
+        self.update_group_links( self.dirty_layers )
+        self.update_indexes( self.dirty_layers )
+
+        # group -> new {layer id: hash}, copied once since the old one may be shared
+        changed = {}
+
+        def members_of( group_name ) :
+
+            if group_name not in changed :
+
+                changed[group_name] = dict( self.hash_groups.get( group_name, (0, {}) )[1] )
+
+            return changed[group_name]
+
+        for layer_id in self.dirty_layers :
+
+            old_group = self.hash_layer_group.pop( layer_id, None )
+
+            if old_group is not None :
+
+                members_of( old_group ).pop( layer_id, None )
+
+            layer = self.model_data.get( layer_id )
+
+            if layer is not None :
 
-        # TODO
-        # set some list to set
+                members_of( layer["group"] )[layer_id] = hash_layer( layer )
+                self.hash_layer_group[layer_id] = layer["group"]
+
+        for group_name in self.dirty_groups :
+
+            members_of( group_name )
+
+        for group_name, members in changed.items() :
+
+            old_hash = self.hash_groups.get( group_name, (0, {}) )[0]
+            new_hash = sum( members.values() )
+
+            if group_name in self.groups :
+
+                new_hash += hash_group( group_name, self.groups[group_name] )
+
+            new_hash %= hash_modulo
+
+            if group_name in self.groups or members :
+
+                self.hash_groups[group_name] = ( new_hash, members )
+
+            else :
+
+                self.hash_groups.pop( group_name, None )
+
+            self.hash_root = ( self.hash_root - old_hash + new_hash ) % hash_modulo
+
+        self.dirty_layers.clear()
+        self.dirty_groups.clear()
+
+
+    # recompute all hashes on the next request
+    def clear_hashes( self ) :
+
+        self.hash_root = 0
+        self.hash_groups = {}
+        self.hash_layer_group = {}
+        self.layer_edges = {}
+        self.edge_parents = {}
+        self.group_links = {}
+        self.index = {}
+        self.index_keys = {}
+        self.dirty_layers = set( self.model_data.keys() )
+        self.dirty_groups = set( self.groups.keys() )
+
+
+    # return the hash of the whole model
+    def get_root_hash( self ) :
+
+        self.update_hashes()
+
+        return ( self.hash_root + hash_content( self.input_shape ) ) % hash_modulo
+
+
+    # return the hash of a group
+    def get_group_hash( self, group_name ) :
+
+        self.update_hashes()
+
+        return self.hash_groups.get( group_name, (0, {}) )[0]
+
+
+    # return the hash of a layer
+    def get_layer_hash( self, layer_id ) :
+
+        self.update_hashes()
+
+        group_name = self.hash_layer_group.get( layer_id )
+
+        if group_name is None :
+            return 0
+
+        return self.hash_groups[group_name][1][layer_id]
+
+
+    # return the current hashes, to be compared later by diff_hash_state
+    def get_hash_state( self ) :
+
+        """
+        The group entries are replaced and never modified, so the state
+        only copies the groups, not the layers
+        """
+
+        return { "root": self.get_root_hash(), "groups": dict( self.hash_groups ) }
+
+
+    # return the changes between two hash states, new defaults to the current one
+    def diff_hash_state( self, old, new=None ) :
+
+        """
+        Return a dict with the changed groups and the added, removed and
+        changed layer ids. Only the groups whose hash differ are compared
+        layer by layer.
+        """
+
+        new = new or self.get_hash_state()
+
+        diff = { "groups": [], "added": [], "removed": [], "changed": [] }
+
+        if old["root"] == new["root"] :
+            return diff
+
+        old_layers, new_layers = {}, {}
+
+        for group_name in set( old["groups"] ) | set( new["groups"] ) :
+
+            old_group = old["groups"].get( group_name, (None, {}) )
+            new_group = new["groups"].get( group_name, (None, {}) )
+
+            if old_group[0] == new_group[0] :
+                continue
+
+            diff["groups"].append( group_name )
+
+            old_layers.update( old_group[1] )
+            new_layers.update( new_group[1] )
+
+        for layer_id, layer_hash in new_layers.items() :
+
+            if layer_id not in old_layers :
+
+                diff["added"].append( layer_id )
+
+            elif old_layers[layer_id] != layer_hash :
+
+                diff["changed"].append( layer_id )
+
+        diff["removed"] = [ i for i in old_layers if i not in new_layers ]
+
+        return diff
 
     
     # rearrange layers by group
@@ -597,13 +1180,12 @@ class ModelManager() :
         
         starts = []
         
-        all_layers_in_group = self.groups[group]["members"]
-
-        print("all_nodes: ", all_layers_in_group)
+        all_layers_in_group = set( self.groups[group]["members"] )
         
+        # links coming from other groups are the group's inputs
         for layer_id in all_layers_in_group :
 
-            linked_nodes = self.model_data[layer_id]["link_start"]
+            linked_nodes = self.model_data[layer_id]["link_start"] & all_layers_in_group
 
             if len(linked_nodes) == 0 :
                 
@@ -622,11 +1204,12 @@ class ModelManager() :
         
         ends = []
         
-        all_layers_in_group = self.groups[group]["members"]
+        all_layers_in_group = set( self.groups[group]["members"] )
         
+        # links going to other groups are the group's outputs
         for layer_id in all_layers_in_group :
 
-            linked_nodes = self.model_data[layer_id]["link_end"]
+            linked_nodes = self.model_data[layer_id]["link_end"] & all_layers_in_group
 
             if len(linked_nodes) == 0 :
                 
@@ -644,11 +1227,17 @@ class ModelManager() :
         nodes_undone = {}
         nodes_done = []
 
-        start_nodes = self.find_start_nodes( group )
-        print("start_nodes: ", start_nodes)
+        members = set( self.groups[group]["members"] )
 
+        start_nodes = self.find_start_nodes( group )
         end_nodes = self.find_end_nodes( group )
-        print("end_nodes: ", end_nodes)
+
+        # empty group
+        if not start_nodes :
+            return paths
+
+        if trace_bfs.on :
+            trace_bfs.emit( group=group, start_nodes=start_nodes, end_nodes=end_nodes )
 
         for node in start_nodes :
 
@@ -661,8 +1250,8 @@ class ModelManager() :
             current_node = nodes_done.pop(-1)
             ordered_nodes.append(current_node)
 
-            # add all children to the list
-            for child in self.model_data[current_node]["link_end"] :
+            # add all children in the group to the list
+            for child in self.model_data[current_node]["link_end"] & members :
 
                 if child in nodes_undone.keys() :
 
@@ -674,12 +1263,14 @@ class ModelManager() :
 
             # treat nodes with all inputs
             temp_nodes = []
-            print("undone: ", nodes_undone)
+
+            if trace_bfs_step.on :
+                trace_bfs_step.emit( node=current_node, undone=dict(nodes_undone) )
 
             for node in nodes_undone.keys() :
 
                 # all inputs satisfied
-                if nodes_undone[node] == len(self.model_data[node]["link_start"]) :
+                if nodes_undone[node] == len(self.model_data[node]["link_start"] & members) :
 
                     temp_nodes.append( node )
                     #ordered_nodes.append(node)
@@ -694,14 +1285,10 @@ class ModelManager() :
                     end_node = node
 
                     # get the path
-                    print("ordered nodes: ", ordered_nodes)
-
                     path = [end_node]
                     temp_ordered_nodes = ordered_nodes
                     temp_ordered_nodes.reverse()
 
-                    print("temp ordered nodes: ", temp_ordered_nodes)
-
                     for prev_node in temp_ordered_nodes :
 
                         if prev_node in self.model_data[end_node]["link_start"] :
@@ -713,8 +1300,6 @@ class ModelManager() :
                     paths.append( path )
 
             # update undone nodes
-            print("temp nodes: ", temp_nodes, nodes_undone)
-
             for node in temp_nodes :
                 
                 nodes_undone.pop( node )
@@ -723,25 +1308,294 @@ class ModelManager() :
             if not nodes_done :
                 break
 
-        print("paths: ", paths)
+        if trace_bfs.on :
+            trace_bfs.emit( group=group, paths=paths )
+
         return paths
 
                 
+    # return the groups in execution order
     def bfs_group( self ) :
 
-        group_path = []
+        return self.get_group_schedule()
 
-        for group in self.groups :
 
-            start = self.find_start_nodes( group )
+    ######################
+    # links among groups #
+    ######################
 
-            if start in input :
-                group_path.append( group )
-                break
+    # The links going from a layer to a layer of another group make the
+    # dataflow graph of the groups. Each layer keeps the groups of its
+    # outgoing links, only the changed layers and their parents are
+    # visited again when the graph is needed.
+
+    # refresh the links of changed layers, and of the layers linked to them
+    def update_group_links( self, layer_ids ) :
+
+        refresh = set( layer_ids )
+
+        for layer_id in layer_ids :
+
+            refresh |= self.edge_parents.get( layer_id, set() )
+
+            if layer_id in self.model_data :
+
+                refresh |= self.model_data[layer_id]["link_start"]
+
+        for layer_id in refresh :
+
+            for child, pair in self.layer_edges.pop( layer_id, {} ).items() :
+
+                self.edge_parents[child].discard( layer_id )
+
+                if not self.edge_parents[child] :
+                    self.edge_parents.pop( child )
+
+                if pair[0] != pair[1] :
+
+                    self.group_links[pair] -= 1
+
+                    if self.group_links[pair] == 0 :
+                        self.group_links.pop( pair )
+
+            layer = self.model_data.get( layer_id )
+
+            if layer is None :
+                continue
+
+            edges = {}
+
+            for child in layer["link_end"] :
+
+                if not child in self.model_data :
+                    continue
+
+                pair = ( layer["group"], self.model_data[child]["group"] )
+                edges[child] = pair
+
+                self.edge_parents.setdefault( child, set() ).add( layer_id )
+
+                if pair[0] != pair[1] :
+
+                    self.group_links[pair] = self.group_links.get( pair, 0 ) + 1
+
+            self.layer_edges[layer_id] = edges
+
+
+    # return the groups feeding each group, in model order
+    def get_group_inputs( self ) :
+
+        self.update_hashes()
+
+        inputs = { g: [] for g in self.groups if self.groups[g]["members"] }
+
+        order = { g: i for i, g in enumerate( self.groups ) }
+
+        for source, target in sorted( self.group_links, key=lambda pair: order.get( pair[0], -1 ) ) :
+
+            if source in inputs and target in inputs :
+
+                inputs[target].append( source )
+
+        return inputs
+
+
+    # return the non empty groups in a topological order of their links
+    def get_group_schedule( self ) :
+
+        inputs = self.get_group_inputs()
+
+        pending = { g: len(sources) for g, sources in inputs.items() }
+        outputs = { g: [] for g in inputs }
+
+        for target, sources in inputs.items() :
+
+            for source in sources :
+
+                outputs[source].append( target )
+
+        schedule = []
+        ready = [ g for g in inputs if pending[g] == 0 ]
+
+        while ready :
+
+            group_name = ready.pop(0)
+            schedule.append( group_name )
+
+            for target in outputs[group_name] :
+
+                pending[target] -= 1
+
+                if pending[target] == 0 :
+                    ready.append( target )
+
+        # groups left are in a cycle, keep them in model order
+        if len(schedule) < len(inputs) :
+
+            logging.warning("Groups are linked in a cycle.")
+
+            schedule += [ g for g in inputs if pending[g] > 0 ]
+
+        return schedule
+
+
+    # return the groups whose outputs are not used by another group
+    def get_output_groups( self ) :
+
+        inputs = self.get_group_inputs()
+
+        used = set( source for sources in inputs.values() for source in sources )
+
+        return [ g for g in inputs if not g in used ]
+
+
+    #####################
+    # secondary indexes #
+    #####################
+
+    # Layers are indexed by type, category, group and parameter values, the
+    # keys are ("type", value), ("category", value), ("group", value) and
+    # ("param", name, value). Values are compared as text since the editor
+    # stores some parameters as numbers and the definitions as strings,
+    # numbers are written in one form (see index_value) so 0, "0" and 0.0
+    # match. The indexes follow the dirty layers, like the hashes.
+
+    # refresh the index keys of changed layers
+    def update_indexes( self, layer_ids ) :
+
+        for layer_id in layer_ids :
+
+            for key in self.index_keys.pop( layer_id, () ) :
+
+                self.index[key].discard( layer_id )
+
+                if not self.index[key] :
+                    self.index.pop( key )
+
+            layer = self.model_data.get( layer_id )
+
+            if layer is None :
+                continue
+
+            keys = [ ( field, str( layer.get(field) ) ) for field in ( "type", "category", "group" ) ]
+            keys += [ ( "param", p["name"], index_value( p.get("value") ) ) for p in layer["parameters"] if p ]
+
+            for key in keys :
+
+                self.index.setdefault( key, set() ).add( layer_id )
+
+            self.index_keys[layer_id] = keys
+
+
+    # return the ids of the layers matching all the given conditions
+    def query( self, layer_type=None, category=None, group_name=None, params=None, where=None ) :
+
+        """
+        params is a dict parameter name -> value, where an optional
+        function where( layer ) filtering the layers left by the indexes,
+        for conditions other than equality. Without condition all the
+        layers are returned. The ids are sorted.
+        """
+
+        self.update_hashes()
+
+        keys = [ ( field, str(value) ) for field, value in ( ( "type", layer_type ),
+                                                             ( "category", category ),
+                                                             ( "group", group_name ) )
+                 if value is not None ]
+
+        keys += [ ( "param", name, index_value(value) ) for name, value in ( params or {} ).items() ]
+
+        if keys :
+
+            # intersect from the smallest set
+            sets = sorted( ( self.index.get( key, set() ) for key in keys ), key=len )
+
+            result = set( sets[0] ).intersection( *sets[1:] )
+
+        else :
+
+            result = set( self.model_data.keys() )
+
+        if where is not None :
+
+            result = [ i for i in result if where( self.model_data[i] ) ]
+
+        return sorted( result )
+
+
+    # return the indexed values of a field ("type", "category", "group") or of a parameter
+    def get_index_values( self, field, param_name=None ) :
+
+        self.update_hashes()
+
+        if field == "param" :
+
+            return sorted( key[2] for key in self.index if key[0] == "param" and key[1] == param_name )
+
+        return sorted( key[1] for key in self.index if key[0] == field )
+
+
+
+# helper returning the indexed text of a parameter value, numbers in one form
+def index_value( value ) :
+
+    text = str( value ).strip()
+
+    try :
+
+        return str( int( text ) )
+
+    except ValueError :
+
+        pass
+
+    try :
+
+        number = float( text )
+
+    except ValueError :
+
+        return text
+
+    return str( int( number ) ) if number.is_integer() else repr( number )
+
+
+# hashes are kept modulo 2^64
+hash_modulo = 1 << 64
+
+
+# helper returning the 64 bits hash of json serializable content
+def hash_content( content ) :
+
+    text = json.dumps( content, sort_keys=True, default=str )
+
+    return int.from_bytes( hashlib.blake2b( text.encode(), digest_size=8 ).digest(), "little" )
+
+
+# helper returning the hash of a layer, its position is left out
+def hash_layer( layer ) :
+
+    params = [ ( p["name"], p.get("value") ) for p in layer["parameters"] ]
+
+    return hash_content( [ layer["id"], layer["type"], layer["name"], layer["group"], params,
+                           sorted( layer["link_start"], key=str ),
+                           sorted( layer["link_end"], key=str ) ] )
+
+
+# helper returning the hash of a group's attributes, its look is left out
+def hash_group( group_name, group ) :
+
+    attributes = { k: v for k, v in group.items() if k not in ( "members", "color", "collapsed" ) }
+
+    return hash_content( [ group_name, attributes ] )
+
+
+# helper to get back a layer id saved as a json key
+def to_layer_id( key ) :
 
-        while False :
+    if isinstance(key, str) and key.lstrip("-").isdigit() :
 
-            last = self.find_last_nodes(group_path[-1])
-            group_path.append(self.model_data[last]["link_end"][-1]) # suppose there is only one last node
+        return int(key)
 
-        return group_path
\ No newline at end of file
+    return key
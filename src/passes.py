@@ -0,0 +1,311 @@
+"""
+ Pass manager and passes over the intermediate representation (src/ir.py).
+
+ A pass is a function pass_function( program, model_manager ) rewriting
+ the program in place. The PassManager runs its passes in order, times
+ each of them and stops if the generation is cancelled. Validations are
+ passes as well, they log warnings and leave the program unchanged.
+"""
+
+import logging, time
+
+from .ir import Instance, Statement, Module, input_value
+
+
+class PassManager :
+
+    def __init__( self, passes=None ) :
+
+        # list of (name, function)
+        self.passes = list( passes or [] )
+
+        # name -> seconds taken by the last run
+        self.timings = {}
+
+
+    # add a pass at the end, or before another one
+    def add( self, name, function, before=None ) :
+
+        names = [ n for n, f in self.passes ]
+
+        index = names.index( before ) if before in names else len( self.passes )
+
+        self.passes.insert( index, ( name, function ) )
+
+
+    # remove a pass by its name
+    def remove( self, name ) :
+
+        self.passes = [ ( n, f ) for n, f in self.passes if n != name ]
+
+
+    # run the passes in order, return False if cancelled
+    def run( self, program, model_manager, cancel=None ) :
+
+        self.timings = {}
+
+        for name, function in self.passes :
+
+            if cancel is not None and cancel.is_set() :
+                return False
+
+            start = time.perf_counter()
+
+            function( program, model_manager )
+
+            self.timings[name] = time.perf_counter() - start
+
+        return True
+
+
+# pass: the layers of these categories are not built as sub-modules
+def drop_container_layers( program, model_manager, categories=( "Operator", "Container" ) ) :
+
+    """
+    Their statements are removed as well, the values they computed are
+    replaced by their inputs, so the data goes through them
+    """
+
+    for module in program.modules :
+
+        dropped = set( i.attr for i in module.instances
+                       if i.layer is not None and i.layer.get( "category" ) in categories )
+
+        if not dropped :
+            continue
+
+        module.instances = [ i for i in module.instances if not i.attr in dropped ]
+
+        # value of a dropped layer -> the values it is replaced by
+        replaced = {}
+
+        def resolve( values ) :
+
+            return [ v for value in values for v in replaced.get( value, [ value ] ) ]
+
+        statements = []
+
+        for statement in module.statements :
+
+            inputs = [ resolve( argument ) for argument in statement.inputs ]
+
+            if statement.attr in dropped :
+
+                replaced[statement.target] = [ v for argument in inputs for v in argument ]
+
+            else :
+
+                statement.inputs = inputs
+                statements.append( statement )
+
+        module.statements = statements
+        module.outputs = [ " + ".join( resolve( [ output ] ) ) for output in module.outputs ]
+
+
+# pass: turn the layer parameters into constructor arguments
+def resolve_arguments( program, model_manager ) :
+
+    """
+    Parameters without default are positional, the ones with a default
+    are only passed, by name, when their value differs from it
+    """
+
+    for module in program.modules :
+
+        # the class of another group is used
+        if not module.emit :
+            continue
+
+        for instance in module.instances :
+
+            if instance.layer is None :
+                continue
+
+            parameters = instance.layer["parameters"]
+
+            instance.args = [ str( p["value"] ) for p in parameters if p.get( "default" ) == 0 ]
+            instance.kwargs = [ ( p["name"], str( p["value"] ) ) for p in parameters
+                                if p.get( "default" ) != 0 and p.get( "default_value" ) != p["value"] ]
+
+
+# return a pass using one class for isomorphic groups
+def make_canonicalize_groups( canonicalizer, lock ) :
+
+    """
+    The canonicalizer (src/isomorphism.py) caches the hashes of the
+    groups, the lock protects it from concurrent generations
+    """
+
+    def canonicalize_groups( program, model_manager ) :
+
+        with lock :
+
+            canonical = canonicalizer.find_canonical_groups( model_manager )
+            mappings = dict( canonicalizer.mappings )
+
+        for module in program.modules :
+
+            if module.kind == "block" and canonical.get( module.group, module.group ) != module.group :
+
+                module.name = canonical[module.group]
+                module.emit = False
+
+                # the arguments and returned values follow the order of the class
+                other = program.get_module( module.name )
+                layers = { c: i for i, c in mappings[module.group].items() }
+
+                module.input_layers = [ layers[i] for i in other.input_layers ]
+                module.output_layers = [ layers[i] for i in other.output_layers ]
+
+    return canonicalize_groups
+
+
+# pass: add a wrapper chaining the blocks of repeated groups
+def add_repeat_wrappers( program, model_manager ) :
+
+    modules = []
+
+    for module in program.modules :
+
+        modules.append( module )
+
+        repeat = model_manager.get_group_repeat( module.group )
+
+        if module.kind != "block" or repeat <= 1 :
+            continue
+
+        # the output of a block is the input of the next one
+        if len( module.input_layers ) > 1 or len( module.output_layers ) > 1 :
+
+            raise ValueError( "Group %s is repeated but has %d inputs and %d outputs, "
+                              "a repeated group needs one of each." 
+                              % ( module.group, len( module.input_layers ), len( module.output_layers ) ) )
+
+        wrapper = Module( module.group + "_repeat", "repeat", module.group )
+        wrapper.repeat = repeat
+        wrapper.block = module.name
+        wrapper.outputs = [ input_value ]
+        wrapper.input_layers = module.input_layers
+        wrapper.output_layers = module.output_layers
+
+        modules.append( wrapper )
+
+    program.modules = modules
+
+
+# pass: build the final module chaining the groups in dataflow order
+def build_final_module( program, model_manager ) :
+
+    """
+    Each entry layer of a group gets the sum of the exit layers linked to
+    it from other groups, or the model input, the values are named after
+    the layers
+    """
+
+    final = Module( "final", "final" )
+
+    # the module used for each group
+    modules = {}
+
+    for module in program.modules :
+
+        if module.kind == "block" :
+            modules.setdefault( module.group, module )
+
+        if module.kind == "repeat" :
+            modules[module.group] = module
+
+    def value( layer_id ) :
+
+        return "out_" + model_manager.get_layer_name( layer_id )
+
+    for group_name in model_manager.get_group_schedule() :
+
+        module = modules[group_name]
+        members = model_manager.get_group_attribute( group_name, "members" )
+
+        inputs = []
+
+        for layer_id in module.input_layers :
+
+            parents = sorted( p for p in model_manager.get_links( layer_id )[0] 
+                              if p in model_manager.model_data and not p in members )
+
+            inputs.append( [ value(p) for p in parents ] or [ input_value ] )
+
+        target = ", ".join( value(i) for i in module.output_layers )
+
+        final.instances.append( Instance( group_name, module.name ) )
+        final.statements.append( Statement( target, group_name, inputs or [ [ input_value ] ] ) )
+
+    # layers linked to nothing are the outputs of the model
+    final.outputs = [ value(i) for g in model_manager.get_group_schedule() for i in modules[g].output_layers
+                      if not set( model_manager.get_links( i )[1] ) & set( model_manager.model_data ) ]
+
+    final.outputs = final.outputs or [ input_value ]
+
+    program.final = final
+
+
+# pass: check that the statements only call declared instances
+def validate_statements( program, model_manager ) :
+
+    modules = [ m for m in program.modules if m.emit and m.kind == "block" ] + [ program.final ]
+
+    for module in modules :
+
+        attrs = set( i.attr for i in module.instances )
+
+        for statement in module.statements :
+
+            if not statement.attr in attrs :
+
+                raise ValueError( "%s: %s is called but not declared." % ( module.name, statement.attr ) )
+
+
+# pass: warn about layers that can not be built
+def validate_arguments( program, model_manager ) :
+
+    for module in program.modules :
+
+        if not module.emit :
+            continue
+
+        for instance in module.instances :
+
+            if instance.layer is None :
+                continue
+
+            for name in get_unset_parameters( instance.layer ) :
+
+                logging.warning( "%s: parameter %s of %s is not set.", module.name, name, instance.attr )
+
+
+# return the names of the positional parameters of a layer without value
+def get_unset_parameters( layer ) :
+
+    return [ p["name"] for p in layer["parameters"]
+             if p and p.get( "default" ) == 0 and p["value"] in ( "", None ) ]
+
+
+# pass: empty groups are not used by the final module, their class is not emitted
+def drop_empty_modules( program, model_manager ) :
+
+    for module in program.modules :
+
+        if module.kind == "block" and not module.statements :
+
+            module.emit = False
+
+
+# return the default passes, in order
+def default_passes( canonicalizer, lock ) :
+
+    return [ ( "canonicalize_groups", make_canonicalize_groups( canonicalizer, lock ) ),
+             ( "drop_empty_modules", drop_empty_modules ),
+             ( "drop_container_layers", drop_container_layers ),
+             ( "resolve_arguments", resolve_arguments ),
+             ( "add_repeat_wrappers", add_repeat_wrappers ),
+             ( "build_final_module", build_final_module ),
+             ( "validate_arguments", validate_arguments ),
+             ( "validate_statements", validate_statements ) ]
@@ -0,0 +1,257 @@
+"""
+ Opt-in profiler of the callbacks and of the render loop.
+
+ Enabled by setting the TORCHNODE_PROFILE environment variable to the
+ file receiving the profile (or to 1 for "profile.json"). When enabled:
+
+    * the callbacks of a module are wrapped to record their latency in
+      log2 histograms (microseconds)
+    * the frame times are recorded from the render loop
+    * an overlay window shows the frame time and the slowest callbacks
+    * the profile is written to a json file on exit
+
+ When disabled nothing is wrapped and the render loop only checks a flag.
+"""
+
+import json, logging, math, os, threading, time
+
+
+# number of log2 buckets of the histograms, the last one is open
+histogram_size = 32
+
+
+class LatencyHistogram :
+
+    def __init__( self ) :
+
+        # bucket i counts the durations in [2^(i-1), 2^i) microseconds
+        self.buckets = [0] * histogram_size
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+
+
+    # record a duration in seconds
+    def add( self, duration ) :
+
+        us = duration * 1e6
+        bucket = min( int(us).bit_length(), histogram_size - 1 )
+
+        self.buckets[bucket] += 1
+        self.count += 1
+        self.total += duration
+        self.max = max( self.max, duration )
+
+
+    # return the upper bound of a percentile, in seconds
+    def percentile( self, p ) :
+
+        if self.count == 0 :
+            return 0.0
+
+        target = math.ceil( self.count * p / 100 )
+        seen = 0
+
+        for bucket, n in enumerate( self.buckets ) :
+
+            seen += n
+
+            if seen >= target :
+
+                return min( 2 ** bucket / 1e6, self.max )
+
+        return self.max
+
+
+    # return the mean duration in seconds
+    def mean( self ) :
+
+        return self.total / self.count if self.count else 0.0
+
+
+    # return a json ready summary
+    def to_dict( self ) :
+
+        return { "count": self.count,
+                 "total_ms": self.total * 1e3,
+                 "mean_ms": self.mean() * 1e3,
+                 "p50_ms": self.percentile( 50 ) * 1e3,
+                 "p95_ms": self.percentile( 95 ) * 1e3,
+                 "p99_ms": self.percentile( 99 ) * 1e3,
+                 "max_ms": self.max * 1e3,
+                 "buckets_us": { str( 2 ** i ): n for i, n in enumerate( self.buckets ) if n }
+               }
+
+
+class Profiler :
+
+    def __init__( self, output_file=None ) :
+
+        # profiling is on when an output file is given
+        self.enabled = output_file is not None
+        self.output_file = output_file
+
+        # callback name -> LatencyHistogram
+        self.callbacks = {}
+        self.frames = LatencyHistogram()
+
+        self.last_frame = None
+        self.frame_count = 0
+        self.lock = threading.Lock()
+
+
+    # wrap all callbacks of a module, must be done before they are imported elsewhere
+    def instrument_module( self, module, suffix="_callback", names=() ) :
+
+        if not self.enabled :
+            return
+
+        for name, value in list( vars(module).items() ) :
+
+            if callable( value ) and getattr( value, "__module__", None ) == module.__name__ \
+               and ( name.endswith( suffix ) or name in names ) :
+
+                setattr( module, name, self.wrap( value, name ) )
+
+
+    # return a timed version of a callback
+    def wrap( self, func, name=None ) :
+
+        """
+        dearpygui passes as many arguments as the callback declares, so
+        the wrapper keeps the number of positional arguments of func
+        """
+
+        if not self.enabled :
+            return func
+
+        name = name or func.__name__
+        record = self.record
+
+        argcount = func.__code__.co_argcount
+
+        if argcount == 0 :
+
+            def wrapper() :
+                start = time.perf_counter()
+                try :
+                    return func()
+                finally :
+                    record( name, time.perf_counter() - start )
+
+        elif argcount == 1 :
+
+            def wrapper( sender ) :
+                start = time.perf_counter()
+                try :
+                    return func( sender )
+                finally :
+                    record( name, time.perf_counter() - start )
+
+        elif argcount == 2 :
+
+            def wrapper( sender, app_data ) :
+                start = time.perf_counter()
+                try :
+                    return func( sender, app_data )
+                finally :
+                    record( name, time.perf_counter() - start )
+
+        else :
+
+            def wrapper( sender=None, app_data=None, user_data=None ) :
+                start = time.perf_counter()
+                try :
+                    return func( sender, app_data, user_data )
+                finally :
+                    record( name, time.perf_counter() - start )
+
+        wrapper.__name__ = func.__name__
+        wrapper.__doc__ = func.__doc__
+        wrapper.__wrapped__ = func
+
+        return wrapper
+
+
+    # record the duration of a callback
+    def record( self, name, duration ) :
+
+        with self.lock :
+
+            histogram = self.callbacks.get( name )
+
+            if histogram is None :
+
+                histogram = self.callbacks[name] = LatencyHistogram()
+
+            histogram.add( duration )
+
+
+    # called once per frame by the render loop
+    def frame( self ) :
+
+        now = time.perf_counter()
+
+        if self.last_frame is not None :
+
+            self.frames.add( now - self.last_frame )
+
+        self.last_frame = now
+        self.frame_count += 1
+
+
+    # return the callbacks with the largest total time
+    def top_callbacks( self, n=5 ) :
+
+        with self.lock :
+
+            items = list( self.callbacks.items() )
+
+        items.sort( key=lambda item: item[1].total, reverse=True )
+
+        return items[:n]
+
+
+    # return a json ready profile
+    def report( self ) :
+
+        with self.lock :
+
+            callbacks = { name: h.to_dict() for name, h in self.callbacks.items() }
+
+        return { "frames": self.frames.to_dict(), "callbacks": callbacks }
+
+
+    # write the profile to the output file
+    def dump( self ) :
+
+        if not self.enabled :
+            return
+
+        try :
+
+            with open( self.output_file, 'w', encoding='utf-8' ) as f :
+
+                json.dump( self.report(), f, indent=4 )
+
+        except OSError as e :
+
+            logging.warning( "Writing profile %s failed: %s", self.output_file, e )
+
+
+# return the profile file selected by the environment, None if disabled
+def get_profile_file( variable="TORCHNODE_PROFILE" ) :
+
+    value = os.environ.get( variable, "" )
+
+    if value in ( "", "0" ) :
+        return None
+
+    if value == "1" :
+        return "profile.json"
+
+    return value
+
+
+# profiler of the application
+profiler = Profiler( get_profile_file() )
@@ -0,0 +1,440 @@
+"""
+ Structural diff and three-way merge of project files (see ModelManager.save).
+
+ Layers are matched by id and groups by name. A diff reports the added,
+ removed and changed layers (with the changed fields), the added and
+ removed links and the added, removed and changed groups. A merge takes
+ a common base and two edited versions, applies the changes of both and
+ reports the conflicts, the edits of "ours" are kept on conflicts.
+
+ Unchanged layers are skipped with a single dict comparison, so large
+ projects stay fast to compare. Command line:
+
+    python -m src.project_diff diff base.json other.json
+    python -m src.project_diff merge base.json ours.json theirs.json -o merged.json
+"""
+
+import argparse, json, sys
+
+from .manager_info import to_layer_id
+from .autosave import write_atomic
+
+
+# layer fields merged as sets of links
+link_fields = ( "link_start", "link_end" )
+
+
+# read a project file
+def load_project( file ) :
+
+    with open( file, encoding='utf-8' ) as f :
+
+        return json.load( f )
+
+
+# return the links of a project as a set of (start id, end id)
+def get_links( project ) :
+
+    links = set()
+
+    for layer_id, layer in project["model_data"].items() :
+
+        for end_id in layer["link_end"] :
+
+            links.add( ( str(layer_id), str(end_id) ) )
+
+    return links
+
+
+# return the parameters of a layer as a dict name -> value
+def get_params( layer ) :
+
+    return { p["name"]: p.get( "value" ) for p in layer.get( "parameters", [] ) }
+
+
+# return the fields of a layer that differ, links left out
+def diff_layer( old, new, ignore=() ) :
+
+    fields = []
+
+    for key in set( old ) | set( new ) :
+
+        if key in link_fields or key in ignore :
+            continue
+
+        if key == "parameters" :
+
+            old_params, new_params = get_params( old ), get_params( new )
+
+            fields.extend( "parameters." + name for name in set( old_params ) | set( new_params )
+                           if old_params.get( name ) != new_params.get( name ) )
+
+        elif old.get( key ) != new.get( key ) :
+
+            fields.append( key )
+
+    return sorted( fields )
+
+
+# return the differences between two projects
+def diff_projects( old, new, ignore=() ) :
+
+    """
+    ignore lists layer fields left out of the comparison (eg. "pos")
+    """
+
+    old_layers, new_layers = old["model_data"], new["model_data"]
+
+    changed = {}
+
+    for layer_id, layer in new_layers.items() :
+
+        old_layer = old_layers.get( layer_id )
+
+        # fast path, most layers are identical
+        if old_layer is None or old_layer == layer :
+            continue
+
+        fields = diff_layer( old_layer, layer, ignore )
+
+        if fields :
+            changed[layer_id] = fields
+
+    old_links, new_links = get_links( old ), get_links( new )
+
+    old_groups, new_groups = old["groups"], new["groups"]
+
+    changed_groups = {}
+
+    for name, group in new_groups.items() :
+
+        if name in old_groups and old_groups[name] != group :
+
+            attributes = [ key for key in set( group ) | set( old_groups[name] )
+                           if key != "members" and group.get( key ) != old_groups[name].get( key ) ]
+
+            if set( map( str, group["members"] ) ) != set( map( str, old_groups[name]["members"] ) ) :
+                attributes.append( "members" )
+
+            if attributes :
+                changed_groups[name] = sorted( attributes )
+
+    return { "layers": { "added": sorted( new_layers.keys() - old_layers.keys(), key=to_layer_id_key ),
+                         "removed": sorted( old_layers.keys() - new_layers.keys(), key=to_layer_id_key ),
+                         "changed": changed },
+             "links": { "added": sorted( new_links - old_links ),
+                        "removed": sorted( old_links - new_links ) },
+             "groups": { "added": sorted( new_groups.keys() - old_groups.keys() ),
+                         "removed": sorted( old_groups.keys() - new_groups.keys() ),
+                         "changed": changed_groups },
+             "input_shape": None if old.get( "input_shape" ) == new.get( "input_shape" )
+                            else [ old.get( "input_shape" ), new.get( "input_shape" ) ] }
+
+
+# check if a diff is empty
+def is_empty_diff( diff ) :
+
+    return not any( ( diff["layers"]["added"], diff["layers"]["removed"], diff["layers"]["changed"],
+                      diff["links"]["added"], diff["links"]["removed"],
+                      diff["groups"]["added"], diff["groups"]["removed"], diff["groups"]["changed"],
+                      diff["input_shape"] ) )
+
+
+# merge a value changed on both sides, return (value, conflict)
+def merge_value( base, ours, theirs ) :
+
+    if ours == theirs or theirs == base :
+        return ours, False
+
+    if ours == base :
+        return theirs, False
+
+    return ours, True
+
+
+# merge a dict field by field, return (merged, conflicting keys)
+def merge_dict( base, ours, theirs, skip=() ) :
+
+    merged = {}
+    conflicts = []
+    missing = object()
+
+    for key in list( ours ) + [ k for k in theirs if k not in ours ] + [ k for k in base if k not in ours and k not in theirs ] :
+
+        if key in skip :
+            continue
+
+        value, conflict = merge_value( base.get( key, missing ), ours.get( key, missing ), theirs.get( key, missing ) )
+
+        if conflict :
+            conflicts.append( key )
+
+        if value is not missing :
+            merged[key] = value
+
+    return merged, conflicts
+
+
+# merge the parameters of a layer by name, return (parameters, conflicting names)
+def merge_params( base, ours, theirs ) :
+
+    base_params, their_params = get_params( base ), get_params( theirs )
+
+    merged = []
+    conflicts = []
+
+    for param in ours.get( "parameters", [] ) :
+
+        name = param["name"]
+        value, conflict = merge_value( base_params.get( name ), param.get( "value" ), their_params.get( name ) )
+
+        if conflict :
+            conflicts.append( "parameters." + name )
+
+        merged.append( dict( param, value=value ) )
+
+    return merged, conflicts
+
+
+# merge two projects edited from a common base
+def merge_projects( base, ours, theirs ) :
+
+    """
+    Return (merged project, conflicts), conflicts is a list of dicts
+    with the kind ("layer", "group", "input_shape"), the key and the
+    conflicting fields. On conflicts the version of ours is kept.
+    """
+
+    conflicts = []
+
+    base_layers, our_layers, their_layers = base["model_data"], ours["model_data"], theirs["model_data"]
+
+    model_data = {}
+
+    for layer_id in list( our_layers ) + [ i for i in their_layers if i not in our_layers ] :
+
+        base_layer = base_layers.get( layer_id )
+        our_layer = our_layers.get( layer_id )
+        their_layer = their_layers.get( layer_id )
+
+        # added or kept on one side only
+        if our_layer is None or their_layer is None :
+
+            layer = our_layer if their_layer is None else their_layer
+
+            if base_layer is None :
+
+                model_data[layer_id] = layer
+
+            elif without_links( layer ) != without_links( base_layer ) :
+
+                # removed on one side, edited on the other: keep the edit
+                conflicts.append( { "kind": "layer", "key": layer_id, "fields": [ "removed" ] } )
+                model_data[layer_id] = layer
+
+            continue
+
+        # fast path, at most one side changed the layer
+        if their_layer == base_layer or our_layer == their_layer :
+
+            model_data[layer_id] = our_layer
+            continue
+
+        if our_layer == base_layer :
+
+            model_data[layer_id] = their_layer
+            continue
+
+        base_layer = base_layer or {}
+
+        layer, fields = merge_dict( base_layer, our_layer, their_layer, skip=link_fields + ( "parameters", ) )
+        layer["parameters"], params = merge_params( base_layer, our_layer, their_layer )
+
+        if fields or params :
+            conflicts.append( { "kind": "layer", "key": layer_id, "fields": sorted( fields + params ) } )
+
+        model_data[layer_id] = layer
+
+    # links: kept on both sides, or added on one side
+    base_links, our_links, their_links = get_links( base ), get_links( ours ), get_links( theirs )
+
+    links = ( our_links & their_links ) | ( our_links - base_links ) | ( their_links - base_links )
+
+    ids = { str(layer_id): layer_id for layer_id in model_data }
+
+    for layer_id in model_data :
+
+        model_data[layer_id] = dict( model_data[layer_id], link_start=[], link_end=[] )
+
+    for start, end in sorted( links ) :
+
+        # links to removed layers are dropped
+        if start in ids and end in ids :
+
+            model_data[ids[start]]["link_end"].append( to_layer_id( end ) )
+            model_data[ids[end]]["link_start"].append( to_layer_id( start ) )
+
+    # groups: attributes merged, members follow the merged layers
+    groups = {}
+
+    for name in list( ours["groups"] ) + [ g for g in theirs["groups"] if g not in ours["groups"] ] :
+
+        base_group = base["groups"].get( name )
+        our_group = ours["groups"].get( name )
+        their_group = theirs["groups"].get( name )
+
+        if our_group is None or their_group is None :
+
+            group = our_group if their_group is None else their_group
+
+            if base_group is not None and { k: v for k, v in group.items() if k != "members" } != \
+                                          { k: v for k, v in base_group.items() if k != "members" } :
+
+                conflicts.append( { "kind": "group", "key": name, "fields": [ "removed" ] } )
+
+            elif base_group is not None :
+
+                # removed on one side
+                continue
+
+            groups[name] = dict( group )
+            continue
+
+        group, fields = merge_dict( base_group or {}, our_group, their_group, skip=( "members", ) )
+
+        if fields :
+            conflicts.append( { "kind": "group", "key": name, "fields": sorted( fields ) } )
+
+        groups[name] = group
+
+    for group in groups.values() :
+
+        group["members"] = []
+
+    for layer_id, layer in model_data.items() :
+
+        group_name = layer.get( "group" )
+
+        if group_name not in groups :
+
+            conflicts.append( { "kind": "layer", "key": layer_id, "fields": [ "group" ] } )
+
+            # the group was removed on one side, keep it
+            source = ours["groups"].get( group_name ) or theirs["groups"].get( group_name ) or {}
+            groups[group_name] = dict( source, members=[] )
+
+        groups[group_name]["members"].append( to_layer_id( layer_id ) )
+
+    input_shape, conflict = merge_value( base.get( "input_shape" ), ours.get( "input_shape" ), theirs.get( "input_shape" ) )
+
+    if conflict :
+        conflicts.append( { "kind": "input_shape", "key": "input_shape", "fields": [] } )
+
+    # names are numbered by type, keep the highest count
+    layer_type = dict( ours.get( "layer_type", {} ) )
+
+    for layer_name, count in theirs.get( "layer_type", {} ).items() :
+
+        layer_type[layer_name] = max( count, layer_type.get( layer_name, 0 ) )
+
+    merged = dict( ours )
+    merged["model_data"] = model_data
+    merged["groups"] = groups
+    merged["layer_type"] = layer_type
+    merged["input_shape"] = input_shape
+
+    return merged, conflicts
+
+
+# helper returning a layer without its links
+def without_links( layer ) :
+
+    return { k: v for k, v in layer.items() if k not in link_fields }
+
+
+# helper sorting layer ids numerically when possible
+def to_layer_id_key( key ) :
+
+    layer_id = to_layer_id( key )
+
+    return ( 0, layer_id, "" ) if isinstance( layer_id, int ) else ( 1, 0, str(layer_id) )
+
+
+# return a readable report of a diff
+def format_diff( diff ) :
+
+    lines = []
+
+    for layer_id in diff["layers"]["added"] :
+        lines.append( f"+ layer {layer_id}" )
+
+    for layer_id in diff["layers"]["removed"] :
+        lines.append( f"- layer {layer_id}" )
+
+    for layer_id, fields in diff["layers"]["changed"].items() :
+        lines.append( f"~ layer {layer_id}: {', '.join(fields)}" )
+
+    for start, end in diff["links"]["added"] :
+        lines.append( f"+ link {start} -> {end}" )
+
+    for start, end in diff["links"]["removed"] :
+        lines.append( f"- link {start} -> {end}" )
+
+    for name in diff["groups"]["added"] :
+        lines.append( f"+ group {name}" )
+
+    for name in diff["groups"]["removed"] :
+        lines.append( f"- group {name}" )
+
+    for name, attributes in diff["groups"]["changed"].items() :
+        lines.append( f"~ group {name}: {', '.join(attributes)}" )
+
+    if diff["input_shape"] is not None :
+        lines.append( f"~ input_shape: {diff['input_shape'][0]} -> {diff['input_shape'][1]}" )
+
+    return "\n".join( lines )
+
+
+def main( argv=None ) :
+
+    parser = argparse.ArgumentParser( description="Diff and merge TorchNode projects." )
+    commands = parser.add_subparsers( dest="command", required=True )
+
+    diff_parser = commands.add_parser( "diff", help="show the changes from base to other" )
+    diff_parser.add_argument( "base" )
+    diff_parser.add_argument( "other" )
+    diff_parser.add_argument( "--ignore-pos", action="store_true", help="leave out the node positions" )
+    diff_parser.add_argument( "--json", action="store_true", help="print the diff as json" )
+
+    merge_parser = commands.add_parser( "merge", help="merge ours and theirs edited from base" )
+    merge_parser.add_argument( "base" )
+    merge_parser.add_argument( "ours" )
+    merge_parser.add_argument( "theirs" )
+    merge_parser.add_argument( "-o", "--output", default=None, help="merged project, default: ours" )
+
+    args = parser.parse_args( argv )
+
+    if args.command == "diff" :
+
+        diff = diff_projects( load_project( args.base ), load_project( args.other ),
+                              ignore=( "pos", ) if args.ignore_pos else () )
+
+        print( json.dumps( diff, indent=4 ) if args.json else format_diff( diff ) )
+
+        return 0 if is_empty_diff( diff ) else 1
+
+    merged, conflicts = merge_projects( load_project( args.base ), load_project( args.ours ),
+                                        load_project( args.theirs ) )
+
+    write_atomic( args.output or args.ours, json.dumps( merged, ensure_ascii=False, indent=4 ) )
+
+    for conflict in conflicts :
+
+        print( f"conflict {conflict['kind']} {conflict['key']}: {', '.join(conflict['fields'])}" )
+
+    return 1 if conflicts else 0
+
+
+if __name__ == "__main__" :
+
+    sys.exit( main() )
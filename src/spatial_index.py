@@ -0,0 +1,249 @@
+"""
+ Spatial index over the node positions.
+
+ The positions are hashed into a uniform grid of square cells, so range
+ queries only visit the cells overlapping the rectangle and nearest
+ queries search rings of cells around the point, instead of scanning
+ every layer of the model.
+"""
+
+import math
+
+
+class SpatialIndex :
+
+    def __init__( self, cell_size=256 ) :
+
+        self.cell_size = cell_size
+
+        # cell (i, j) -> set of ids
+        self.cells = {}
+
+        # id -> (x, y)
+        self.positions = {}
+
+        # range of the used cells (imin, jmin, imax, jmax), computed
+        # again by get_max_ring after a border cell is emptied
+        self.bounds = None
+        self.bounds_dirty = False
+
+
+    # return the cell of a position
+    def get_cell( self, x, y ) :
+
+        return ( int( math.floor( x / self.cell_size ) ), int( math.floor( y / self.cell_size ) ) )
+
+
+    # add or move an item
+    def insert( self, item_id, pos ) :
+
+        x, y = float(pos[0]), float(pos[1])
+
+        if item_id in self.positions :
+
+            old_cell = self.get_cell( *self.positions[item_id] )
+            new_cell = self.get_cell( x, y )
+
+            self.positions[item_id] = ( x, y )
+
+            if old_cell == new_cell :
+                return
+
+            self.discard_from_cell( old_cell, item_id )
+
+        else :
+
+            self.positions[item_id] = ( x, y )
+            new_cell = self.get_cell( x, y )
+
+        self.cells.setdefault( new_cell, set() ).add( item_id )
+
+        if self.bounds is None :
+
+            self.bounds = new_cell + new_cell
+
+        else :
+
+            self.bounds = ( min( self.bounds[0], new_cell[0] ), min( self.bounds[1], new_cell[1] ),
+                            max( self.bounds[2], new_cell[0] ), max( self.bounds[3], new_cell[1] ) )
+
+
+    # remove an item
+    def remove( self, item_id ) :
+
+        pos = self.positions.pop( item_id, None )
+
+        if pos is None :
+            return
+
+        self.discard_from_cell( self.get_cell( *pos ), item_id )
+
+
+    # return the position of an item, None if not indexed
+    def get_pos( self, item_id ) :
+
+        return self.positions.get( item_id )
+
+
+    # return the ids inside a rectangle
+    def query_range( self, xmin, ymin, xmax, ymax ) :
+
+        imin, jmin = self.get_cell( xmin, ymin )
+        imax, jmax = self.get_cell( xmax, ymax )
+
+        found = set()
+
+        # large rectangles are faster to check item by item
+        if ( imax - imin + 1 ) * ( jmax - jmin + 1 ) > len( self.cells ) :
+
+            cells = [ ids for cell, ids in self.cells.items()
+                      if imin <= cell[0] <= imax and jmin <= cell[1] <= jmax ]
+
+        else :
+
+            cells = [ self.cells[(i, j)] for i in range( imin, imax + 1 )
+                      for j in range( jmin, jmax + 1 ) if (i, j) in self.cells ]
+
+        for ids in cells :
+
+            for item_id in ids :
+
+                x, y = self.positions[item_id]
+
+                if xmin <= x <= xmax and ymin <= y <= ymax :
+
+                    found.add( item_id )
+
+        return found
+
+
+    # return the closest item to a position and its distance
+    def nearest( self, pos, max_distance=math.inf, exclude=() ) :
+
+        """
+        Return (None, inf) if no item is found within max_distance
+        """
+
+        if not self.positions :
+            return None, math.inf
+
+        x, y = float(pos[0]), float(pos[1])
+        ci, cj = self.get_cell( x, y )
+
+        best_id, best_distance = None, math.inf
+
+        # rings of cells around the position, stop when no closer item can exist
+        max_ring = self.get_max_ring( ci, cj )
+        ring = 0
+
+        while ring <= max_ring :
+
+            if ( ring - 1 ) * self.cell_size > min( best_distance, max_distance ) :
+                break
+
+            # sparse far rings are faster to check cell by cell
+            if 8 * ring > len( self.cells ) :
+
+                cells = [ cell for cell in self.cells if max( abs( cell[0] - ci ), abs( cell[1] - cj ) ) >= ring ]
+                ring = max_ring
+
+            else :
+
+                cells = self.get_ring( ci, cj, ring )
+
+            for cell in cells :
+
+                for item_id in self.cells.get( cell, () ) :
+
+                    if item_id in exclude :
+                        continue
+
+                    ix, iy = self.positions[item_id]
+                    distance = math.hypot( ix - x, iy - y )
+
+                    if distance < best_distance :
+
+                        best_id, best_distance = item_id, distance
+
+            ring += 1
+
+        if best_distance > max_distance :
+            return None, math.inf
+
+        return best_id, best_distance
+
+
+    # return the number of indexed items
+    def count( self ) :
+
+        return len( self.positions )
+
+
+    # remove all items
+    def clear( self ) :
+
+        self.cells.clear()
+        self.positions.clear()
+        self.bounds = None
+        self.bounds_dirty = False
+
+
+    # helper to remove an id from a cell
+    def discard_from_cell( self, cell, item_id ) :
+
+        ids = self.cells.get( cell )
+
+        if ids is None :
+            return
+
+        ids.discard( item_id )
+
+        if not ids :
+
+            self.cells.pop( cell )
+
+            if self.bounds is not None and ( cell[0] in ( self.bounds[0], self.bounds[2] ) or
+                                             cell[1] in ( self.bounds[1], self.bounds[3] ) ) :
+                self.bounds_dirty = True
+
+
+    # helper returning the cells at a ring distance from a cell
+    def get_ring( self, ci, cj, ring ) :
+
+        if ring == 0 :
+            return [ (ci, cj) ]
+
+        cells = []
+
+        for k in range( -ring, ring + 1 ) :
+
+            cells.append( (ci + k, cj - ring) )
+            cells.append( (ci + k, cj + ring) )
+
+        for k in range( -ring + 1, ring ) :
+
+            cells.append( (ci - ring, cj + k) )
+            cells.append( (ci + ring, cj + k) )
+
+        return cells
+
+
+    # helper returning the ring reaching the farthest occupied cell
+    def get_max_ring( self, ci, cj ) :
+
+        if self.bounds_dirty :
+
+            self.bounds_dirty = False
+            self.bounds = None
+
+            if self.cells :
+
+                self.bounds = ( min( c[0] for c in self.cells ), min( c[1] for c in self.cells ),
+                                max( c[0] for c in self.cells ), max( c[1] for c in self.cells ) )
+
+        if self.bounds is None :
+            return 0
+
+        imin, jmin, imax, jmax = self.bounds
+
+        return max( abs(imin - ci), abs(imax - ci), abs(jmin - cj), abs(jmax - cj) )
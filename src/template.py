@@ -3,12 +3,21 @@
 """
 
 from jinja2 import Template, Environment, PackageLoader, FileSystemLoader
-import os, json
+import os, json, logging, threading
+
+from .isomorphism import GroupCanonicalizer
+from .ir import lower_model
+from .passes import PassManager, default_passes
+from .emitter import emit_program
+from .trace import tracer
+
+# trace points
+trace_passes = tracer.point( "codegen.passes", "info" )
 
 
 class ModelConstructor :
 
-    def __init__( self, template_file, model_manager ) :
+    def __init__( self, template_file, model_manager, benchmark_template_file="benchmark.j2" ) :
 
         self.template_file = template_file
 
@@ -17,6 +26,28 @@ class ModelConstructor :
         self.template = self.env.get_template(template_file)
 
         self.model_manager = model_manager
+
+        # generated script, only printed if not set
+        self.output_file = None
+
+        # companion benchmark module
+        self.benchmark_template_file = benchmark_template_file
+        self.benchmark = False
+        self.benchmark_batch_sizes = [1, 8, 32]
+        self.benchmark_threads = sorted({1, os.cpu_count() or 1})
+        self.benchmark_warmup = 10
+        self.benchmark_iterations = 100
+
+        # isomorphic groups share one class
+        self.canonicalizer = GroupCanonicalizer()
+        self.lock = threading.Lock()
+
+        # passes run between the lowering and the template
+        self.pass_manager = PassManager( default_passes( self.canonicalizer, self.lock ) )
+
+        # "jinja" formats the program with the template, "ast" with src/emitter.py,
+        # which writes the same source several times faster
+        self.backend = "jinja"
         
 
     def render_file( self ) :
@@ -35,16 +66,128 @@ class ModelConstructor :
         if self.model_manager is None:
             return
         
-        grouped_data = self.model_manager.by_group()
-        group_paths = {}
+        res = self.generate( self.model_manager )
+
+        self.write_output( res, self.model_manager )
+
+        return res
+
+
+    # select the backend used by default, "jinja" or "ast"
+    def set_backend( self, backend ) :
+
+        if backend not in ( "jinja", "ast" ) :
+
+            logging.warning("Unknown code generation backend %s.", backend)
+            return
+
+        self.backend = backend
+
+
+    def generate( self, model_manager, progress=None, cancel=None, backend=None ) :
+
+        """
+        Return the generated script of a model, or None if cancelled.
+        progress(done, total, group_name) is called after each group and 
+        cancel is a threading.Event checked between groups and passes.
+        backend overrides self.backend for this call.
+        """
+
+        program = self.build_program( model_manager, progress, cancel )
+
+        if program is None :
+            return None
+
+        if ( backend or self.backend ) == "ast" :
+
+            return emit_program( program )
+
+        return self.template.render( program=program )
+
+
+    # lower the model and run the passes, return None if cancelled
+    def build_program( self, model_manager, progress=None, cancel=None ) :
+
+        program = lower_model( model_manager, progress, cancel )
+
+        if program is None :
+            return None
+
+        if not self.pass_manager.run( program, model_manager, cancel ) :
+            return None
+
+        if trace_passes.on :
+            trace_passes.emit( timings=dict( self.pass_manager.timings ) )
 
-        for group_name, layers in grouped_data.items() :
+        return program
 
-            group_paths[group_name] = self.model_manager.bfs( group_name )
 
-        res = self.template.render( model=grouped_data, paths=group_paths )
+    def write_output( self, res, model_manager ) :
 
-        print(res)
+        if self.output_file is None :
+
+            print(res)
+
+        else :
+
+            with open(self.output_file, 'w', encoding='utf-8') as f :
+
+                f.write(res)
+
+        if self.benchmark :
+
+            self.render_benchmark( model_manager )
+
+
+    def render_benchmark( self, model_manager=None ) :
+
+        """
+        Write a benchmark module beside the generated file, timing the 
+        model on CPU with random inputs of the Input node's shape
+        """
+
+        if self.output_file is None :
+
+            logging.warning("Set an output file to emit the benchmark.")
+            return
+        
+        model_manager = model_manager or self.model_manager
+
+        try :
+
+            input_shape = [ int(i) for i in model_manager.get_input_shape() ]
+
+        except ( TypeError, ValueError ) :
+
+            input_shape = None
+
+        if not input_shape or any( i <= 0 for i in input_shape ) :
+
+            logging.warning("Input shape %s is not valid for benchmarking.", model_manager.get_input_shape())
+            return
+
+        folder, model_file = os.path.split( self.output_file )
+        stem = os.path.splitext( model_file )[0]
+
+        template = self.env.get_template( self.benchmark_template_file )
+
+        res = template.render( model_file=model_file,
+                               result_file=stem + "_benchmark.json",
+                               model_class="final",
+                               input_shape=input_shape,
+                               batch_sizes=list(self.benchmark_batch_sizes),
+                               threads=list(self.benchmark_threads),
+                               warmup=int(self.benchmark_warmup),
+                               iterations=int(self.benchmark_iterations)
+                             )
+        
+        bench_file = os.path.join( folder, stem + "_benchmark.py" )
+
+        with open(bench_file, 'w', encoding='utf-8') as f :
+
+            f.write(res)
+
+        return bench_file
 
 
     def set_data( self, data ) :
@@ -57,9 +200,146 @@ class ModelConstructor :
         self.model_file = file
 
 
+    def set_output_file( self, file ) :
+
+        self.output_file = file
+
+
+    # enable the benchmark module and optionally set its configuration
+    def set_benchmark( self, enabled=True, batch_sizes=None, threads=None, warmup=None, iterations=None ) :
+
+        self.benchmark = enabled
+
+        if batch_sizes is not None :
+            self.benchmark_batch_sizes = list(batch_sizes)
+
+        if threads is not None :
+            self.benchmark_threads = list(threads)
+
+        if warmup is not None :
+            self.benchmark_warmup = warmup
+
+        if iterations is not None :
+            self.benchmark_iterations = iterations
+
+
     def set_template_file( self, template_file ) :
 
         self.template_file = template_file
         
         self.template = self.env.get_template(template_file)
 
+
+
+class RenderWorker :
+
+    """
+    Run the generation on a worker thread, from a copy of the model. 
+    A new request cancels and supersedes the one in flight, the UI
+    thread polls the state to show the progress.
+    """
+
+    def __init__( self, model_constructor ) :
+
+        self.model_constructor = model_constructor
+
+        # incremented by each request, older jobs are stale
+        self.generation = 0
+
+        self.cancel_event = None
+        self.thread = None
+        self.lock = threading.Lock()
+
+        # the state is written by both threads, always under state_lock
+        self.state_lock = threading.Lock()
+        self.state = { "status": "idle", "done": 0, "total": 0, "group": "", "error": None }
+
+
+    # start generating a model, cancel the running generation if any
+    def submit( self, model_manager ) :
+
+        self.cancel()
+
+        # copy on the calling thread, the model can be edited meanwhile
+        snapshot = model_manager.copy_model()
+
+        with self.state_lock :
+
+            self.generation += 1
+            self.cancel_event = threading.Event()
+
+            self.state = { "status": "running", "done": 0, "total": 0, "group": "", "error": None }
+
+        self.thread = threading.Thread( target=self.run, 
+                                        args=( snapshot, self.generation, self.cancel_event ), 
+                                        name="render", 
+                                        daemon=True 
+                                      )
+        self.thread.start()
+
+
+    # cancel the running generation
+    def cancel( self ) :
+
+        if self.cancel_event is not None :
+
+            self.cancel_event.set()
+
+            with self.state_lock :
+
+                if self.state["status"] == "running" :
+                    self.state = dict( self.state, status="cancelled" )
+
+
+    # return a copy of the state of the last request
+    def poll( self ) :
+
+        with self.state_lock :
+
+            return dict( self.state )
+
+
+    # check if a generation is running
+    def is_running( self ) :
+
+        return self.poll()["status"] == "running"
+
+
+    # update the state, only if the job is still the current one
+    def set_state( self, generation, **fields ) :
+
+        with self.state_lock :
+
+            if generation != self.generation :
+                return False
+
+            self.state = dict( self.state, **fields )
+
+            return True
+
+
+    def run( self, model_manager, generation, cancel_event ) :
+
+        def progress( done, total, group_name ) :
+
+            self.set_state( generation, done=done, total=total, group=group_name )
+
+        try :
+
+            res = self.model_constructor.generate( model_manager, progress, cancel_event )
+
+            # write only if not superseded meanwhile
+            with self.lock :
+
+                if res is None or cancel_event.is_set() or generation != self.generation :
+                    return
+
+                self.model_constructor.write_output( res, model_manager )
+
+                self.set_state( generation, status="done" )
+
+        except Exception as e :
+
+            logging.error( "Generation failed: %s", e )
+
+            self.set_state( generation, status="failed", error=str(e) )
@@ -0,0 +1,191 @@
+"""
+ Structured trace points.
+
+ A trace point is created once, at import, with a name and a level:
+
+    trace_bfs = tracer.point( "manager.bfs", "debug" )
+
+ and used in hot paths behind its flag, so a disabled point only costs
+ an attribute check and its fields are never built:
+
+    if trace_bfs.on :
+        trace_bfs.emit( group=group, paths=paths )
+
+ The level (and the points) can be changed at runtime, each point can be
+ sampled (1 record every n events), records go to a ring buffer and
+ optionally to a json lines file. The initial level is read from the
+ TORCHNODE_TRACE environment variable, the file from TORCHNODE_TRACE_FILE.
+"""
+
+import collections, json, logging, os, threading, time
+
+
+# trace levels, a point is on when its level is <= the tracer level
+levels = { "off": 0, "error": 1, "info": 2, "debug": 3 }
+
+
+class TracePoint :
+
+    __slots__ = ( "name", "level", "on", "every", "count", "tracer" )
+
+    def __init__( self, tracer, name, level ) :
+
+        self.tracer = tracer
+        self.name = name
+        self.level = levels[level]
+
+        # checked by the callers before emitting
+        self.on = False
+
+        # keep 1 event every "every"
+        self.every = 1
+        self.count = 0
+
+
+    # record an event with its fields
+    def emit( self, **fields ) :
+
+        self.count += 1
+
+        if self.every > 1 and self.count % self.every :
+            return
+
+        self.tracer.record( self.name, fields )
+
+
+class Tracer :
+
+    def __init__( self, level="off", file=None, capacity=10000 ) :
+
+        # name -> TracePoint
+        self.points = {}
+
+        self.level = levels[level]
+
+        # last records, oldest dropped first
+        self.buffer = collections.deque( maxlen=capacity )
+
+        self.file = None
+        self.lock = threading.Lock()
+
+        if file is not None :
+
+            self.set_file( file )
+
+
+    # return the trace point of a name, created if needed
+    def point( self, name, level="debug" ) :
+
+        point = self.points.get( name )
+
+        if point is None :
+
+            point = self.points[name] = TracePoint( self, name, level )
+            point.on = point.level <= self.level
+
+        return point
+
+
+    # set the level of the tracer, turn the points on or off
+    def set_level( self, level ) :
+
+        if level not in levels :
+
+            logging.warning( "Unknown trace level: %s", level )
+            return
+
+        self.level = levels[level]
+
+        for point in self.points.values() :
+
+            point.on = point.level <= self.level
+
+
+    # return the name of the current level
+    def get_level( self ) :
+
+        return next( name for name, value in levels.items() if value == self.level )
+
+
+    # keep 1 event every n for the points starting with a prefix
+    def set_sampling( self, every, prefix="" ) :
+
+        for name, point in self.points.items() :
+
+            if name.startswith( prefix ) :
+
+                point.every = max( 1, int(every) )
+
+
+    # write the records to a json lines file too, None to stop
+    def set_file( self, file ) :
+
+        with self.lock :
+
+            if self.file is not None :
+
+                self.file.close()
+                self.file = None
+
+            if file is not None :
+
+                try :
+
+                    self.file = open( file, 'a', encoding='utf-8' )
+
+                except OSError as e :
+
+                    logging.warning( "Opening trace file %s failed: %s", file, e )
+
+
+    # store a record
+    def record( self, name, fields ) :
+
+        entry = { "time": time.time(), "point": name, "fields": fields }
+
+        with self.lock :
+
+            self.buffer.append( entry )
+
+            if self.file is not None :
+
+                self.file.write( json.dumps( entry, default=repr ) + "\n" )
+
+
+    # return the buffered records, optionally of the points starting with a prefix
+    def get_records( self, prefix="" ) :
+
+        with self.lock :
+
+            return [ entry for entry in self.buffer if entry["point"].startswith( prefix ) ]
+
+
+    # empty the buffer
+    def clear( self ) :
+
+        with self.lock :
+
+            self.buffer.clear()
+
+
+    # stop writing to the file
+    def close( self ) :
+
+        self.set_file( None )
+
+
+# return the trace level selected by the environment
+def get_trace_level( variable="TORCHNODE_TRACE" ) :
+
+    level = os.environ.get( variable, "off" )
+
+    if level not in levels :
+
+        logging.warning( "Unknown trace level: %s", level )
+        return "off"
+
+    return level
+
+
+# tracer of the application
+tracer = Tracer( get_trace_level(), os.environ.get( "TORCHNODE_TRACE_FILE" ) )
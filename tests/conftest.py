@@ -0,0 +1,96 @@
+"""
+ Shared fixtures of the tests.
+
+ The models are built on a small definitions file written in a temporary
+ folder, with the layout of layers_definition.json.
+"""
+
+import json, os, sys, threading
+
+import pytest
+
+root = os.path.dirname( os.path.dirname( os.path.abspath( __file__ ) ) )
+
+if not root in sys.path :
+    sys.path.insert( 0, root )
+
+from src.manager_info import ModelManager
+from src.isomorphism import GroupCanonicalizer
+from src.ir import lower_model
+from src.passes import PassManager, default_passes
+
+
+# return a parameter of a layer definition
+def parameter( name, dtype="int", value=0, default=0 ) :
+
+    return { "name": name, "dtype": dtype, "description": "", "value": value,
+             "default": default, "default_value": value, "enabled": 1 }
+
+
+# return a layer definition
+def definition( layer_type, category, parameters=() ) :
+
+    return { "type": layer_type, "category": category, "parameters": list( parameters ),
+             "input": 1, "output": 1, "description": "" }
+
+
+definitions = {
+    "torch.nn": {
+        "Linear": [ definition( "Linear", "Linear", [ parameter( "in_features" ),
+                                                      parameter( "out_features" ),
+                                                      parameter( "bias", "bool", "True", 1 ) ] ) ],
+        "Activation": [ definition( "ReLU", "Activation" ), definition( "Tanh", "Activation" ) ],
+        "Operator": [ definition( "Identity", "Operator" ) ],
+    }
+}
+
+
+@pytest.fixture
+def model_manager( tmp_path ) :
+
+    file = tmp_path / "layers_definition.json"
+    file.write_text( json.dumps( definitions ) )
+
+    return ModelManager( str( file ) )
+
+
+# add a layer of a type, with its parameters, to a group
+def add_layer( model_manager, layer_id, layer_type, group_name=None, **params ) :
+
+    for layers in model_manager.layer_data.values() :
+
+        for layer in layers :
+
+            if layer["type"] == layer_type :
+
+                model_manager.add_layer( layer_id, layer )
+
+    if group_name is not None :
+
+        if not group_name in model_manager.get_group_names() :
+            model_manager.add_custom_new_group( group_name )
+
+        model_manager.assign_group( layer_id, group_name )
+
+    for name, value in params.items() :
+
+        model_manager.set_param_value( layer_id, name, value )
+
+    return layer_id
+
+
+# link the output of a layer to the input of another
+def link( model_manager, parent, child ) :
+
+    model_manager.assign_link( parent, child, False )
+    model_manager.assign_link( child, parent, True )
+
+
+# lower a model and run the default passes
+def build_program( model_manager ) :
+
+    program = lower_model( model_manager )
+
+    PassManager( default_passes( GroupCanonicalizer(), threading.Lock() ) ).run( program, model_manager )
+
+    return program
@@ -0,0 +1,40 @@
+"""
+ Benchmark module emitted beside the generated model.
+"""
+
+import pytest
+
+from conftest import root
+from src.template import ModelConstructor
+
+
+@pytest.fixture
+def constructor( model_manager, tmp_path, monkeypatch ) :
+
+    monkeypatch.chdir( root )
+
+    constructor = ModelConstructor( "template.j2", model_manager )
+    constructor.set_output_file( str( tmp_path / "model.py" ) )
+
+    return constructor
+
+
+def test_benchmark_is_written_for_a_valid_shape( constructor, model_manager, tmp_path ) :
+
+    model_manager.set_input_shape( ( 3, 32 ) )
+
+    bench_file = constructor.render_benchmark()
+
+    assert bench_file == str( tmp_path / "model_benchmark.py" )
+
+    compile( open( bench_file ).read(), bench_file, "exec" )
+
+
+@pytest.mark.parametrize( "shape", [ ( 0, 32 ), ( 3, -1 ), ( "a", 32 ), ( None, 3 ) ] )
+def test_benchmark_is_not_written_for_an_invalid_shape( constructor, model_manager, tmp_path, shape ) :
+
+    # as read from a project file, set_input_shape only takes numbers
+    model_manager.input_shape = list( shape )
+
+    assert constructor.render_benchmark() is None
+    assert not ( tmp_path / "model_benchmark.py" ).exists()
@@ -0,0 +1,187 @@
+"""
+ Code generation of models with several groups, checked on the program
+ and on the generated source.
+"""
+
+import os
+
+import pytest
+from jinja2 import Environment, FileSystemLoader
+
+from conftest import root, add_layer, link, build_program
+
+
+# render a program with the template of the repo
+def render( program ) :
+
+    env = Environment( loader=FileSystemLoader( os.path.join( root, "resources" ) ) )
+
+    return env.get_template( "template.j2" ).render( program=program )
+
+
+# two groups linked by two branches, the second one ends with a container layer
+def build_branches( model_manager ) :
+
+    m = model_manager
+
+    # enc: a -> b (ReLU) and a -> c, both leave the group
+    add_layer( m, 1, "Linear", "enc", in_features=4, out_features=8 )
+    add_layer( m, 2, "ReLU", "enc" )
+    add_layer( m, 3, "Linear", "enc", in_features=8, out_features=8 )
+
+    # dec: b -> d, c -> e, d + e -> f (Identity) -> g
+    add_layer( m, 4, "Linear", "dec", in_features=8, out_features=8 )
+    add_layer( m, 5, "Linear", "dec", in_features=8, out_features=8 )
+    add_layer( m, 6, "Identity", "dec" )
+    add_layer( m, 7, "Linear", "dec", in_features=8, out_features=2 )
+
+    for parent, child in ( (1, 2), (1, 3), (2, 4), (3, 5), (4, 6), (5, 6), (6, 7) ) :
+
+        link( m, parent, child )
+
+    return m
+
+
+def test_groups_are_wired_layer_by_layer( model_manager ) :
+
+    program = build_program( build_branches( model_manager ) )
+
+    enc = program.get_module( "enc" )
+    dec = program.get_module( "dec" )
+
+    assert enc.inputs == [ "x" ]
+    assert enc.outputs == [ "out_ReLU_0", "out_Linear_1" ]
+
+    # one argument per entry layer
+    assert dec.inputs == [ "x_Linear_2", "x_Linear_3" ]
+
+    final = { s.attr: s for s in program.final.statements }
+
+    assert final["enc"].target == "out_ReLU_0, out_Linear_1"
+    assert final["dec"].inputs == [ [ "out_ReLU_0" ], [ "out_Linear_1" ] ]
+    assert program.final.outputs == [ "out_Linear_4" ]
+
+
+def test_container_layers_are_dropped( model_manager ) :
+
+    program = build_program( build_branches( model_manager ) )
+
+    dec = program.get_module( "dec" )
+
+    assert not "Identity_0" in [ i.attr for i in dec.instances ]
+    assert not "Identity_0" in [ s.attr for s in dec.statements ]
+
+    # the consumer of the container takes its inputs
+    assert dec.statements[-1].inputs == [ [ "out_Linear_2", "out_Linear_3" ] ]
+
+    for module in [ m for m in program.modules if m.emit ] + [ program.final ] :
+
+        attrs = set( i.attr for i in module.instances )
+
+        assert all( s.attr in attrs for s in module.statements )
+
+
+def test_generated_source_runs( model_manager ) :
+
+    source = render( build_program( build_branches( model_manager ) ) )
+
+    compile( source, "model.py", "exec" )
+
+    torch = pytest.importorskip( "torch" )
+
+    scope = {}
+    exec( source, scope )
+
+    y = scope["final"]()( torch.randn( 3, 4 ) )
+
+    assert tuple( y.shape ) == ( 3, 2 )
+
+
+def test_isomorphic_groups_keep_the_order_of_their_class( model_manager ) :
+
+    m = model_manager
+
+    # two blocks with two entries, the layers of the second one are added in reverse order
+    for group_name, ids in ( ( "a", (1, 2, 3) ), ( "b", (13, 12, 11) ) ) :
+
+        add_layer( m, ids[0], "ReLU", group_name )
+        add_layer( m, ids[1], "Tanh", group_name )
+        add_layer( m, ids[2], "Linear", group_name, in_features=8, out_features=8 )
+
+        link( m, ids[0], ids[2] )
+        link( m, ids[1], ids[2] )
+
+    program = build_program( m )
+
+    a = program.get_module( "a" )
+    b = program.get_module( "b" )
+
+    assert b.name == "a" and not b.emit
+
+    types = lambda module : [ m.get_layer_type( i ) for i in module.input_layers ]
+
+    assert types( a ) == types( b )
+
+
+def test_repeated_group_is_chained( model_manager ) :
+
+    m = model_manager
+
+    add_layer( m, 1, "Linear", "block", in_features=8, out_features=8 )
+    add_layer( m, 2, "ReLU", "block" )
+    link( m, 1, 2 )
+
+    m.set_group_repeat( "block", 3 )
+
+    program = build_program( m )
+
+    assert [ s.attr for s in program.final.statements ] == [ "block" ]
+    assert program.final.instances[0].callee == "block_repeat"
+
+    compile( render( program ), "model.py", "exec" )
+
+
+def test_repeated_group_with_several_outputs_is_rejected( model_manager ) :
+
+    m = build_branches( model_manager )
+
+    m.set_group_repeat( "enc", 2 )
+
+    with pytest.raises( ValueError, match="enc" ) :
+
+        build_program( m )
+
+
+def test_removed_layers_leave_their_group( model_manager ) :
+
+    m = model_manager
+
+    for layer_id in ( 1, 2, 3 ) :
+
+        add_layer( m, layer_id, "Linear", in_features=4, out_features=4 )
+
+    link( m, 1, 2 )
+    link( m, 2, 3 )
+
+    m.remove_mutual_links( 2, 3 )
+    m.remove_layer( 3 )
+
+    assert not "group_3" in m.get_group_names()
+    assert m.get_group_schedule() == [ "group_1", "group_2" ]
+
+    # a layer removed from a shared group
+    add_layer( m, 4, "ReLU", "block" )
+    add_layer( m, 5, "Tanh", "block" )
+    link( m, 2, 4 )
+    link( m, 4, 5 )
+
+    m.remove_mutual_links( 4, 5 )
+    m.remove_layer( 5 )
+
+    assert m.get_group_attribute( "block", "members" ) == { 4 }
+
+    source = render( build_program( m ) )
+
+    compile( source, "model.py", "exec" )
+
+    assert not "Linear_2" in source and not "Tanh" in source
@@ -0,0 +1,79 @@
+"""
+ The direct backend (src/emitter.py, selected as "ast") formats the
+ programs of real models exactly like the Jinja template.
+"""
+
+import pytest
+
+from conftest import add_layer, link, build_program
+from test_codegen import render, build_branches
+from src.emitter import emit_program
+
+
+# a chain of layers in one group, with keyword arguments
+def build_chain( m ) :
+
+    add_layer( m, 1, "Linear", "net", in_features=4, out_features=8, bias="False" )
+    add_layer( m, 2, "Tanh", "net" )
+    add_layer( m, 3, "Linear", "net", in_features=8, out_features=2 )
+
+    link( m, 1, 2 )
+    link( m, 2, 3 )
+
+    return m
+
+
+# isomorphic groups sharing a class, the last one repeated
+def build_duplicates( m ) :
+
+    previous = None
+
+    for i, group_name in enumerate( ( "a", "b", "c" ) ) :
+
+        first = add_layer( m, 10 * i + 1, "Linear", group_name, in_features=8, out_features=8 )
+        last = add_layer( m, 10 * i + 2, "ReLU", group_name )
+
+        link( m, first, last )
+
+        if previous is not None :
+            link( m, previous, first )
+
+        previous = last
+
+    m.set_group_repeat( "c", 4 )
+
+    return m
+
+
+# layers left in their own default groups, one of them a container
+def build_default_groups( m ) :
+
+    add_layer( m, 1, "Linear", in_features=4, out_features=4 )
+    add_layer( m, 2, "Identity" )
+    add_layer( m, 3, "Linear", in_features=4, out_features=4 )
+
+    link( m, 1, 2 )
+    link( m, 1, 3 )
+    link( m, 2, 3 )
+
+    return m
+
+
+builders = [ build_chain, build_branches, build_duplicates, build_default_groups ]
+
+
+@pytest.mark.parametrize( "build", builders )
+def test_backends_give_the_same_source( model_manager, build ) :
+
+    m = build( model_manager )
+
+    assert emit_program( build_program( m ) ) == render( build_program( m ) )
+
+    # after an edit as well
+    layer_id = sorted( i for i in m.get_all_layer_ids() if m.get_layer_type( i ) == "Linear" )[0]
+    m.set_param_value( layer_id, "out_features", 16 )
+
+    program = build_program( m )
+
+    assert emit_program( program ) == render( program )
+
@@ -0,0 +1,32 @@
+"""
+ Secondary indexes of the ModelManager.
+"""
+
+from conftest import add_layer
+
+
+def test_numbers_match_in_any_form( model_manager ) :
+
+    m = model_manager
+
+    add_layer( m, 1, "Linear", in_features=0, out_features=8 )
+    add_layer( m, 2, "Linear", in_features="8", out_features="4" )
+
+    assert m.query( params={ "in_features": 0.0 } ) == [ 1 ]
+    assert m.query( params={ "in_features": "0" } ) == [ 1 ]
+    assert m.query( params={ "in_features": 8 } ) == [ 2 ]
+    assert m.query( params={ "out_features": "8.0" } ) == [ 1 ]
+    assert m.query( params={ "bias": "True" } ) == [ 1, 2 ]
+
+
+def test_removed_layers_leave_the_indexes( model_manager ) :
+
+    m = model_manager
+
+    add_layer( m, 1, "Linear", in_features=4, out_features=8 )
+    add_layer( m, 2, "ReLU" )
+
+    m.remove_layer( 1 )
+
+    assert m.query( layer_type="Linear" ) == []
+    assert m.query() == [ 2 ]